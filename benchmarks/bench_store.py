@@ -0,0 +1,301 @@
+"""
+Benchmark the store, account and config hot paths on synthetic vaults.
+
+A vault is seeded with N accounts for each size, then every operation is run
+several times against it and the median and minimum wall times are reported.
+Cold CLI invocations start a fresh interpreter running `main.app`, so they
+include startup and import time. Everything runs against a throwaway config
+and store, never the user's own.
+
+Results can be written as JSON and compared with the results of another
+commit, which flags operations that got slower than the threshold.
+
+Usage:
+    python benchmarks/bench_store.py [--sizes 1000,10000] [--runs N]
+        [--json FILE] [--compare FILE] [--threshold PERCENT]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+PLATFORMS = ("github", "gitlab", "codeberg", "bitbucket", "sourcehut", "gitea")
+
+# Differences smaller than this are timer noise, never a regression
+NOISE_MS = 0.05
+
+CLI_COMMANDS: list[list[str]] = [
+    ["store", "list"],
+    ["store", "status"],
+    ["account", "get", "github"],
+    ["account", "search", "code"],
+]
+
+
+def timed(fn: Callable[[], object], runs: int) -> dict[str, float]:
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        walls.append(time.perf_counter() - start)
+
+    return {
+        "median_ms": statistics.median(walls) * 1000,
+        "min_ms": min(walls) * 1000,
+        "runs": runs,
+    }
+
+
+def synthetic_accounts(size: int) -> Iterator[tuple[str, str]]:
+    for i in range(size):
+        yield f"{i:032x}", f"{PLATFORMS[i % len(PLATFORMS)]}-{i % 997}"
+
+
+def bench_key_formats(
+    size: int, tmp: Path, record: Callable[[str, dict[str, float]], None]
+) -> None:
+    """
+    Seed a store keeping random UUIDv4 text ids and one keeping UUIDv7 blob
+    ids, recording the insert time and the database size of each.
+    """
+    import uuid
+
+    from internal.repositories.sqlite.keys import new_account_id
+    from internal.repositories.sqlite.store import SqliteStore
+
+    variants = (
+        ("text uuid4", "text", lambda: str(uuid.uuid4())),
+        ("blob uuid7", "blob", new_account_id),
+    )
+    for label, key_format, new_id in variants:
+        directory = tmp / f"keys_{key_format}_{size}"
+        directory.mkdir()
+        store = SqliteStore(directory, key_format=key_format)
+        store.create()
+
+        accounts = [(new_id(), platform) for _, platform in synthetic_accounts(size)]
+        timing = timed(lambda: store.add_accounts(accounts, 10_000), 1)
+        store.close()
+
+        timing["db_bytes"] = store.connection.db_path.stat().st_size
+        record(f"SqliteStore.add_accounts ({label})", timing)
+
+
+def bench_generator(
+    size: int, runs: int, record: Callable[[str, dict[str, float]], None]
+) -> None:
+    """
+    Generate as many 20-character passwords as the vault has accounts, for
+    the policies with and without required character classes.
+    """
+    from collections import deque
+
+    from internal.services.generator.generator import PasswordGenerator
+
+    for policy in ("strong", "printable"):
+        generator = PasswordGenerator.from_policy(policy)
+        timing = timed(lambda: deque(generator.generate(size, 20), maxlen=0), runs)
+        timing["per_second"] = size / (timing["median_ms"] / 1000)
+        record(f"PasswordGenerator.generate ({policy})", timing)
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT
+    )
+    return result.stdout.strip() or None
+
+
+def bench_size(size: int, runs: int, tmp: Path) -> list[dict]:
+    # Imported here, after the environment points the config at `tmp`
+    from internal.repositories.sqlite.keys import new_account_id
+    from internal.repositories.sqlite.store import SqliteStore
+    from internal.services.accounts import Account
+    from internal.services.config.config import config_app
+    from internal.services.storage import storage
+
+    results: list[dict] = []
+
+    def record(name: str, timing: dict[str, float]) -> None:
+        results.append({"size": size, "name": name, **timing})
+
+    vault = tmp / f"vault_{size}"
+    vault.mkdir()
+
+    def create() -> None:
+        fresh = tmp / f"create_{size}_{time.perf_counter_ns()}"
+        fresh.mkdir()
+        store = SqliteStore(fresh)
+        store.create()
+        store.close()
+
+    record("SqliteStore.create", timed(create, runs))
+
+    bench_key_formats(size, tmp, record)
+    bench_generator(size, runs, record)
+
+    store = SqliteStore(vault)
+    store.create()
+    record(
+        "SqliteStore.add_accounts (seed)",
+        timed(lambda: store.add_accounts(synthetic_accounts(size), 10_000), 1),
+    )
+
+    snapshots = iter(range(10**9))
+    record(
+        "SqliteStore.backup_current_table (first)",
+        timed(lambda: store.backup_current_table(f"s{next(snapshots)}_accounts"), 1),
+    )
+
+    def backup_after_change() -> None:
+        n = next(snapshots)
+        store.add_account(new_account_id(), "github")
+        store.backup_current_table(f"s{n}_accounts")
+
+    record("SqliteStore.backup_current_table (1 change)", timed(backup_after_change, runs))
+
+    record(
+        "SqliteStore.switch_table",
+        timed(
+            lambda: (store.switch_table("s0_accounts"), store.switch_table("accounts")),
+            runs,
+        ),
+    )
+    record("SqliteStore.get_all_tables", timed(store.get_all_tables, runs))
+    store.close()
+
+    config_app.set_key_value("location_path", str(vault), "sqlite_directory")
+    storage.get_sqlite_repository.cache_clear()
+    storage.get_store.cache_clear()
+
+    account = Account()
+    record(
+        "Account.add_new_account",
+        timed(lambda: account.add_new_account("benchmark"), runs),
+    )
+    storage.get_sqlite_repository().close()
+
+    def get_value_1000() -> None:
+        for _ in range(1000):
+            config_app.get_value("location_path", "sqlite_directory")
+
+    record("_ConfigApplication.get_value (x1000)", timed(get_value_1000, runs))
+    record(
+        "_ConfigApplication.set_key_value",
+        timed(
+            lambda: config_app.set_key_value(
+                "location_path", str(vault), "sqlite_directory"
+            ),
+            runs,
+        ),
+    )
+
+    for command in CLI_COMMANDS:
+        cmd = [sys.executable, "-c", "from main import app; app()", *command]
+        record(
+            f"cli {' '.join(command)}",
+            timed(
+                lambda: subprocess.run(cmd, capture_output=True, cwd=ROOT, check=True),
+                runs,
+            ),
+        )
+
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> int:
+    """
+    Print the change of every operation against a baseline and count the
+    ones slower than the threshold, in percent of the baseline median.
+    """
+
+    before = {(row["size"], row["name"]): row["median_ms"] for row in baseline}
+    regressions = 0
+
+    print(f"\n{'size':>9} {'operation':<48} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for row in results:
+        old = before.get((row["size"], row["name"]))
+        if old is None or old == 0:
+            continue
+
+        change = (row["median_ms"] - old) / old * 100
+        flag = ""
+        if change > threshold and row["median_ms"] - old > NOISE_MS:
+            regressions += 1
+            flag = "  slower"
+
+        print(
+            f"{row['size']:>9} {row['name']:<48} {old:>10.2f} "
+            f"{row['median_ms']:>10.2f} {change:>+7.1f}%{flag}"
+        )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="comma separated vault sizes",
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    results: list[dict] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["XDG_CONFIG_HOME"] = str(Path(tmp) / "config")
+        os.environ["XDG_CACHE_HOME"] = str(Path(tmp) / "cache")
+        sys.path.insert(0, str(ROOT))
+
+        from internal.services.config.config import config_app
+
+        config_app.setup_config_dir()
+
+        for size in args.sizes:
+            results += bench_size(size, args.runs, Path(tmp))
+
+    print(f"{'size':>9} {'operation':<48} {'median ms':>10} {'min ms':>10} {'runs':>5}")
+    for row in results:
+        print(
+            f"{row['size']:>9} {row['name']:<48} {row['median_ms']:>10.2f} "
+            f"{row['min_ms']:>10.2f} {row['runs']:>5}"
+            + (f" {row['db_bytes']:>12,} bytes" if "db_bytes" in row else "")
+            + (f" {row['per_second']:>12,.0f} /s" if "per_second" in row else "")
+        )
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if compare(results, baseline["results"], args.threshold) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
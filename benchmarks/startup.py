@@ -0,0 +1,120 @@
+"""
+Measure CLI startup time for each subcommand.
+
+Every command is run in a fresh interpreter against a throwaway config and
+store, so it reports the latency a shell integration would see. Wall time is
+the median of several runs; import time is the cumulative time of the
+top-level `main` import reported by `python -X importtime`.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--json FILE]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+COMMANDS: list[list[str]] = [
+    ["--help"],
+    ["config", "location"],
+    ["config", "get", "location_path", "sqlite_directory"],
+    ["store", "status"],
+    ["store", "list"],
+    ["account", "--help"],
+]
+
+
+def run(args: list[str], env: dict[str, str], importtime: bool = False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += [str(ROOT / "main.py"), *args]
+
+    start = time.perf_counter()
+    result = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=ROOT)
+    return time.perf_counter() - start, result
+
+
+def top_level_import_us(stderr: str) -> int:
+    """
+    Get the cumulative microseconds of every top-level import.
+    """
+
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        _, _, rest = line.partition(":")
+        fields = [field.strip() for field in rest.split("|")]
+        if len(fields) != 3 or not fields[1].isdigit():
+            continue
+
+        # Top-level imports have no indentation before the module name
+        name = rest.split("|")[2]
+        if name.startswith(" ") and not name.startswith("  "):
+            total += int(fields[1])
+
+    return total
+
+
+def setup(tmp: Path) -> dict[str, str]:
+    env = {
+        **os.environ,
+        "XDG_CONFIG_HOME": str(tmp / "config"),
+        "XDG_CACHE_HOME": str(tmp / "cache"),
+    }
+    store_dir = tmp / "store"
+    store_dir.mkdir()
+
+    run(["config", "set", "location_path", str(store_dir), "sqlite_directory"], env)
+    run(["store", "init"], env)
+    run(["account", "add", "benchmark"], env)
+
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = setup(Path(tmp))
+
+        for command in COMMANDS:
+            walls = [run(command, env)[0] for _ in range(args.runs)]
+            _, traced = run(command, env, importtime=True)
+
+            results.append(
+                {
+                    "command": " ".join(command),
+                    "wall_ms_median": statistics.median(walls) * 1000,
+                    "wall_ms_min": min(walls) * 1000,
+                    "import_ms": top_level_import_us(traced.stderr) / 1000,
+                }
+            )
+
+    print(f"{'command':<48} {'median ms':>10} {'min ms':>10} {'import ms':>10}")
+    for row in results:
+        print(
+            f"{row['command']:<48} {row['wall_ms_median']:>10.1f} "
+            f"{row['wall_ms_min']:>10.1f} {row['import_ms']:>10.1f}"
+        )
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
+import itertools
+import sys
+import time
+from pathlib import Path
 from typing import Annotated
 
 import typer
 
-from internal.services.accounts import Account
+from internal.constants.constants import (
+    DEFAULT_PASSWORD_LENGTH,
+    DEFAULT_PASSWORD_POLICY,
+    IMPORT_FORMATS,
+    PASSWORD_POLICIES,
+)
 
 app = typer.Typer(no_args_is_help=True, help="Manage Account password")
 
@@ -10,18 +19,220 @@ app = typer.Typer(no_args_is_help=True, help="Manage Account password")
 @app.command()
 def add(
     platform: Annotated[str, typer.Argument()],
+    secret: Annotated[
+        bool,
+        typer.Option(
+            "--secret",
+            "-s",
+            help="Prompt for a secret, encrypted with the unlocked vault",
+        ),
+    ] = False,
 ):
     """
     Add new account to storage
     """
+    # Imported lazily so commands that don't touch the store start faster
+    from internal.services.accounts import Account
+
+    value = None
+    if secret:
+        value = typer.prompt("Secret", hide_input=True, confirmation_prompt=True)
+
     try:
         account = Account()
-        account.add_new_account(platform)
+        account.add_new_account(platform, value)
         print("Succesfully add new account")
     except Exception as err:
         print(err)
         raise
 
 
+@app.command()
+def reveal(
+    account_id: Annotated[str, typer.Argument()],
+):
+    """
+    Print the decrypted secret of an account of the current store
+    """
+    from internal.services.accounts import Account
+
+    try:
+        value = Account().reveal_secret(account_id)
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+    if value is None:
+        print(f"Account {account_id} has no secret")
+        raise typer.Exit(1)
+
+    print(value)
+
+
+@app.command()
+def get(
+    platform: Annotated[str, typer.Argument()],
+):
+    """
+    Get accounts of the current store by platform
+    """
+    from internal.services.accounts import Account
+
+    try:
+        accounts = Account().get_accounts(platform)
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+    if len(accounts) == 0:
+        print(f"No account found for platform: {platform}")
+        raise typer.Exit(1)
+
+    for account_id, account_platform in accounts:
+        print(f"{account_id}\t{account_platform}")
+
+
+@app.command()
+def search(
+    query: Annotated[str, typer.Argument()],
+    limit: Annotated[int, typer.Option(min=1)] = 50,
+):
+    """
+    Search accounts of the current store by platform words
+    """
+    from internal.services.accounts import Account
+
+    try:
+        accounts = Account().search_accounts(query, limit)
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+    if len(accounts) == 0:
+        print(f"No account matches: {query}")
+        raise typer.Exit(1)
+
+    for account_id, account_platform in accounts:
+        print(f"{account_id}\t{account_platform}")
+
+
+@app.command("list")
+def list_accounts(
+    snapshot: Annotated[
+        str | None, typer.Option(help="Snapshot to list, defaults to the current one")
+    ] = None,
+    batch_size: Annotated[int, typer.Option(min=1)] = 1000,
+):
+    """
+    List every account of the current store or of a snapshot
+    """
+    from internal.services.accounts import Account
+
+    count = 0
+    try:
+        records = Account().list_accounts(snapshot, batch_size)
+
+        # Written as the rows are fetched, one write per batch
+        for batch in itertools.batched(records, batch_size):
+            sys.stdout.write("".join(f"{record.id}\t{record.platform}\n" for record in batch))
+            count += len(batch)
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+    if count == 0:
+        print("No account found")
+        raise typer.Exit(1)
+
+
+def validate_password_policy(value: str | None):
+    if value is not None and value not in PASSWORD_POLICIES:
+        raise typer.BadParameter(f"policy must be one of: {', '.join(PASSWORD_POLICIES)}")
+    return value
+
+
+@app.command()
+def generate(
+    count: Annotated[int, typer.Option("--count", "-n", min=1)] = 1,
+    length: Annotated[
+        int, typer.Option("--length", "-l", min=1)
+    ] = DEFAULT_PASSWORD_LENGTH,
+    policy: Annotated[
+        str | None,
+        typer.Option(
+            callback=validate_password_policy,
+            help=f"{', '.join(PASSWORD_POLICIES)}, defaults to {DEFAULT_PASSWORD_POLICY}",
+        ),
+    ] = None,
+    charset: Annotated[
+        str | None,
+        typer.Option(help="Characters to draw from instead of a policy"),
+    ] = None,
+):
+    """
+    Print random passwords, one per line
+    """
+    from internal.services.generator.generator import PasswordGenerator
+
+    if policy is not None and charset is not None:
+        print("--policy and --charset can't be used together")
+        raise typer.Exit(1)
+
+    try:
+        if charset is not None:
+            generator = PasswordGenerator(charset)
+        else:
+            generator = PasswordGenerator.from_policy(policy or DEFAULT_PASSWORD_POLICY)
+        passwords = generator.generate(count, length)
+    except ValueError as err:
+        print(err)
+        raise typer.Exit(1)
+
+    # Written in chunks, one write per line would dominate for large counts
+    for batch in itertools.batched(passwords, 1024):
+        sys.stdout.write("\n".join(batch) + "\n")
+
+
+def validate_import_format(value: str | None):
+    if value is not None and value not in IMPORT_FORMATS:
+        raise typer.BadParameter(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    return value
+
+
+@app.command("import")
+def import_accounts(
+    file: Annotated[
+        Path, typer.Argument(exists=True, dir_okay=False, readable=True)
+    ],
+    file_format: Annotated[
+        str | None,
+        typer.Option(
+            "--format",
+            callback=validate_import_format,
+            help="csv or jsonl, defaults to the file extension",
+        ),
+    ] = None,
+    batch_size: Annotated[int, typer.Option(min=1)] = 1000,
+):
+    """
+    Import accounts from a CSV or JSONL file with a single snapshot
+    """
+    # Imported lazily so commands that don't touch the store start faster
+    from internal.services.accounts import Account
+
+    try:
+        account = Account()
+
+        start = time.perf_counter()
+        total = account.import_accounts(file, file_format, batch_size)
+        elapsed = time.perf_counter() - start
+
+        rate = total / elapsed if elapsed > 0 else float(total)
+        print(f"Succesfully import {total} accounts in {elapsed:.2f}s ({rate:.0f} rows/s)")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
 if __name__ == "__main__":
     app()
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Annotated
 
 import typer
@@ -20,22 +21,93 @@ def validate_set_value_command(value: str):
     return value
 
 
+def parse_set_arguments(args: list[str]) -> list[tuple[str, str, str | None]]:
+    """
+    Read `KEY VALUE [TABLE]`, or `[TABLE.]KEY=VALUE` assignments when the
+    first argument has an `=`, as (key, value, table) tuples.
+    """
+    if "=" not in args[0]:
+        if len(args) > 3:
+            raise typer.BadParameter(
+                "expected KEY VALUE [TABLE], or [TABLE.]KEY=VALUE for several values"
+            )
+        if len(args) < 2:
+            raise typer.BadParameter("missing VALUE")
+
+        table = args[2] if len(args) == 3 else ""
+        return [
+            (
+                validate_set_key_command(args[0]),
+                validate_set_value_command(args[1]),
+                table or None,
+            )
+        ]
+
+    assignments = []
+    for arg in args:
+        name, sep, value = arg.partition("=")
+        if sep == "":
+            raise typer.BadParameter(f"'{arg}' is not [TABLE.]KEY=VALUE")
+
+        table, _, key = name.rpartition(".")
+        assignments.append(
+            (validate_set_key_command(key), validate_set_value_command(value), table or None)
+        )
+
+    return assignments
+
+
 @app.command()
 def set(
-    key: Annotated[str, typer.Argument(callback=validate_set_key_command)],
-    value: Annotated[str, typer.Argument(callback=validate_set_value_command)],
-    table: Annotated[str, typer.Argument()] = "",
+    assignments: Annotated[
+        list[str],
+        typer.Argument(
+            metavar="KEY VALUE [TABLE] | [TABLE.]KEY=VALUE...",
+            callback=parse_set_arguments,
+        ),
+    ],
 ):
     """
-    Set value to config file
+    Set values to config file, all written at once
+
+    Examples:
+        config set location_path /srv/passwords sqlite_directory
+        config set sqlite_pragmas.cache_size=-64000 vault.idle_timeout=600
     """
 
     try:
-        config_app.set_key_value(key, value, table)
-        print("success setting value to config file")
+        with config_app.batch():
+            for key, value, table in assignments:
+                config_app.set_key_value(key, value, table)
     except Exception as err:
         raise typer.BadParameter(str(err))
 
+    if len(assignments) == 1:
+        print("success setting value to config file")
+    else:
+        print(f"success setting {len(assignments)} values to config file")
+
+
+@app.command()
+def apply(
+    file: Annotated[Path, typer.Argument(exists=True, dir_okay=False, readable=True)],
+):
+    """
+    Set every value of a TOML file to config file, all written at once
+    """
+    import tomllib
+
+    try:
+        with file.open("rb") as values_file:
+            values = tomllib.load(values_file)
+
+        count = config_app.apply(values)
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+    print(f"success applying {count} values from {file}")
+
 
 @app.command()
 def get(
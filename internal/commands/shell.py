@@ -0,0 +1,212 @@
+import cmd
+import shlex
+import sys
+from pathlib import Path
+
+import typer
+
+from internal.services.config.config import config_app
+
+# Arguments and options taking a snapshot name, by command
+_SNAPSHOT_PARAMS = {
+    ("store", "switch"): {"snapshot"},
+    ("store", "diff"): {"snapshot_a", "snapshot_b"},
+    ("store", "export"): {"snapshot"},
+    ("account", "list"): {"snapshot"},
+}
+
+# Commands after which the store has to be opened again from the config
+_RECONFIGURING = {("config",), ("store", "set")}
+
+# Commands that can create or drop snapshots, or point at another store,
+# after which snapshot names are read again
+_CHANGING_SNAPSHOTS = {
+    ("account", "add"),
+    ("account", "import"),
+    ("store", "init"),
+    ("store", "set"),
+    ("store", "switch"),
+    ("store", "gc"),
+    ("store", "migrate-keys"),
+    ("config", "set"),
+    ("config", "apply"),
+}
+
+_EXIT_COMMANDS = ("exit", "quit")
+
+
+class Shell(cmd.Cmd):
+    """
+    Interactive shell running the `config`, `store`, `account` and `vault`
+    commands in one process.
+
+    Python, the commands, the config and the store connection are loaded
+    once, so every command after the first only pays for its own work.
+    Snapshot names complete from a list kept in memory, read again only
+    after a command that can create or drop snapshots.
+    """
+
+    intro = "Plug Password shell. Type help for commands, exit to leave."
+    prompt = "plug-password> "
+
+    def __init__(self, app: typer.Typer) -> None:
+        super().__init__()
+        self.__command = typer.main.get_command(app)
+        self.__snapshots: list[str] | None = None
+
+        cache_file = config_app.cache_file
+        self.__history: Path | None = (
+            None if cache_file is None else cache_file.with_name("shell_history")
+        )
+
+    def preloop(self) -> None:
+        try:
+            import readline
+        except ImportError:
+            return
+
+        # Complete whole words, options included
+        readline.set_completer_delims(" \t\n")
+        if self.__history is not None and self.__history.is_file():
+            readline.read_history_file(self.__history)
+
+    def postloop(self) -> None:
+        try:
+            import readline
+        except ImportError:
+            return
+
+        if self.__history is not None:
+            self.__history.parent.mkdir(parents=True, exist_ok=True)
+            readline.set_history_length(1000)
+            readline.write_history_file(self.__history)
+
+    def emptyline(self) -> bool:
+        # Don't repeat the last command
+        return False
+
+    def default(self, line: str) -> bool:
+        try:
+            args = shlex.split(line)
+        except ValueError as err:
+            print(err)
+            return False
+
+        if args[0] in _EXIT_COMMANDS or args[0] == "EOF":
+            if args[0] == "EOF":
+                print()
+            return True
+
+        if args[0] == "shell":
+            print("Already in the shell")
+            return False
+
+        self.run(args)
+        return False
+
+    def do_help(self, arg: str) -> None:
+        """
+        Show the help of a command, `help store switch` like `store switch --help`.
+        """
+        self.run([*shlex.split(arg), "--help"])
+        print("\nShell: exit or quit to leave, Tab completes commands and snapshots")
+
+    def run(self, args: list[str]) -> int:
+        """
+        Run a command line as the CLI would, printing the same output and
+        errors without leaving the shell.
+
+        Returns:
+            int: Exit code of the command
+        """
+
+        code = 0
+        try:
+            self.__command.main(args, prog_name="plug-password", standalone_mode=True)
+        except SystemExit as exit:
+            code = exit.code if isinstance(exit.code, int) else 1
+        except KeyboardInterrupt:
+            print()
+            code = 130
+        except Exception as err:
+            print(err, file=sys.stderr)
+            code = 1
+        finally:
+            self.__after(args)
+
+        return code
+
+    def completenames(self, text: str, *ignored) -> list[str]:
+        names = [*self.__command.commands, "help", *_EXIT_COMMANDS]  # type: ignore[attr-defined]
+        return [f"{name} " for name in names if name.startswith(text)]
+
+    def completedefault(self, text: str, line: str, begidx: int, endidx: int) -> list[str]:
+        try:
+            words = shlex.split(line[:begidx])
+        except ValueError:
+            return []
+
+        if words and words[0] == "help":
+            words = words[1:]
+
+        command = self.__command
+        path: list[str] = []
+        for word in words:
+            commands = getattr(command, "commands", None)
+            if commands is None or word not in commands:
+                break
+            command = commands[word]
+            path.append(word)
+
+        commands = getattr(command, "commands", None)
+        if commands is not None:
+            return [f"{name} " for name in commands if name.startswith(text)]
+
+        snapshot_params = _SNAPSHOT_PARAMS.get(tuple(path), set())
+        previous = words[-1] if len(words) > len(path) else None
+
+        for param in command.params:
+            if previous in getattr(param, "opts", []) and param.name in snapshot_params:
+                return self.__complete_snapshots(text)
+
+        if text.startswith("-"):
+            options = [
+                opt
+                for param in command.params
+                for opt in getattr(param, "opts", [])
+                if opt.startswith("-")
+            ]
+            return [f"{opt} " for opt in options if opt.startswith(text)]
+
+        takes_snapshot = any(
+            param.name in snapshot_params
+            for param in command.params
+            if param.param_type_name == "argument"
+        )
+        return self.__complete_snapshots(text) if takes_snapshot else []
+
+    def complete_help(self, text: str, line: str, begidx: int, endidx: int) -> list[str]:
+        return self.completedefault(text, line, begidx, endidx)
+
+    def __complete_snapshots(self, text: str) -> list[str]:
+        if self.__snapshots is None:
+            self.__snapshots = self.__read_snapshots()
+        return [f"{name} " for name in self.__snapshots if name.startswith(text)]
+
+    def __read_snapshots(self) -> list[str]:
+        from internal.services.storage.storage import get_store
+
+        try:
+            return ["accounts", *get_store().get_all_snapshots()]
+        except Exception:
+            # No store yet, nothing to complete
+            return []
+
+    def __after(self, args: list[str]) -> None:
+        if tuple(args[:2]) in _CHANGING_SNAPSHOTS and "--help" not in args:
+            self.__snapshots = None
+
+        if tuple(args[:1]) in _RECONFIGURING or tuple(args[:2]) in _RECONFIGURING:
+            from internal.services.storage.storage import close_store
+
+            close_store()
@@ -1,4 +1,5 @@
 import os
+from datetime import datetime
 from pathlib import Path
 from typing import Annotated
 
@@ -9,11 +10,17 @@ from internal.constants.constants import (
     TABLE_STORE_DIRECTORY,
 )
 from internal.services.config.config import config_app
-from internal.services.storage import storage
 
 app = typer.Typer(no_args_is_help=True, help="Manage Store of plug password")
 
 
+def get_store():
+    # Imported lazily so commands that don't touch the store start faster
+    from internal.services.storage.storage import get_store
+
+    return get_store()
+
+
 def validate_set_path(path: str):
     if path == "":
         raise typer.BadParameter("path can't be empty string")
@@ -93,7 +100,7 @@ def init():
 
     try:
         if storage_dir is not None:
-            storage.store.create()
+            get_store().create()
             print("Initialized storage...")
 
     except (FileNotFoundError, FileExistsError, Exception) as err:
@@ -109,34 +116,76 @@ def status():
     Display information about what is my current store
     """
     try:
-        current_store = storage.store.get_current_store()
+        current_store = get_store().get_current_store()
         print(f"On store {current_store}")
     except Exception as err:
         print(err)
 
 
+def validate_since(value: str | None):
+    if value is None:
+        return value
+
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        raise typer.BadParameter("since must be a date like YYYY-MM-DD[ HH:MM[:SS]]")
+
+    return date.strftime("%Y-%m-%d %H:%M:%S")
+
+
 @app.command()
-def list():
+def list(
+    limit: Annotated[
+        int | None, typer.Option(min=0, help="Maximum number of snapshots to show")
+    ] = None,
+    offset: Annotated[
+        int, typer.Option(min=0, help="Number of snapshots to skip")
+    ] = 0,
+    since: Annotated[
+        str | None,
+        typer.Option(
+            callback=validate_since,
+            help="Only snapshots created at or after this UTC date",
+        ),
+    ] = None,
+    long: Annotated[
+        bool,
+        typer.Option(
+            "--long", "-l", help="Show creation date, parent, rows and size"
+        ),
+    ] = False,
+):
     """
-    Display all stores's snapshots
+    Display all stores's snapshots, oldest first
     """
     try:
-        stores = storage.store.get_all_snapshots()
-        current_store = storage.store.get_current_store()
-
-        display = "Snapshots:\n"
-
-        if len(stores) > 0:
-            for store in stores:
-                if store == current_store:
-                    display += f"*{store}\n"
-                    continue
+        storage = get_store()
+        snapshots = storage.list_snapshots(limit, offset, since)
+        current_store = storage.get_current_store()
+
+        print("Snapshots:")
+
+        if len(snapshots) == 0:
+            print("There's no snapshot yet.")
+            return
+
+        for snapshot in snapshots:
+            line = snapshot.name
+            if snapshot.name == current_store:
+                line = f"*{line}"
+
+            if long:
+                line += (
+                    f"  created={snapshot.created_at or '-'}"
+                    f"  parent={snapshot.parent or '-'}"
+                    f"  rows={'-' if snapshot.row_count is None else snapshot.row_count}"
+                    f"  size={'-' if snapshot.size_bytes is None else f'{snapshot.size_bytes}B'}"
+                )
 
-                display += f"{store}\n"
-        else:
-            display += "There's no snapshot yet."
+            print(line)
 
-        print(display)
+        print()
     except Exception as err:
         print(err)
 
@@ -150,12 +199,199 @@ def switch(
     """
 
     try:
-        storage.store.switch_snapshot(snapshot)
+        get_store().switch_snapshot(snapshot)
         print(f"Swich to {snapshot}")
     except Exception as err:
         print(err)
         raise
 
 
+@app.command()
+def diff(
+    snapshot_a: Annotated[str, typer.Argument()],
+    snapshot_b: Annotated[str, typer.Argument()],
+    stat: Annotated[
+        bool, typer.Option("--stat", help="Only show the number of changes")
+    ] = False,
+):
+    """
+    Show accounts added (+), removed (-) or changed (~) from one snapshot to another
+    """
+
+    try:
+        storage = get_store()
+
+        if stat:
+            counts = storage.diff_stat(snapshot_a, snapshot_b)
+            print(
+                f"{counts['added']} added, {counts['removed']} removed, "
+                f"{counts['changed']} changed"
+            )
+            return
+
+        for row in storage.diff_snapshots(snapshot_a, snapshot_b):
+            if row.change == "added":
+                print(f"+ {row.id}\t{row.platform_b}")
+            elif row.change == "removed":
+                print(f"- {row.id}\t{row.platform_a}")
+            else:
+                print(f"~ {row.id}\t{row.platform_a} -> {row.platform_b}")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+@app.command()
+def gc(
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Only show what would be dropped")
+    ] = False,
+    max_pages: Annotated[
+        int,
+        typer.Option(min=0, help="Maximum number of free pages to return to the OS"),
+    ] = 10000,
+):
+    """
+    Drop snapshots expired by the retention policy and reclaim their space.
+
+    The policy is read from the `snapshot_retention` config table:
+    keep_last, keep_daily and keep_weekly. Stores created before incremental
+    auto-vacuum was enabled keep freed pages for reuse instead.
+    """
+    from internal.services.storage.storage import get_retention_policy
+
+    try:
+        storage = get_store()
+        expired = storage.collect_garbage(get_retention_policy(), dry_run)
+
+        for name in expired:
+            print(f"{'Would drop' if dry_run else 'Dropped'} {name}")
+
+        if dry_run:
+            print(f"{len(expired)} snapshots would be dropped")
+            return
+
+        freed = storage.reclaim_space(max_pages)
+        print(f"Dropped {len(expired)} snapshots, reclaimed {freed} pages")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+def validate_export_format(value: str):
+    from internal.services.storage.export import EXPORT_FORMATS
+
+    if value not in EXPORT_FORMATS:
+        raise typer.BadParameter(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return value
+
+
+@app.command()
+def export(
+    export_format: Annotated[
+        str,
+        typer.Option(
+            "--format", "-f", callback=validate_export_format, help="jsonl or csv"
+        ),
+    ] = "jsonl",
+    snapshot: Annotated[
+        str | None, typer.Option(help="Snapshot to export, defaults to the current one")
+    ] = None,
+    output: Annotated[
+        Path | None, typer.Option("--output", "-o", help="File to write, defaults to stdout")
+    ] = None,
+    compress: Annotated[
+        bool, typer.Option("--gzip", help="Compress the export with gzip")
+    ] = False,
+):
+    """
+    Export the accounts of a snapshot as JSON lines or CSV
+    """
+    import gzip
+    import io
+    import sys
+    from contextlib import ExitStack
+
+    try:
+        storage = get_store()
+
+        with ExitStack() as stack:
+            if output is None:
+                binary = sys.stdout.buffer
+            else:
+                binary = stack.enter_context(open(output, "wb"))
+
+            if compress:
+                binary = stack.enter_context(gzip.GzipFile(fileobj=binary, mode="wb"))
+
+            out = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+            count = storage.export_snapshot(snapshot, export_format, out)
+            # Leave closing the binary stream to the stack, never stdout
+            out.flush()
+            out.detach()
+
+        if output is not None:
+            print(f"Exported {count} accounts to {output}")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+@app.command()
+def rekey(
+    workers: Annotated[
+        int,
+        typer.Option(min=1, help="Processes re-encrypting secrets, defaults to the CPU count"),
+    ] = os.cpu_count() or 1,
+    range_size: Annotated[
+        int, typer.Option(min=1, help="Secrets re-encrypted by a process at a time")
+    ] = 5000,
+):
+    """
+    Rotate the vault key: re-encrypt every secret, snapshots included, with a
+    new master password.
+
+    An interrupted rotation resumes when run again with the same new password.
+    """
+    from internal.commands.vault.vault import get_vault
+
+    try:
+        vault = get_vault()
+        password = None
+        if vault.seconds_left() is None:
+            password = typer.prompt("Current master password", hide_input=True)
+        new_password = typer.prompt(
+            "New master password", hide_input=True, confirmation_prompt=True
+        )
+
+        def on_progress(done: int, total: int):
+            print(f"\r{done}/{total} ranges", end="", flush=True)
+
+        rotated = vault.rekey(new_password, password, workers, range_size, on_progress)
+        print(f"\nRe-encrypted {rotated} secrets")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+@app.command("migrate-keys")
+def migrate_keys():
+    """
+    Convert account ids, snapshots included, to 16-byte keys, shrinking the
+    store and its indexes. Ids read the same afterwards.
+
+    Every id has to be a UUID. Rows are converted in batches other commands
+    can write between, and an interrupted migration finishes when run
+    again. Freed pages are reused by later writes, `store gc` returns them
+    to the OS on stores with incremental auto-vacuum.
+    """
+    try:
+        converted = get_store().migrate_keys()
+        print(f"Converted {converted} accounts")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
 if __name__ == "__main__":
     app()
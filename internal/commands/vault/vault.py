@@ -0,0 +1,91 @@
+from typing import Annotated
+
+import typer
+
+app = typer.Typer(no_args_is_help=True, help="Manage the encrypted vault of plug password")
+
+
+def get_vault():
+    # Imported lazily so commands that don't touch the store start faster
+    from internal.services.storage.storage import get_sqlite_repository
+    from internal.services.vault.vault import Vault
+
+    return Vault(get_sqlite_repository())
+
+
+@app.command()
+def init():
+    """
+    Set the master password encrypting account secrets
+    """
+
+    password = typer.prompt("Master password", hide_input=True, confirmation_prompt=True)
+
+    try:
+        get_vault().init(password)
+        print("Vault initialized, run `vault unlock` to use it")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+@app.command()
+def unlock(
+    timeout: Annotated[
+        float | None,
+        typer.Option(
+            min=1,
+            help="Seconds the key is kept without being used, defaults to vault.idle_timeout",
+        ),
+    ] = None,
+):
+    """
+    Derive the vault key once and keep it in the unlock agent
+    """
+
+    password = typer.prompt("Master password", hide_input=True)
+
+    try:
+        get_vault().unlock(password, timeout)
+        print("Vault unlocked")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+@app.command()
+def lock():
+    """
+    Make the unlock agent forget the vault key
+    """
+
+    try:
+        if get_vault().lock():
+            print("Vault locked")
+        else:
+            print("Vault is not unlocked")
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+
+@app.command()
+def status():
+    """
+    Show whether the vault is unlocked
+    """
+
+    try:
+        seconds = get_vault().seconds_left()
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
+
+    if seconds is None:
+        print("Vault is locked")
+    else:
+        print(f"Vault is unlocked, locks after {seconds}s without use")
+
+
+if __name__ == "__main__":
+    app()
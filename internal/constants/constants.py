@@ -1,3 +1,54 @@
 KEY_STORE_DIRECTORY = "location_path"
 TABLE_STORE_DIRECTORY = "sqlite_directory"
 DEFAULT_STORAGE_NAME = "passwords.sqlite"
+IMPORT_FORMATS = ("csv", "jsonl")
+TABLE_SQLITE_PRAGMAS = "sqlite_pragmas"
+# busy_timeout comes first so the other PRAGMAs wait for locks too, then
+# auto_vacuum: it only applies to new databases, before WAL is set
+DEFAULT_SQLITE_PRAGMAS: dict[str, str | int] = {
+    "busy_timeout": 5000,
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+}
+TABLE_SNAPSHOT_RETENTION = "snapshot_retention"
+DEFAULT_SNAPSHOT_RETENTION: dict[str, int] = {
+    "keep_last": 10,
+    "keep_daily": 7,
+    "keep_weekly": 4,
+}
+TABLE_SNAPSHOTS = "snapshots"
+KEY_SNAPSHOT_MODE = "mode"
+KEY_SNAPSHOT_DIRECTORY = "directory"
+SNAPSHOT_MODES = ("delta", "file")
+DEFAULT_SNAPSHOT_MODE = "delta"
+BACKUP_PAGES_PER_STEP = 1024
+# Taking the write lock again once busy_timeout ran out, after a random delay
+# of up to base * 2**attempt seconds, capped
+WRITE_LOCK_RETRIES = 5
+WRITE_LOCK_RETRY_BASE_SECONDS = 0.05
+WRITE_LOCK_RETRY_MAX_SECONDS = 1.0
+# Rows a schema migration changes per transaction
+MIGRATION_BATCH_SIZE = 10_000
+# Read-only connections of `serve`, each on its own thread
+DEFAULT_SERVER_READERS = 4
+TABLE_VAULT = "vault"
+KEY_VAULT_IDLE_TIMEOUT = "idle_timeout"
+DEFAULT_VAULT_IDLE_TIMEOUT = 900
+# scrypt with 64 MiB of memory, a few hundred milliseconds per derivation
+DEFAULT_SCRYPT_N = 2**16
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+TABLE_ACCOUNTS = "accounts"
+KEY_ACCOUNT_KEY_FORMAT = "key_format"
+# "text" keeps account ids as UUID strings, "blob" as 16 raw bytes. New
+# stores get blob keys, account ids are always UUIDs outside tests
+ACCOUNT_KEY_FORMATS = ("text", "blob")
+DEFAULT_ACCOUNT_KEY_FORMAT = "blob"
+# Named charsets of `account generate`, see `PasswordGenerator`
+PASSWORD_POLICIES = ("strong", "alnum", "readable", "printable", "hex", "digits")
+DEFAULT_PASSWORD_POLICY = "strong"
+DEFAULT_PASSWORD_LENGTH = 20
@@ -0,0 +1,198 @@
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable, Iterable
+from typing import TypeVar
+
+from internal.repositories.store import (
+    AccountRecord,
+    DiffRow,
+    RekeyRange,
+    SnapshotInfo,
+    Store,
+    VaultMeta,
+)
+
+T = TypeVar("T")
+
+
+class AsyncStore(ABC):
+    """
+    Interface AsyncStore.
+
+    Async counterpart of `Store`, for embedding in an asyncio service: every
+    method behaves like the `Store` method of the same name, see there for
+    details, without blocking the event loop.
+    """
+
+    @abstractmethod
+    async def open(self) -> None:
+        """
+        Open the storage ahead of the first call, so it doesn't pay for it.
+        """
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        Close the storage once pending calls are done.
+        """
+        pass
+
+    @abstractmethod
+    async def run_sync(self, func: Callable[[Store], T]) -> T:
+        """
+        Run a function taking the synchronous `Store` behind this one, for
+        services written against `Store`, like the vault. The function may
+        block, it doesn't run on the event loop.
+        """
+        pass
+
+    @abstractmethod
+    async def create(self) -> bool:
+        pass
+
+    @abstractmethod
+    async def get_current_table(self) -> str:
+        pass
+
+    @abstractmethod
+    async def backup_current_table(self, table_name: str) -> None:
+        pass
+
+    @abstractmethod
+    async def add_account(
+        self,
+        account_id: str,
+        platform: str,
+        secret: bytes | None = None,
+        snapshot_name: str | None = None,
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def get_secret(self, table_name: str, account_id: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    async def get_vault_meta(self) -> VaultMeta | None:
+        pass
+
+    @abstractmethod
+    async def init_vault(self, meta: VaultMeta) -> None:
+        pass
+
+    @abstractmethod
+    async def begin_rekey(self, meta: VaultMeta, range_size: int) -> None:
+        pass
+
+    @abstractmethod
+    async def get_rekey_meta(self) -> VaultMeta | None:
+        pass
+
+    @abstractmethod
+    async def get_rekey_ranges(self) -> list[RekeyRange]:
+        pass
+
+    @abstractmethod
+    async def read_secrets(
+        self, key_range: RekeyRange
+    ) -> list[tuple[int | str, str, bytes]]:
+        pass
+
+    @abstractmethod
+    async def write_secrets(
+        self, results: list[tuple[RekeyRange, list[tuple[int | str, bytes]]]]
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def finish_rekey(self) -> None:
+        pass
+
+    @abstractmethod
+    async def add_accounts(
+        self,
+        accounts: Iterable[tuple[str, str]],
+        batch_size: int = 1000,
+        snapshot_name: str | None = None,
+    ) -> int:
+        """
+        The accounts are consumed off the event loop, so they should be
+        cheap to produce.
+        """
+        pass
+
+    @abstractmethod
+    async def switch_table(self, table_name: str) -> None:
+        pass
+
+    @abstractmethod
+    async def get_all_tables(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    async def get_snapshots(
+        self, limit: int | None = None, offset: int = 0, since: str | None = None
+    ) -> list[SnapshotInfo]:
+        pass
+
+    @abstractmethod
+    async def drop_tables(self, table_names: list[str]) -> None:
+        pass
+
+    @abstractmethod
+    async def migrate_account_keys(self) -> int:
+        pass
+
+    @abstractmethod
+    async def reclaim_space(self, max_pages: int, step_pages: int = 256) -> int:
+        pass
+
+    @abstractmethod
+    def export_table(
+        self, table_name: str, batch_size: int = 1000
+    ) -> AsyncIterator[tuple[str, str]]:
+        """
+        Rows are fetched `batch_size` at a time, one hop off the event loop
+        per batch.
+        """
+        pass
+
+    @abstractmethod
+    def diff_tables(
+        self, table_a: str, table_b: str, batch_size: int = 1000
+    ) -> AsyncIterator[DiffRow]:
+        """
+        Rows are fetched `batch_size` at a time, one hop off the event loop
+        per batch.
+        """
+        pass
+
+    @abstractmethod
+    async def diff_stat(self, table_a: str, table_b: str) -> dict[str, int]:
+        pass
+
+    @abstractmethod
+    async def find_accounts(
+        self, table_name: str, platform: str
+    ) -> list[tuple[str, str]]:
+        pass
+
+    @abstractmethod
+    async def search_accounts(
+        self, table_name: str, text: str, limit: int = 50
+    ) -> list[tuple[str, str]]:
+        pass
+
+    @abstractmethod
+    async def read_table(self, table_name: str) -> list[tuple[str, str]]:
+        pass
+
+    @abstractmethod
+    def iter_accounts(
+        self, table_name: str, batch_size: int = 1000
+    ) -> AsyncIterator[AccountRecord]:
+        """
+        Rows are fetched `batch_size` at a time, one hop off the event loop
+        per batch.
+        """
+        pass
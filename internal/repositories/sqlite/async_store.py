@@ -0,0 +1,110 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, TypeVar
+
+from internal.repositories.async_store import AsyncStore
+from internal.repositories.store import AccountRecord, DiffRow, Store
+
+T = TypeVar("T")
+
+
+@AsyncStore.register
+class AsyncSqliteStore:
+    """
+    Asyncio store serving a SQLite `Store` from a dedicated thread.
+
+    sqlite3 calls block, so each one is handed to a single worker thread
+    that owns the store and its connection, which stays open between calls.
+    Calls run one at a time in the order they were made, as the one
+    connection requires anyway, while the event loop keeps serving other
+    requests.
+
+    Store methods are reached through `__getattr__` as coroutine functions,
+    only those streaming rows are defined here.
+    """
+
+    def __init__(self, store: Store) -> None:
+        self.__store = store
+        self.__executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="plug-password-store"
+        )
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        # Private names aren't forwarded, so an instance missing its store
+        # can't recurse looking it up
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return partial(self.__call, getattr(self.__store, name))
+
+    async def __aenter__(self) -> "AsyncSqliteStore":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        connection = getattr(self.__store, "connection", None)
+        if connection is not None:
+            await self.__call(connection.get)
+
+    async def close(self) -> None:
+        close = getattr(self.__store, "close", None)
+        # Queued behind every pending call, so awaiting it drains them while
+        # the event loop keeps running, and the shutdown has nothing to wait on
+        await self.__call(close if close is not None else lambda: None)
+        self.__executor.shutdown(wait=False)
+
+    async def run_sync(self, func: Callable[[Store], T]) -> T:
+        return await self.__call(func, self.__store)
+
+    def export_table(
+        self, table_name: str, batch_size: int = 1000
+    ) -> AsyncIterator[tuple[str, str]]:
+        return self.__stream(
+            partial(self.__store.export_table, table_name, batch_size), batch_size
+        )
+
+    def diff_tables(
+        self, table_a: str, table_b: str, batch_size: int = 1000
+    ) -> AsyncIterator[DiffRow]:
+        return self.__stream(
+            partial(self.__store.diff_tables, table_a, table_b, batch_size), batch_size
+        )
+
+    def iter_accounts(
+        self, table_name: str, batch_size: int = 1000
+    ) -> AsyncIterator[AccountRecord]:
+        return self.__stream(
+            partial(self.__store.iter_accounts, table_name, batch_size), batch_size
+        )
+
+    async def __call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, partial(func, *args, **kwargs))
+
+    async def __stream(
+        self, open_rows: Callable[[], Iterator[T]], batch_size: int
+    ) -> AsyncIterator[T]:
+        if batch_size < 1:
+            raise ValueError("batch size must be greater than 0")
+
+        # The iterator holds a cursor, so it is only ever advanced on the
+        # store thread, a batch per hop
+        rows = await self.__call(open_rows)
+
+        try:
+            while True:
+                batch = await self.__call(lambda: list(islice(rows, batch_size)))
+                if not batch:
+                    break
+
+                for row in batch:
+                    yield row
+        finally:
+            close = getattr(rows, "close", None)
+            if close is not None:
+                await self.__call(close)
@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from internal.repositories.sqlite.store import SqliteStore
+from internal.repositories.store import Store, VaultMeta
+
+# A file written this close to when it was last checked may be written again
+# without its mtime changing, so it is checked with a query instead
+_RACY_SECONDS = 1.0
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+
+
+@Store.register
+class CachingStore:
+    """
+    Store that remembers the active table and the table names read from the
+    SQLite store it wraps, until the database changes.
+
+    Writes through this store drop the cache. Commits by other connections
+    and processes are noticed through `PRAGMA data_version`, which changes
+    whenever another connection commits. While the database file and its
+    WAL keep the mtime and size seen at the last check, not even that is
+    queried.
+
+    Only the calls that read or drop the cache are defined here, every
+    other attribute is the wrapped store's.
+    """
+
+    def __init__(self, store: SqliteStore) -> None:
+        self.__store = store
+        self.__entries: dict[str, str | list[str]] = {}
+        self.__hits = 0
+        self.__misses = 0
+
+        self.__conn: sqlite3.Connection | None = None
+        self.__data_version: int | None = None
+        self.__files: tuple | None = None
+        self.__checked_at = 0.0
+
+    def __getattr__(self, name: str) -> Any:
+        # Private names aren't forwarded, so an instance missing its store
+        # can't recurse looking it up
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.__store, name)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.__hits, self.__misses)
+
+    def clear_cache(self) -> None:
+        self.__entries.clear()
+
+    def close(self) -> None:
+        self.clear_cache()
+        self.__conn = None
+        self.__store.close()
+
+    def create(self) -> bool:
+        self.clear_cache()
+        return self.__store.create()
+
+    def get_current_table(self) -> str:
+        return self.__cached("current_table", self.__store.get_current_table)  # type: ignore[return-value]
+
+    def backup_current_table(self, table_name: str) -> None:
+        self.clear_cache()
+        self.__store.backup_current_table(table_name)
+
+    def add_account(
+        self,
+        account_id: str,
+        platform: str,
+        secret: bytes | None = None,
+        snapshot_name: str | None = None,
+    ) -> None:
+        if snapshot_name is not None:
+            self.clear_cache()
+        self.__store.add_account(account_id, platform, secret, snapshot_name)
+
+    def add_accounts(
+        self,
+        accounts: Iterable[tuple[str, str]],
+        batch_size: int = 1000,
+        snapshot_name: str | None = None,
+    ) -> int:
+        if snapshot_name is not None:
+            self.clear_cache()
+        return self.__store.add_accounts(accounts, batch_size, snapshot_name)
+
+    def begin_rekey(self, meta: VaultMeta, range_size: int) -> None:
+        self.clear_cache()
+        self.__store.begin_rekey(meta, range_size)
+
+    def finish_rekey(self) -> None:
+        self.clear_cache()
+        self.__store.finish_rekey()
+
+    def switch_table(self, table_name: str) -> None:
+        self.clear_cache()
+        self.__store.switch_table(table_name)
+
+    def get_all_tables(self) -> list[str]:
+        return list(self.__cached("tables", self.__store.get_all_tables))
+
+    def drop_tables(self, table_names: list[str]) -> None:
+        self.clear_cache()
+        self.__store.drop_tables(table_names)
+
+    def migrate_account_keys(self) -> int:
+        self.clear_cache()
+        return self.__store.migrate_account_keys()
+
+    def __cached(self, key: str, read):
+        if key in self.__entries and self.__unchanged():
+            self.__hits += 1
+            return self.__entries[key]
+
+        self.__misses += 1
+        # Stamp before reading, so a change made meanwhile is seen next time
+        self.__unchanged()
+        value = read()
+        self.__entries[key] = value
+        return value
+
+    def __unchanged(self) -> bool:
+        """
+        Check whether the database may have changed since the last check,
+        dropping the cache if it did.
+        """
+
+        conn = self.__store.connection.get()
+        files = self.__file_stamps()
+
+        if (
+            conn is self.__conn
+            and files == self.__files
+            and not self.__racy(files, self.__checked_at)
+        ):
+            return True
+
+        data_version = conn.execute("PRAGMA data_version;").fetchone()[0]
+        unchanged = conn is self.__conn and data_version == self.__data_version
+        if not unchanged:
+            self.__entries.clear()
+
+        self.__conn = conn
+        self.__data_version = data_version
+        self.__files = files
+        self.__checked_at = time.time()
+        return unchanged
+
+    def __file_stamps(self) -> tuple:
+        db_path = self.__store.connection.db_path
+        return tuple(
+            self.__stamp(path)
+            for path in (db_path, Path(f"{db_path}-wal"))
+        )
+
+    def __stamp(self, path: Path) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def __racy(self, files: tuple, checked_at: float) -> bool:
+        newest = max((stamp[0] for stamp in files if stamp is not None), default=0)
+        return checked_at - newest / 1e9 < _RACY_SECONDS
@@ -0,0 +1,113 @@
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+from internal.constants.constants import DEFAULT_SQLITE_PRAGMAS
+
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+# PRAGMAs that only tune reads, the others need write access to the database
+_READ_PRAGMAS = ("busy_timeout", "mmap_size", "cache_size", "temp_store")
+
+
+class ConnectionManager:
+    """
+    Own the SQLite connection of a store.
+
+    The connection is opened on first use, tuned with the configured PRAGMAs
+    and then reused for the rest of the process. A forked child process opens
+    its own connection instead of sharing the parent's. A read-only manager
+    opens it like `open_readonly`.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        pragmas: dict[str, str | int] | None = None,
+        readonly: bool = False,
+    ) -> None:
+        self.__db_path = db_path
+        self.__pragmas = self.__validate_pragmas(
+            {**DEFAULT_SQLITE_PRAGMAS, **(pragmas or {})}
+        )
+        self.__readonly = readonly
+        self.__conn: sqlite3.Connection | None = None
+        self.__pid: int | None = None
+
+    @property
+    def db_path(self) -> Path:
+        return self.__db_path
+
+    @property
+    def pragmas(self) -> dict[str, str | int]:
+        return dict(self.__pragmas)
+
+    def get(self) -> sqlite3.Connection:
+        """
+        Get the shared connection, opening it if needed.
+        """
+
+        if self.__conn is None or self.__pid != os.getpid():
+            self.__conn = self.__open()
+            self.__pid = os.getpid()
+
+        return self.__conn
+
+    def open_readonly(self) -> sqlite3.Connection:
+        """
+        Open a new read-only connection to the database, owned by the caller.
+        In WAL mode its reads don't block writers on the shared connection.
+        """
+
+        conn = sqlite3.connect(
+            self.__db_path.resolve().as_uri() + "?mode=ro", uri=True
+        )
+
+        try:
+            for key in _READ_PRAGMAS:
+                if key in self.__pragmas:
+                    conn.execute(f"PRAGMA {key} = {self.__pragmas[key]};")
+        except sqlite3.Error:
+            conn.close()
+            raise
+
+        return conn
+
+    def close(self) -> None:
+        """
+        Close the shared connection if it is open in this process.
+        """
+
+        if self.__conn is not None and self.__pid == os.getpid():
+            self.__conn.close()
+
+        self.__conn = None
+        self.__pid = None
+
+    def __open(self) -> sqlite3.Connection:
+        if self.__readonly:
+            return self.open_readonly()
+
+        # uri=True so snapshot files can be attached read-only with URI filenames
+        conn = sqlite3.connect(str(self.__db_path), uri=True)
+
+        try:
+            for key, value in self.__pragmas.items():
+                conn.execute(f"PRAGMA {key} = {value};")
+        except sqlite3.Error:
+            conn.close()
+            raise
+
+        return conn
+
+    def __validate_pragmas(
+        self, pragmas: dict[str, str | int]
+    ) -> dict[str, str | int]:
+        for key, value in pragmas.items():
+            if key not in DEFAULT_SQLITE_PRAGMAS:
+                raise ValueError(f"unsupported sqlite pragma: {key}")
+
+            if not _PRAGMA_VALUE.match(str(value)):
+                raise ValueError(f"invalid value for sqlite pragma {key}: {value}")
+
+        return pragmas
@@ -0,0 +1,120 @@
+from internal.repositories.sqlite.snapshots import KIND_DELTA, KIND_LIVE
+
+# Platform of an account as of a snapshot, NULL if it didn't exist then
+_PLATFORM_AT = """(
+    SELECT CASE WHEN x.deleted THEN NULL ELSE x.platform END
+    FROM snapshot_deltas x
+    WHERE x.account_id = c.account_id AND x.snapshot_id <= ?
+    ORDER BY x.snapshot_id DESC LIMIT 1
+)"""
+
+_LIVE_PLATFORM = "(SELECT a.platform FROM accounts a WHERE a.id = c.account_id)"
+
+_CLASSIFY = """
+    SELECT
+        CASE
+            WHEN platform_a IS NULL THEN 'added'
+            WHEN platform_b IS NULL THEN 'removed'
+            ELSE 'changed'
+        END AS change,
+        id, platform_a, platform_b
+    FROM ({pairs})
+    WHERE platform_a IS NOT platform_b
+"""
+
+
+class SnapshotDiff:
+    """
+    Build queries comparing the accounts of two tables or snapshots.
+
+    Between two delta snapshots, or a delta snapshot and the live table, only
+    accounts with a delta (or a journal entry) after the older side can
+    differ, so the comparison is driven by those candidates and costs as much
+    as the changes between the two sides, not their size. Any other pair is
+    compared with keyed joins of the full views.
+    """
+
+    def query(
+        self,
+        source_a: tuple[int | None, str],
+        view_a: tuple[str, tuple],
+        source_b: tuple[int | None, str],
+        view_b: tuple[str, tuple],
+    ) -> tuple[str, tuple]:
+        """
+        Get a query, and its parameters, selecting
+        `(change, id, platform_a, platform_b)` of every account that differs,
+        where change is 'added', 'removed' or 'changed' going from a to b.
+
+        Args:
+            source_a: Snapshot id and kind of a, see `DeltaSnapshots.resolve`
+            view_a: Query selecting every account of a, see `DeltaSnapshots.view`
+            source_b: Snapshot id and kind of b
+            view_b: Query selecting every account of b
+        """
+
+        (id_a, kind_a), (id_b, kind_b) = source_a, source_b
+        kinds = {kind_a, kind_b}
+
+        if kinds <= {KIND_DELTA} or kinds == {KIND_DELTA, KIND_LIVE}:
+            pairs, params = self.__delta_pairs(id_a, kind_a, id_b, kind_b)
+        else:
+            pairs, params = self.__joined_pairs(view_a, view_b)
+
+        return _CLASSIFY.format(pairs=pairs), params
+
+    def stat_query(self, query: tuple[str, tuple]) -> tuple[str, tuple]:
+        """
+        Get a query counting the rows of a diff query by change.
+        """
+        sql, params = query
+        return f"SELECT change, COUNT(*) FROM ({sql}) GROUP BY change", params
+
+    def __delta_pairs(
+        self, id_a: int | None, kind_a: str, id_b: int | None, kind_b: str
+    ) -> tuple[str, tuple]:
+        # The live table is newer than every snapshot
+        live_a, live_b = kind_a == KIND_LIVE, kind_b == KIND_LIVE
+        older = min(i for i in (id_a, id_b) if i is not None)
+
+        candidates = "SELECT DISTINCT account_id FROM snapshot_deltas WHERE snapshot_id > ?"
+        candidate_params: list = [older]
+
+        if live_a or live_b:
+            candidates += " UNION SELECT account_id FROM snapshot_journal"
+        else:
+            candidates += " AND snapshot_id <= ?"
+            candidate_params.append(max(id_a, id_b))  # type: ignore[type-var]
+
+        columns = []
+        column_params: list = []
+        for snapshot_id, live in ((id_a, live_a), (id_b, live_b)):
+            if live:
+                columns.append(_LIVE_PLATFORM)
+            else:
+                columns.append(_PLATFORM_AT)
+                column_params.append(snapshot_id)
+
+        pairs = f"""
+            SELECT c.account_id AS id, {columns[0]} AS platform_a, {columns[1]} AS platform_b
+            FROM ({candidates}) c
+        """
+
+        # Parameters bind in the order they appear in the query text
+        return pairs, (*column_params, *candidate_params)
+
+    def __joined_pairs(
+        self, view_a: tuple[str, tuple], view_b: tuple[str, tuple]
+    ) -> tuple[str, tuple]:
+        (sql_a, params_a), (sql_b, params_b) = view_a, view_b
+
+        pairs = f"""
+            WITH a AS ({sql_a}), b AS ({sql_b})
+            SELECT a.id AS id, a.platform AS platform_a, b.platform AS platform_b
+            FROM a LEFT JOIN b ON b.id = a.id
+            UNION ALL
+            SELECT b.id, NULL, b.platform
+            FROM b WHERE NOT EXISTS (SELECT 1 FROM a WHERE a.id = b.id)
+        """
+
+        return pairs, (*params_a, *params_b)
@@ -0,0 +1,142 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+from internal.services.snapshot.snapshot import Snapshot
+
+# SQLite refuses more than 10 attached databases by default
+_MAX_ATTACHED = 8
+
+
+class FileSnapshots:
+    """
+    Snapshots stored as standalone SQLite files.
+
+    Each file is a copy of the live database written with the online backup
+    API a few pages at a time, so other connections can keep writing between
+    steps. Files are named with `Snapshot.get_snapshot_formatted` and read by
+    attaching them read-only. Because they are self-contained, cold snapshots
+    can be moved to another disk by moving the directory.
+    """
+
+    def __init__(self, directory: Path, pages_per_step: int = 1024) -> None:
+        if pages_per_step < 1:
+            raise ValueError("pages per step must be greater than 0")
+
+        self.__directory = directory
+        self.__pages_per_step = pages_per_step
+
+    @property
+    def directory(self) -> Path:
+        return self.__directory
+
+    def write(self, conn: sqlite3.Connection, name: str) -> tuple[str, int]:
+        """
+        Copy the database of the connection to a new snapshot file.
+
+        Returns:
+            tuple[str, int]: File name relative to the snapshot directory and
+            its size in bytes
+        """
+
+        self.__directory.mkdir(parents=True, exist_ok=True)
+
+        file_name = Snapshot(name, datetime.now()).get_snapshot_formatted()
+        target = self.__directory / file_name
+        if target.exists():
+            raise FileExistsError(f"Snapshot file '{target}' already exists")
+
+        tmp_target = target.with_name(f"{file_name}.tmp")
+        dst = sqlite3.connect(str(tmp_target))
+
+        try:
+            conn.backup(dst, pages=self.__pages_per_step, sleep=0.001)
+            # A self-contained file, without -wal and -shm companions
+            dst.execute("PRAGMA journal_mode = DELETE;")
+        except BaseException:
+            dst.close()
+            tmp_target.unlink(missing_ok=True)
+            raise
+
+        dst.close()
+        os.replace(tmp_target, target)
+
+        return file_name, target.stat().st_size
+
+    def rewrite(
+        self, file_name: str, tag: str, work: Callable[[sqlite3.Connection], object]
+    ) -> str:
+        """
+        Write a copy of a snapshot file changed by `work` in one transaction,
+        leaving the file itself as it is.
+
+        Returns:
+            str: Name of the copy, the file name tagged with `tag`
+        """
+
+        path = Path(file_name)
+        copy_name = f"{path.stem}.{tag}{path.suffix}"
+
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.__directory, prefix=f".{copy_name}.", suffix=".tmp"
+        )
+        os.close(fd)
+        tmp_target = Path(tmp_name)
+
+        try:
+            shutil.copyfile(self.__directory / file_name, tmp_target)
+            dst = sqlite3.connect(str(tmp_target))
+            try:
+                with dst:
+                    work(dst)
+            finally:
+                dst.close()
+            os.replace(tmp_target, self.__directory / copy_name)
+        except BaseException:
+            tmp_target.unlink(missing_ok=True)
+            raise
+
+        return copy_name
+
+    def attach(self, conn: sqlite3.Connection, snapshot_id: int, file_name: str) -> str:
+        """
+        Attach a snapshot file read-only, if it isn't already.
+
+        Returns:
+            str: Schema name the snapshot is attached as
+        """
+
+        schema = f"snapshot_{snapshot_id}"
+        attached = [row[1] for row in conn.execute("PRAGMA database_list;")]
+
+        if schema in attached:
+            return schema
+
+        path = self.__directory / file_name
+        if not path.is_file():
+            raise FileNotFoundError(f"Snapshot file '{path}' does not exist")
+
+        others = [name for name in attached if name not in ("main", "temp")]
+        if len(others) >= _MAX_ATTACHED:
+            conn.execute(f"DETACH DATABASE {others[0]};")
+
+        conn.execute(
+            f"ATTACH DATABASE ? AS {schema};", (path.resolve().as_uri() + "?mode=ro",)
+        )
+        return schema
+
+    def remove(self, conn: sqlite3.Connection, snapshot_id: int, file_name: str) -> None:
+        """
+        Detach a snapshot file and delete it.
+        """
+
+        schema = f"snapshot_{snapshot_id}"
+        attached = [row[1] for row in conn.execute("PRAGMA database_list;")]
+        if schema in attached:
+            conn.execute(f"DETACH DATABASE {schema};")
+
+        (self.__directory / file_name).unlink(missing_ok=True)
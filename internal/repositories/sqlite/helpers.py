@@ -0,0 +1,22 @@
+import sqlite3
+
+
+def table_exists(
+    conn: sqlite3.Connection, table_name: str, schema: str = "main"
+) -> bool:
+    """
+    Check whether a table with the given name exists in the database, or in
+    an attached one.
+    """
+    cursor = conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type='table' AND name=?;",
+        (table_name,),
+    )
+    return cursor.fetchone() is not None
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quote a table name so it can be safely interpolated into SQL.
+    """
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,534 @@
+import os
+import re
+import sqlite3
+import time
+import uuid
+
+from internal.repositories.sqlite.helpers import quote_identifier, table_exists
+
+KEY_FORMAT_TEXT = "text"
+KEY_FORMAT_BLOB = "blob"
+
+# Tables keeping account ids besides accounts, and the column holding them
+_ID_COLUMNS = {
+    "snapshot_deltas": "account_id",
+    "snapshot_journal": "account_id",
+    "account_secrets": "account_id",
+}
+
+
+# Tables converted in batches are copied to a table of this name, keeping
+# their rowids, and swapped in once every row is copied
+_NEW_TABLE = "account_keys_new_{table}"
+
+# Batched conversion state: how far each table is copied, keys other
+# connections changed meanwhile, and snapshot files converted so far
+_MIGRATION_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS account_keys_progress (
+        name TEXT PRIMARY KEY,
+        key_column TEXT NOT NULL,
+        id_column TEXT NOT NULL,
+        cursor,
+        rows INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS account_keys_changed (
+        name TEXT NOT NULL,
+        key NOT NULL,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS account_keys_files (
+        snapshot_id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL
+    );
+    """,
+)
+
+# Plain SQL, other connections writing meanwhile don't have `uuid_bytes`
+_CHANGE_TRIGGERS = (
+    ("insert", "INSERT", ("NEW",)),
+    ("update", "UPDATE", ("OLD", "NEW")),
+    ("delete", "DELETE", ("OLD",)),
+)
+
+_HEX = "[0-9a-fA-F]"
+_UUID_GLOB = "-".join(_HEX * size for size in (8, 4, 4, 4, 12))
+
+
+def new_account_id() -> str:
+    """
+    Generate a UUIDv7: 48 bits of Unix milliseconds then random bits, so ids
+    created later sort later and inserts land at the end of the key index.
+    """
+
+    millis = time.time_ns() // 1_000_000
+    value = int.from_bytes(millis.to_bytes(6, "big") + os.urandom(10), "big")
+    # Version 7 in bits 76-79, RFC 4122 variant in bits 62-63
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return str(uuid.UUID(int=value))
+
+
+class AccountKeys:
+    """
+    Account ids as the store keeps them.
+
+    Ids are UUID strings everywhere outside the repository. Stores created
+    with the "text" key format keep them as TEXT, stores created with or
+    migrated to the "blob" format keep the 16 raw bytes instead: less than
+    half the size in the key index, in every snapshot delta and in every
+    snapshot file. Reads give back strings whatever the format, so snapshots
+    taken before a migration read the same.
+
+    A live store is converted in batches, see `start_migration`: each table
+    is copied to a new table a batch at a time, other connections keep
+    writing to the old one meanwhile, and the copies are swapped in with one
+    short transaction. `migrate` converts a database nobody else writes to,
+    like a snapshot file, in one transaction.
+    """
+
+    def __init__(self) -> None:
+        self.__format = KEY_FORMAT_TEXT
+
+    @property
+    def key_format(self) -> str:
+        return self.__format
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """
+        Read the key format from the declared type of `accounts.id`.
+        """
+
+        for row in conn.execute("PRAGMA table_info(accounts);"):
+            if row[1] == "id":
+                is_blob = row[2].upper() == "BLOB"
+                self.__format = KEY_FORMAT_BLOB if is_blob else KEY_FORMAT_TEXT
+                return
+
+    def create_table(self, conn: sqlite3.Connection, key_format: str) -> None:
+        id_type = "BLOB" if key_format == KEY_FORMAT_BLOB else "TEXT"
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS accounts(id {id_type} NOT NULL PRIMARY KEY,platform TEXT NOT NULL);"
+        )
+        self.__format = key_format
+
+    def encode(self, account_id: str) -> str | bytes:
+        """
+        Raises:
+            ValueError: If the store keeps blob keys and the id isn't a UUID
+        """
+
+        if self.__format == KEY_FORMAT_TEXT:
+            return account_id
+
+        try:
+            return uuid.UUID(account_id).bytes
+        except ValueError:
+            raise ValueError(f"Account id '{account_id}' is not a UUID")
+
+    def decode(self, key: str | bytes) -> str:
+        if isinstance(key, bytes):
+            return str(uuid.UUID(bytes=key))
+        return key
+
+    def decode_rows(self, rows: list[tuple]) -> list[tuple]:
+        """
+        Decode the id in the first column of rows.
+        """
+        return [(self.decode(row[0]), *row[1:]) for row in rows]
+
+    def migrate(self, conn: sqlite3.Connection) -> int:
+        """
+        Convert the TEXT account ids of a database nobody else writes to,
+        to 16-byte keys, in the caller's transaction. The accounts table is rebuilt with a BLOB id
+        keeping the rowids, the full-text index is dropped to be rebuilt and
+        account triggers have to be created again.
+
+        Returns:
+            int: Number of accounts converted
+
+        Raises:
+            ValueError: If an id isn't a UUID
+        """
+
+        tables = ["accounts", *[table for table in _ID_COLUMNS if table_exists(conn, table)]]
+        legacy = [
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM snapshots WHERE kind = 'table';"
+            ).fetchall()
+        ] if table_exists(conn, "snapshots") else []
+
+        columns = [
+            *((table, _ID_COLUMNS.get(table, "id")) for table in tables),
+            *((name, "id") for name in legacy),
+        ]
+
+        for table, column in columns:
+            cur = conn.execute(
+                f"SELECT {column} FROM {quote_identifier(table)} WHERE typeof({column}) = 'text';"
+            )
+            for (account_id,) in cur:
+                try:
+                    uuid.UUID(account_id)
+                except ValueError:
+                    raise ValueError(
+                        f"Account id '{account_id}' in '{table}' is not a UUID"
+                    )
+
+        conn.create_function("uuid_bytes", 1, _uuid_bytes, deterministic=True)
+
+        # Rewriting the secrets fires their journal triggers, keep the
+        # journal as it was
+        journal = []
+        if table_exists(conn, "snapshot_journal"):
+            journal = [
+                _uuid_bytes(row[0])
+                for row in conn.execute("SELECT account_id FROM snapshot_journal;")
+            ]
+
+        conn.execute("DROP TABLE IF EXISTS accounts_fts;")
+        conn.execute(
+            "CREATE TABLE accounts_blob_keys(id BLOB NOT NULL PRIMARY KEY,platform TEXT NOT NULL);"
+        )
+        cur = conn.execute("""
+            INSERT INTO accounts_blob_keys (rowid, id, platform)
+            SELECT rowid, uuid_bytes(id), platform FROM accounts ORDER BY rowid;
+        """)
+        converted = cur.rowcount
+
+        for trigger in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'accounts';"
+        ).fetchall():
+            conn.execute(f"DROP TRIGGER {quote_identifier(trigger[0])};")
+        conn.execute("DROP TABLE accounts;")
+        conn.execute("ALTER TABLE accounts_blob_keys RENAME TO accounts;")
+
+        for table, column in columns[1:]:
+            if table == "snapshot_journal":
+                continue
+            conn.execute(
+                f"UPDATE {quote_identifier(table)} SET {column} = uuid_bytes({column}) "
+                f"WHERE typeof({column}) = 'text';"
+            )
+
+        if table_exists(conn, "snapshot_journal"):
+            conn.execute("DELETE FROM snapshot_journal;")
+            conn.executemany(
+                "INSERT OR IGNORE INTO snapshot_journal (account_id) VALUES (?);",
+                [(account_id,) for account_id in journal],
+            )
+
+        self.__format = KEY_FORMAT_BLOB
+        return converted
+
+    def migrating(self, conn: sqlite3.Connection) -> bool:
+        return table_exists(conn, "account_keys_progress")
+
+    def start_migration(self, conn: sqlite3.Connection) -> None:
+        """
+        Prepare the batched conversion of the live database, in the caller's
+        transaction, unless a previous run already did. Cheap: tables are
+        created empty.
+
+        Every table keeping account ids gets an empty copy with 16-byte ids,
+        and the live ones get triggers recording the keys other connections
+        change from now on, so `migrate_batch` can copy those rows again.
+        """
+
+        if self.migrating(conn):
+            return
+
+        for statement in _MIGRATION_SCHEMA:
+            conn.execute(statement)
+
+        tables = [("accounts", "rowid", "id")]
+        for table, column in _ID_COLUMNS.items():
+            if table_exists(conn, table):
+                key = "rowid" if table == "snapshot_deltas" else column
+                tables.append((table, key, column))
+        if table_exists(conn, "snapshots"):
+            # Legacy snapshot tables never change, they need no triggers
+            tables.extend(
+                (row[0], "rowid", "id")
+                for row in conn.execute(
+                    "SELECT name FROM snapshots WHERE kind = 'table' ORDER BY id;"
+                )
+            )
+
+        for table, key, column in tables:
+            conn.execute(
+                "INSERT INTO account_keys_progress (name, key_column, id_column) "
+                "VALUES (?, ?, ?);",
+                (table, key, column),
+            )
+            self.__create_new_table(conn, table)
+            if table == "accounts" or table in _ID_COLUMNS:
+                self.__create_change_triggers(conn, table, key)
+
+    def migrate_batch(self, conn: sqlite3.Connection, limit: int) -> int | None:
+        """
+        Copy the rows changed since the last batch again, then at most
+        `limit` more rows of the first table not fully copied, in key order.
+
+        Returns:
+            int | None: Number of rows copied, None once every table is
+
+        Raises:
+            ValueError: If an id isn't a UUID
+        """
+
+        conn.create_function("uuid_bytes", 1, _uuid_bytes, deterministic=True)
+        self.__copy_changed(conn)
+
+        row = conn.execute("""
+            SELECT name, key_column, id_column, cursor FROM account_keys_progress
+            WHERE done = 0 ORDER BY rowid LIMIT 1;
+        """).fetchone()
+        if row is None:
+            return None
+
+        table, key, column, cursor = row
+        if not table_exists(conn, table):
+            # A legacy snapshot dropped meanwhile
+            conn.execute("UPDATE account_keys_progress SET done = 1 WHERE name = ?;", (table,))
+            return 0
+
+        source = quote_identifier(table)
+        after, params = ("", ()) if cursor is None else (f"WHERE {key} > ?", (cursor,))
+        last, count = conn.execute(
+            f"""
+            SELECT MAX({key}), COUNT(*) FROM (
+                SELECT {key} FROM {source} {after} ORDER BY {key} LIMIT ?
+            );
+            """,
+            (*params, limit),
+        ).fetchone()
+
+        if count == 0:
+            conn.execute("UPDATE account_keys_progress SET done = 1 WHERE name = ?;", (table,))
+            return 0
+
+        where = f"{key} <= ?" if cursor is None else f"{key} > ? AND {key} <= ?"
+        self.__copy(conn, table, key, column, where, (*params, last))
+        conn.execute(
+            "UPDATE account_keys_progress SET cursor = ?, rows = rows + ? WHERE name = ?;",
+            (last, count, table),
+        )
+        return count
+
+    def pending_files(self, conn: sqlite3.Connection) -> list[tuple[int, str]]:
+        """
+        Get the snapshot files without a converted copy yet, as
+        `(snapshot_id, path)`.
+        """
+
+        return conn.execute("""
+            SELECT s.id, s.path FROM snapshots s
+            WHERE s.kind = 'file'
+            AND s.id NOT IN (SELECT snapshot_id FROM account_keys_files)
+            ORDER BY s.id;
+        """).fetchall()
+
+    def add_file(self, conn: sqlite3.Connection, snapshot_id: int, path: str) -> None:
+        """
+        Record the converted copy of a snapshot file, swapped in by
+        `finish_migration`.
+        """
+
+        conn.execute(
+            "INSERT OR REPLACE INTO account_keys_files (snapshot_id, path) VALUES (?, ?);",
+            (snapshot_id, path),
+        )
+
+    def finish_migration(self, conn: sqlite3.Connection) -> list[tuple[int | None, str]]:
+        """
+        Swap the copied tables and snapshot files in, in the caller's
+        transaction, once `migrate_batch` copied every table and every
+        snapshot file has a converted copy. Account triggers and indexes
+        went with the old tables and have to be created again.
+
+        Returns:
+            list[tuple[int | None, str]]: Snapshot files no longer used, the
+                replaced ones with their snapshot id, to delete after commit
+
+        Raises:
+            ValueError: If an id isn't a UUID
+        """
+
+        conn.create_function("uuid_bytes", 1, _uuid_bytes, deterministic=True)
+        self.__copy_changed(conn)
+
+        obsolete: list[tuple[int | None, str]] = [
+            (None, row[0])
+            for row in conn.execute("""
+                SELECT path FROM account_keys_files
+                WHERE snapshot_id NOT IN (SELECT id FROM snapshots);
+            """)
+        ]
+        for snapshot_id, old_path, new_path in conn.execute("""
+            SELECT s.id, s.path, f.path FROM snapshots s
+            JOIN account_keys_files f ON f.snapshot_id = s.id;
+        """).fetchall():
+            # A file missing when the conversion ran keeps its path
+            if new_path != old_path:
+                conn.execute("UPDATE snapshots SET path = ? WHERE id = ?;", (new_path, snapshot_id))
+                obsolete.append((snapshot_id, old_path))
+
+        tables = [
+            row[0] for row in conn.execute("SELECT name FROM account_keys_progress;").fetchall()
+        ]
+        # Every old table goes before any copy takes its name, so no trigger
+        # ever points at a missing table
+        for table in tables:
+            conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(table)};")
+        for table in tables:
+            new_table = quote_identifier(_NEW_TABLE.format(table=table))
+            if table == "accounts" or table in _ID_COLUMNS or self.__in_catalog(conn, table):
+                conn.execute(f"ALTER TABLE {new_table} RENAME TO {quote_identifier(table)};")
+            else:
+                conn.execute(f"DROP TABLE {new_table};")
+
+        self.__drop_migration_schema(conn)
+        self.__format = KEY_FORMAT_BLOB
+        return obsolete
+
+    def abort_migration(self, conn: sqlite3.Connection) -> list[str]:
+        """
+        Drop what a batched conversion created, leaving the store as it was,
+        in the caller's transaction.
+
+        Returns:
+            list[str]: Converted snapshot files to delete after commit
+        """
+
+        if not self.migrating(conn):
+            return []
+
+        files = [row[0] for row in conn.execute("SELECT path FROM account_keys_files;")]
+        for (table,) in conn.execute("SELECT name FROM account_keys_progress;").fetchall():
+            new_table = quote_identifier(_NEW_TABLE.format(table=table))
+            conn.execute(f"DROP TABLE IF EXISTS {new_table};")
+            if table == "accounts" or table in _ID_COLUMNS:
+                for name, _, _ in _CHANGE_TRIGGERS:
+                    conn.execute(f"DROP TRIGGER IF EXISTS account_keys_{table}_{name};")
+
+        self.__drop_migration_schema(conn)
+        return files
+
+    def __create_new_table(self, conn: sqlite3.Connection, table: str) -> None:
+        new_table = quote_identifier(_NEW_TABLE.format(table=table))
+        if table == "accounts":
+            conn.execute(
+                f"CREATE TABLE {new_table}(id BLOB NOT NULL PRIMARY KEY,platform TEXT NOT NULL);"
+            )
+            return
+
+        # Same definition under the new name: declared TEXT columns keep
+        # blobs as they are
+        (sql,) = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,)
+        ).fetchone()
+        definition = re.sub(r'^CREATE TABLE\s+("(?:[^"]|"")*"|[^\s(]+)', "", sql)
+        conn.execute(f"CREATE TABLE {new_table} {definition};")
+
+    def __create_change_triggers(self, conn: sqlite3.Connection, table: str, key: str) -> None:
+        for name, event, rows in _CHANGE_TRIGGERS:
+            records = "".join(
+                f"INSERT OR IGNORE INTO account_keys_changed VALUES ('{table}', {row}.{key});"
+                for row in rows
+            )
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS account_keys_{table}_{name}
+                AFTER {event} ON {table} BEGIN
+                    {records}
+                END;
+            """)
+
+    def __copy_changed(self, conn: sqlite3.Connection) -> None:
+        """
+        Copy again the rows changed since their table was copied up to
+        them. Changes beyond the cursor are left to the batches, they read
+        the rows as they are by then.
+        """
+
+        for table, key, column, cursor, done in conn.execute("""
+            SELECT p.name, p.key_column, p.id_column, p.cursor, p.done
+            FROM account_keys_progress p
+            WHERE EXISTS (SELECT 1 FROM account_keys_changed c WHERE c.name = p.name);
+        """).fetchall():
+            if done or cursor is not None:
+                changed = "SELECT key FROM account_keys_changed WHERE name = ?"
+                params: tuple = (table,)
+                if not done:
+                    changed += " AND key <= ?"
+                    params = (table, cursor)
+
+                new_table = quote_identifier(_NEW_TABLE.format(table=table))
+                if key == "rowid":
+                    conn.execute(f"DELETE FROM {new_table} WHERE rowid IN ({changed});", params)
+                else:
+                    conn.execute(
+                        f"DELETE FROM {new_table} WHERE {column} IN "
+                        f"(SELECT uuid_bytes(key) FROM ({changed}));",
+                        params,
+                    )
+                self.__copy(conn, table, key, column, f"{key} IN ({changed})", params)
+
+            conn.execute("DELETE FROM account_keys_changed WHERE name = ?;", (table,))
+
+    def __copy(
+        self,
+        conn: sqlite3.Connection,
+        table: str,
+        key: str,
+        column: str,
+        where: str,
+        params: tuple,
+    ) -> None:
+        source = quote_identifier(table)
+        bad = conn.execute(
+            f"""
+            SELECT {column} FROM {source}
+            WHERE ({where}) AND typeof({column}) = 'text' AND {column} NOT GLOB ?
+            LIMIT 1;
+            """,
+            (*params, _UUID_GLOB),
+        ).fetchone()
+        if bad is not None:
+            raise ValueError(f"Account id '{bad[0]}' in '{table}' is not a UUID")
+
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({source});")]
+        values = [f"uuid_bytes({name})" if name == column else name for name in columns]
+        if key == "rowid":
+            columns.insert(0, "rowid")
+            values.insert(0, "rowid")
+
+        conn.execute(
+            f"""
+            INSERT INTO {quote_identifier(_NEW_TABLE.format(table=table))} ({", ".join(columns)})
+            SELECT {", ".join(values)} FROM {source} WHERE {where};
+            """,
+            params,
+        )
+
+    def __in_catalog(self, conn: sqlite3.Connection, table: str) -> bool:
+        return table_exists(conn, "snapshots") and conn.execute(
+            "SELECT 1 FROM snapshots WHERE kind = 'table' AND name = ?;", (table,)
+        ).fetchone() is not None
+
+    def __drop_migration_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DROP TABLE account_keys_progress;")
+        conn.execute("DROP TABLE account_keys_changed;")
+        conn.execute("DROP TABLE account_keys_files;")
+
+
+def _uuid_bytes(value: str | bytes | None) -> bytes | None:
+    if value is None or isinstance(value, bytes):
+        return value
+    return uuid.UUID(value).bytes
@@ -0,0 +1,266 @@
+import sqlite3
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+from internal.repositories.sqlite.search import AccountIndex
+from internal.repositories.sqlite.secrets import AccountSecrets
+from internal.repositories.sqlite.snapshots import DeltaSnapshots
+
+
+class Migration(NamedTuple):
+    """
+    One step of the store schema.
+
+    `prepare` runs in a single transaction and should stay cheap: schema
+    changes, no row rewrites. It returns the cursor of the first batch, or
+    None when there are no rows to migrate. `batch` then gets the cursor
+    and the batch size, migrates at most that many rows in a transaction of
+    its own, and returns the next cursor and the number of rows migrated,
+    or None once nothing is left.
+    """
+
+    version: int
+    name: str
+    prepare: Callable[[sqlite3.Connection], Any]
+    batch: Callable[[sqlite3.Connection, Any, int], tuple[Any, int] | None] | None = None
+
+
+class MigrationProgress(NamedTuple):
+    version: int
+    name: str
+    rows: int
+    done: bool
+
+
+class SchemaMigrations:
+    """
+    Versioned migrations of the store schema, tracked by `PRAGMA
+    user_version`.
+
+    A migration never holds the write lock for long: rows are migrated in
+    batches of their own transactions, so other processes get the database
+    between batches, and the cursor is saved in `schema_migrations` with
+    each batch so an interrupted migration resumes where it stopped.
+    Processes migrating the same store at once take turns on the batches.
+    `user_version` only moves to a migration's version with its last batch.
+    """
+
+    def __init__(
+        self,
+        migrations: list[Migration],
+        batch_size: int,
+        on_progress: Callable[[MigrationProgress], None] | None = None,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch size must be positive")
+
+        versions = [migration.version for migration in migrations]
+        if versions != list(range(1, len(migrations) + 1)):
+            raise ValueError("migration versions must count up from 1")
+
+        self.__migrations = migrations
+        self.__batch_size = batch_size
+        self.__on_progress = on_progress
+
+    @property
+    def latest_version(self) -> int:
+        return len(self.__migrations)
+
+    def version(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+    def pending(self, conn: sqlite3.Connection) -> list[Migration]:
+        version = self.version(conn)
+        return [m for m in self.__migrations if m.version > version]
+
+    def run(
+        self,
+        write: Callable[[Callable[[sqlite3.Connection], Any]], Any],
+    ) -> int:
+        """
+        Apply the pending migrations in order.
+
+        Args:
+            write: Runs a function in a write transaction, committing it
+
+        Returns:
+            int: Number of migrations applied by this call
+
+        Raises:
+            RuntimeError: If the store has a newer schema than this version
+                knows
+        """
+
+        applied = 0
+        for migration in self.__migrations:
+            started = write(lambda conn: self.__start(conn, migration))
+            if started is None:
+                continue
+
+            applied += 1
+            done = not started
+            while not done:
+                done, rows = write(lambda conn: self.__step(conn, migration))
+                if self.__on_progress is not None:
+                    self.__on_progress(
+                        MigrationProgress(migration.version, migration.name, rows, done)
+                    )
+
+        return applied
+
+    def __start(self, conn: sqlite3.Connection, migration: Migration) -> bool | None:
+        """
+        Prepare a migration, unless it is applied already or was prepared
+        by a run that got interrupted.
+
+        Returns:
+            bool | None: True if the migration has batches left, False if it
+                is done, None if it was applied already
+        """
+
+        version = self.version(conn)
+        if version > self.latest_version:
+            raise RuntimeError(
+                f"Store schema version {version} is newer than this version "
+                f"supports ({self.latest_version})"
+            )
+        if version >= migration.version:
+            return None
+
+        self.__ensure_table(conn)
+        if self.__progress(conn, migration) is not None:
+            return True
+
+        cursor = migration.prepare(conn)
+        conn.execute(
+            """
+            INSERT INTO schema_migrations (version, name, cursor, started_at)
+            VALUES (?, ?, ?, ?);
+            """,
+            (migration.version, migration.name, cursor, _now()),
+        )
+
+        if cursor is None or migration.batch is None:
+            self.__finish(conn, migration)
+            return False
+        return True
+
+    def __step(self, conn: sqlite3.Connection, migration: Migration) -> tuple[bool, int]:
+        """
+        Migrate the next batch of rows, unless another process finished the
+        migration meanwhile.
+
+        Returns:
+            tuple[bool, int]: Whether the migration is done, and the number
+                of rows it migrated so far
+        """
+
+        cursor, rows = self.__progress(conn, migration)
+        if self.version(conn) >= migration.version:
+            return True, rows
+
+        result = migration.batch(conn, cursor, self.__batch_size)
+        if result is None:
+            self.__finish(conn, migration)
+            return True, rows
+
+        cursor, count = result
+        conn.execute(
+            "UPDATE schema_migrations SET cursor = ?, rows = rows + ? WHERE version = ?;",
+            (cursor, count, migration.version),
+        )
+        return False, rows + count
+
+    def __finish(self, conn: sqlite3.Connection, migration: Migration) -> None:
+        conn.execute(
+            "UPDATE schema_migrations SET finished_at = ? WHERE version = ?;",
+            (_now(), migration.version),
+        )
+        # Part of the transaction, like any other header change
+        conn.execute(f"PRAGMA user_version = {int(migration.version)};")
+
+    def __progress(self, conn: sqlite3.Connection, migration: Migration):
+        return conn.execute(
+            "SELECT cursor, rows FROM schema_migrations WHERE version = ?;",
+            (migration.version,),
+        ).fetchone()
+
+    def __ensure_table(self, conn: sqlite3.Connection) -> None:
+        # cursor has no declared type, so it keeps whatever type it is given
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                cursor,
+                rows INTEGER NOT NULL DEFAULT 0,
+                started_at TEXT NOT NULL,
+                finished_at TEXT
+            );
+        """)
+
+
+def store_migrations(
+    snapshots: DeltaSnapshots, secrets: AccountSecrets, index: AccountIndex
+) -> list[Migration]:
+    """
+    Migrations bringing a store, from the first version of its schema, to
+    the current one. Append new migrations, never change applied ones.
+    """
+
+    def register_legacy(conn: sqlite3.Connection, cursor: Any, batch_size: int):
+        # One table per batch, a legacy table is counted in one statement
+        row_count = snapshots.register_legacy_table(conn)
+        return None if row_count is None else (cursor, row_count)
+
+    def seed_journal(conn: sqlite3.Connection, cursor: int, batch_size: int):
+        last, count = snapshots.seed_journal(conn, cursor, batch_size)
+        return None if count == 0 else (last, count)
+
+    def prepare_search(content: str):
+        def prepare(conn: sqlite3.Connection) -> int | None:
+            index.create_indexes(conn)
+            if not index.create_search_table(conn, content):
+                return None
+            # Triggers from the start, so rows written between batches are
+            # followed, and a fill going down from the last rowid
+            return index.start_search_fill(conn, content)
+
+        return prepare
+
+    def fill_search(content: str):
+        def batch(conn: sqlite3.Connection, cursor: int, batch_size: int):
+            first, count = index.fill_search_table(conn, content, cursor, batch_size)
+            if count == 0:
+                index.finish_search_fill(conn, content)
+                return None
+            return first, count
+
+        return batch
+
+    return [
+        Migration(
+            1,
+            "snapshot catalog",
+            lambda conn: 0 if snapshots.ensure_catalog(conn) else None,
+            register_legacy,
+        ),
+        Migration(
+            2,
+            "snapshot journal",
+            lambda conn: 0 if snapshots.create_journal(conn) else None,
+            seed_journal,
+        ),
+        Migration(3, "account secrets", lambda conn: secrets.ensure_schema(conn)),
+        Migration(4, "account search", prepare_search("accounts"), fill_search("accounts")),
+        Migration(
+            5,
+            "snapshot search",
+            prepare_search("snapshot_deltas"),
+            fill_search("snapshot_deltas"),
+        ),
+    ]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
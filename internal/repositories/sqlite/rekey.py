@@ -0,0 +1,272 @@
+import sqlite3
+from pathlib import Path
+
+from internal.repositories.sqlite.helpers import table_exists
+from internal.repositories.sqlite.snapshots import KIND_FILE
+from internal.repositories.store import RekeyRange, VaultMeta
+
+# Tables holding encrypted secrets: row key column, account id column and
+# whether the key is the rowid, so ranges can be split by count
+_SECRET_TABLES = {
+    "account_secrets": ("account_id", "account_id", False),
+    "snapshot_deltas": ("rowid", "account_id", True),
+}
+
+
+class SecretRekey:
+    """
+    Bookkeeping of a vault key rotation.
+
+    The pending key parameters live in `rekey_state` until the rotation is
+    finished. Every database holding secrets, the store and each snapshot
+    file, gets its own `rekey_progress` table listing its ranges, so the
+    secrets of a range and the mark that it is done are committed in the
+    same transaction. An interrupted rotation resumes from the ranges that
+    are not done.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.__directory = directory
+        self.__files: dict[str, sqlite3.Connection] = {}
+
+    def close(self) -> None:
+        for conn in self.__files.values():
+            conn.close()
+        self.__files.clear()
+
+    def get_meta(self, conn: sqlite3.Connection) -> VaultMeta | None:
+        if not table_exists(conn, "rekey_state"):
+            return None
+
+        row = conn.execute(
+            "SELECT salt, n, r, p, check_value FROM rekey_state WHERE id = 1;"
+        ).fetchone()
+        return None if row is None else VaultMeta(*row)
+
+    def begin(self, conn: sqlite3.Connection, meta: VaultMeta, range_size: int) -> None:
+        """
+        Raises:
+            ValueError: If a rotation to another key is in progress
+        """
+
+        if range_size < 1:
+            raise ValueError("range size must be greater than 0")
+
+        pending = self.get_meta(conn)
+        if pending is not None and pending.salt != meta.salt:
+            raise ValueError("Another key rotation is in progress")
+
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rekey_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    salt BLOB NOT NULL,
+                    n INTEGER NOT NULL,
+                    r INTEGER NOT NULL,
+                    p INTEGER NOT NULL,
+                    check_value BLOB NOT NULL
+                );
+            """)
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO rekey_state (id, salt, n, r, p, check_value)
+                VALUES (1, ?, ?, ?, ?, ?);
+                """,
+                (meta.salt, meta.n, meta.r, meta.p, meta.check),
+            )
+
+        for source in self.__sources(conn):
+            source_conn = self.__source_conn(conn, source)
+            with source_conn:
+                self.__plan(source_conn, range_size)
+
+    def ranges(self, conn: sqlite3.Connection) -> list[RekeyRange]:
+        pending: list[RekeyRange] = []
+
+        for source in self.__sources(conn):
+            source_conn = self.__source_conn(conn, source)
+            if not table_exists(source_conn, "rekey_progress"):
+                continue
+
+            cur = source_conn.execute("""
+                SELECT table_name, range_start, range_end FROM rekey_progress
+                WHERE done = 0 ORDER BY table_name, range_start;
+            """)
+            pending += [RekeyRange(source, *row) for row in cur.fetchall()]
+
+        return pending
+
+    def read(
+        self, conn: sqlite3.Connection, key_range: RekeyRange
+    ) -> list[tuple[int | str, str, bytes]]:
+        key, account, _ = _SECRET_TABLES[key_range.table]
+
+        cur = self.__source_conn(conn, key_range.source).execute(
+            f"""
+            SELECT {key}, {account}, secret FROM {key_range.table}
+            WHERE {key} >= ? AND (? IS NULL OR {key} < ?) AND secret IS NOT NULL;
+            """,
+            (key_range.start, key_range.end, key_range.end),
+        )
+        return cur.fetchall()
+
+    def write(
+        self,
+        conn: sqlite3.Connection,
+        results: list[tuple[RekeyRange, list[tuple[int | str, bytes]]]],
+    ) -> None:
+        by_source: dict[str, list] = {}
+        for key_range, rows in results:
+            by_source.setdefault(key_range.source, []).append((key_range, rows))
+
+        for source, source_results in by_source.items():
+            source_conn = self.__source_conn(conn, source)
+
+            with source_conn:
+                for key_range, rows in source_results:
+                    self.__write_range(source_conn, source == "", key_range, rows)
+
+    def finish(self, conn: sqlite3.Connection) -> None:
+        """
+        Raises:
+            ValueError: If no rotation is in progress or ranges are left
+        """
+
+        meta = self.get_meta(conn)
+        if meta is None:
+            raise ValueError("No key rotation is in progress")
+
+        if len(self.ranges(conn)) > 0:
+            raise ValueError("Key rotation has ranges left")
+
+        for source in self.__sources(conn):
+            if source == "":
+                continue
+            source_conn = self.__source_conn(conn, source)
+            with source_conn:
+                source_conn.execute("DROP TABLE IF EXISTS rekey_progress;")
+                # Copied with the rest of the store by a snapshot
+                source_conn.execute("DROP TABLE IF EXISTS rekey_state;")
+
+        with conn:
+            conn.execute(
+                """
+                UPDATE vault_meta SET salt = ?, n = ?, r = ?, p = ?, check_value = ?
+                WHERE id = 1;
+                """,
+                (meta.salt, meta.n, meta.r, meta.p, meta.check),
+            )
+            conn.execute("DROP TABLE IF EXISTS rekey_progress;")
+            conn.execute("DROP TABLE rekey_state;")
+
+        self.close()
+
+    def __plan(self, conn: sqlite3.Connection, range_size: int) -> None:
+        planned = table_exists(conn, "rekey_progress")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rekey_progress (
+                table_name TEXT NOT NULL,
+                -- No declared type, so text keys aren't converted to numbers
+                range_start NOT NULL,
+                range_end,
+                done INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, range_start)
+            );
+        """)
+
+        for table, (key, _, is_rowid) in _SECRET_TABLES.items():
+            if not table_exists(conn, table):
+                continue
+
+            if is_rowid:
+                # On resume, only plan the rows snapshots appended since
+                low = conn.execute(
+                    "SELECT MAX(range_end) FROM rekey_progress WHERE table_name = ?;",
+                    (table,),
+                ).fetchone()[0]
+                if low is None:
+                    low = conn.execute(f"SELECT MIN(rowid) FROM {table};").fetchone()[0]
+                high = conn.execute(f"SELECT MAX(rowid) FROM {table};").fetchone()[0]
+                if low is None or high is None:
+                    continue
+                bounds = [
+                    (start, min(start + range_size, high + 1))
+                    for start in range(low, high + 1, range_size)
+                ]
+            elif not planned:
+                # Every range_size-th key starts a range, the last one is open
+                starts = [
+                    row[0]
+                    for i, row in enumerate(conn.execute(f"SELECT {key} FROM {table} ORDER BY {key};"))
+                    if i % range_size == 0
+                ]
+                bounds = list(zip(starts, [*starts[1:], None]))
+            else:
+                continue
+
+            conn.executemany(
+                "INSERT INTO rekey_progress (table_name, range_start, range_end) VALUES (?, ?, ?);",
+                [(table, start, end) for start, end in bounds],
+            )
+
+    def __write_range(
+        self,
+        conn: sqlite3.Connection,
+        is_store: bool,
+        key_range: RekeyRange,
+        rows: list[tuple[int | str, bytes]],
+    ) -> None:
+        key, account, _ = _SECRET_TABLES[key_range.table]
+
+        journaled: set = set()
+        if is_store and key_range.table == "account_secrets":
+            # Re-encrypting isn't a change, keep it out of the next snapshot
+            journaled = {
+                row[0]
+                for row in conn.execute(
+                    """
+                    SELECT account_id FROM snapshot_journal
+                    WHERE account_id >= ? AND (? IS NULL OR account_id < ?);
+                    """,
+                    (key_range.start, key_range.end, key_range.end),
+                )
+            }
+
+        conn.executemany(
+            f"UPDATE {key_range.table} SET secret = ? WHERE {key} = ?;",
+            [(secret, row_key) for row_key, secret in rows],
+        )
+
+        if is_store and key_range.table == "account_secrets":
+            conn.executemany(
+                "DELETE FROM snapshot_journal WHERE account_id = ?;",
+                [(row_key,) for row_key, _ in rows if row_key not in journaled],
+            )
+
+        conn.execute(
+            "UPDATE rekey_progress SET done = 1 WHERE table_name = ? AND range_start = ?;",
+            (key_range.table, key_range.start),
+        )
+
+    def __sources(self, conn: sqlite3.Connection) -> list[str]:
+        sources = [""]
+        if table_exists(conn, "snapshots"):
+            cur = conn.execute(
+                "SELECT path FROM snapshots WHERE kind = ? ORDER BY id;", (KIND_FILE,)
+            )
+            # A file removed by hand has nothing left to re-encrypt
+            sources += [
+                row[0] for row in cur.fetchall() if (self.__directory / row[0]).is_file()
+            ]
+        return sources
+
+    def __source_conn(self, conn: sqlite3.Connection, source: str) -> sqlite3.Connection:
+        if source == "":
+            return conn
+
+        if source not in self.__files:
+            self.__files[source] = sqlite3.connect(
+                str(self.__directory / source), timeout=30
+            )
+        return self.__files[source]
@@ -0,0 +1,323 @@
+import sqlite3
+
+from internal.repositories.sqlite.helpers import quote_identifier, table_exists
+from internal.repositories.sqlite.snapshots import KIND_DELTA, KIND_TABLE
+
+# Tables with a full-text table over their platform column
+SEARCH_CONTENTS = ("accounts", "snapshot_deltas")
+
+# Keep a full-text table in sync with its external content table, the
+# row each trigger reads the rowid of, and the trigger itself. `{when}` is
+# empty once the table is filled
+_FTS_TRIGGERS = (
+    (
+        "NEW",
+        """
+        CREATE TRIGGER IF NOT EXISTS {content}_fts_insert
+        AFTER INSERT ON {content} {when} BEGIN
+            INSERT INTO {content}_fts (rowid, platform) VALUES (NEW.rowid, NEW.platform);
+        END;
+        """,
+    ),
+    (
+        "OLD",
+        """
+        CREATE TRIGGER IF NOT EXISTS {content}_fts_delete
+        AFTER DELETE ON {content} {when} BEGIN
+            INSERT INTO {content}_fts ({content}_fts, rowid, platform)
+            VALUES ('delete', OLD.rowid, OLD.platform);
+        END;
+        """,
+    ),
+    (
+        "OLD",
+        """
+        CREATE TRIGGER IF NOT EXISTS {content}_fts_update
+        AFTER UPDATE OF platform ON {content} {when} BEGIN
+            INSERT INTO {content}_fts ({content}_fts, rowid, platform)
+            VALUES ('delete', OLD.rowid, OLD.platform);
+            INSERT INTO {content}_fts (rowid, platform) VALUES (NEW.rowid, NEW.platform);
+        END;
+        """,
+    ),
+)
+
+# While a full-text table is filled, its triggers only follow the rows
+# already indexed: the fill reads the others as they are when it gets there
+_FTS_FILLING = """
+    WHEN {row}.rowid >= (SELECT indexed_from FROM search_fill WHERE content = '{content}')
+"""
+
+# Keeps only the latest version of each account at or before a snapshot
+_LATEST_DELTA = """
+    d.snapshot_id <= ?
+    AND d.deleted = 0
+    AND d.snapshot_id = (
+        SELECT MAX(x.snapshot_id) FROM snapshot_deltas x
+        WHERE x.account_id = d.account_id AND x.snapshot_id <= ?
+    )
+"""
+
+
+class AccountIndex:
+    """
+    Platform lookups and full-text search over accounts.
+
+    The live `accounts` table and the `snapshot_deltas` table both have a
+    B-tree index on platform and an FTS5 table kept in sync by triggers.
+    Snapshots are immutable, so indexing the deltas they are rebuilt from is
+    enough to search whichever table `active_table` points to. Snapshot
+    files are copies of the whole database, indexes included, and are
+    searched like the live table once attached. Legacy full-copy snapshot
+    tables are not indexed and fall back to a scan.
+    """
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> None:
+        """
+        Create the platform indexes, FTS tables and their triggers if they
+        are missing, indexing the rows of the FTS tables it creates.
+        """
+
+        self.create_indexes(conn)
+
+        for content in SEARCH_CONTENTS:
+            created = self.create_search_table(conn, content)
+
+            # Also for existing tables whose content table was just rebuilt
+            self.create_search_triggers(conn, content)
+            if created:
+                conn.execute(f"INSERT INTO {content}_fts ({content}_fts) VALUES ('rebuild');")
+
+    def create_indexes(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS accounts_platform ON accounts (platform);"
+        )
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS snapshot_deltas_platform
+            ON snapshot_deltas (platform, snapshot_id);
+        """)
+
+    def create_search_table(self, conn: sqlite3.Connection, content: str) -> bool:
+        """
+        Create the empty FTS table over `content`, one of `SEARCH_CONTENTS`,
+        if it is missing.
+
+        Returns:
+            bool: True if the table was created, and has to be filled and
+                get its triggers
+        """
+
+        if table_exists(conn, f"{content}_fts"):
+            return False
+
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE {content}_fts USING fts5 (
+                platform, content='{content}', content_rowid='rowid'
+            );
+        """)
+        return True
+
+    def start_search_fill(self, conn: sqlite3.Connection, content: str) -> int:
+        """
+        Prepare the FTS table over `content`, just created, to be filled in
+        batches while other connections keep writing to `content`.
+
+        The triggers are created now, in the transaction of the FTS table,
+        but only follow rows from `indexed_from` up, which starts above the
+        last rowid: rows inserted from now on are indexed by the trigger,
+        the older ones by `fill_search_table`, going down.
+
+        Returns:
+            int: Rowid to fill the table below
+        """
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_fill (
+                content TEXT PRIMARY KEY,
+                indexed_from INTEGER NOT NULL
+            );
+        """)
+        (indexed_from,) = conn.execute(
+            f"SELECT COALESCE(MAX(rowid), 0) + 1 FROM {content};"
+        ).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO search_fill (content, indexed_from) VALUES (?, ?);",
+            (content, indexed_from),
+        )
+        self.create_search_triggers(conn, content, filling=True)
+        return indexed_from
+
+    def fill_search_table(
+        self, conn: sqlite3.Connection, content: str, before: int, limit: int
+    ) -> tuple[int, int]:
+        """
+        Index the rows of `content` with a rowid below `before`, at most
+        `limit` of them, highest rowids first, and let the triggers follow
+        them from now on. See `start_search_fill`.
+
+        Returns:
+            tuple[int, int]: Lowest rowid indexed, or `before` if none was,
+                and the number of rows indexed
+        """
+
+        first, count = conn.execute(
+            f"""
+            SELECT COALESCE(MIN(rowid), ?), COUNT(*) FROM (
+                SELECT rowid FROM {content} WHERE rowid < ? ORDER BY rowid DESC LIMIT ?
+            );
+            """,
+            (before, before, limit),
+        ).fetchone()
+
+        conn.execute(
+            f"""
+            INSERT INTO {content}_fts (rowid, platform)
+            SELECT rowid, platform FROM {content} WHERE rowid >= ? AND rowid < ?;
+            """,
+            (first, before),
+        )
+        conn.execute(
+            "UPDATE search_fill SET indexed_from = ? WHERE content = ?;", (first, content)
+        )
+        return first, count
+
+    def finish_search_fill(self, conn: sqlite3.Connection, content: str) -> None:
+        """
+        Let the triggers follow every row of `content`, once
+        `fill_search_table` has indexed them all.
+        """
+
+        for name in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {content}_fts_{name};")
+        self.create_search_triggers(conn, content)
+
+        conn.execute("DELETE FROM search_fill WHERE content = ?;", (content,))
+        if conn.execute("SELECT 1 FROM search_fill LIMIT 1;").fetchone() is None:
+            conn.execute("DROP TABLE search_fill;")
+
+    def create_search_triggers(
+        self, conn: sqlite3.Connection, content: str, filling: bool = False
+    ) -> None:
+        """
+        Keep the FTS table over `content` in sync with it from now on, only
+        for the rows already indexed if it is `filling`.
+        """
+
+        for row, trigger in _FTS_TRIGGERS:
+            when = _FTS_FILLING.format(row=row, content=content) if filling else ""
+            conn.execute(trigger.format(content=content, when=when))
+
+    def lookup_query(
+        self,
+        source: tuple[int | None, str],
+        name: str,
+        platform: str,
+        schema: str = "main",
+    ) -> tuple[str, tuple]:
+        """
+        Get a query, and its parameters, selecting `(id, platform)` of the
+        accounts with exactly the given platform.
+
+        Args:
+            source: Snapshot id and kind of the table, see `DeltaSnapshots.resolve`
+            name: Name of the table or snapshot
+            platform: Platform to look up
+            schema: Schema of the accounts table, for the live table or a
+                snapshot file
+        """
+
+        snapshot_id, kind = source
+
+        if kind == KIND_DELTA:
+            return (
+                f"""
+                SELECT d.account_id, d.platform FROM snapshot_deltas d
+                WHERE d.platform = ? AND {_LATEST_DELTA}
+                """,
+                (platform, snapshot_id, snapshot_id),
+            )
+
+        if kind == KIND_TABLE:
+            return (
+                f"SELECT id, platform FROM {quote_identifier(name)} WHERE platform = ?",
+                (platform,),
+            )
+
+        return (
+            f"SELECT id, platform FROM {schema}.accounts WHERE platform = ?",
+            (platform,),
+        )
+
+    def search_query(
+        self,
+        source: tuple[int | None, str],
+        name: str,
+        text: str,
+        limit: int,
+        schema: str = "main",
+    ) -> tuple[str, tuple]:
+        """
+        Get a query, and its parameters, selecting `(id, platform)` of the
+        accounts whose platform has words starting with every word of `text`,
+        best matches first.
+
+        Args:
+            source: Snapshot id and kind of the table, see `DeltaSnapshots.resolve`
+            name: Name of the table or snapshot
+            text: Words to search for
+            limit: Maximum number of accounts
+            schema: Schema of the accounts table, for the live table or a
+                snapshot file
+        """
+
+        snapshot_id, kind = source
+
+        if kind == KIND_DELTA:
+            return (
+                f"""
+                SELECT d.account_id, d.platform
+                FROM snapshot_deltas_fts f
+                JOIN snapshot_deltas d ON d.rowid = f.rowid
+                WHERE snapshot_deltas_fts MATCH ? AND {_LATEST_DELTA}
+                ORDER BY f.rank
+                LIMIT ?
+                """,
+                (self.__match_expression(text), snapshot_id, snapshot_id, limit),
+            )
+
+        if kind == KIND_TABLE:
+            pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace(
+                "_", "\\_"
+            ) + "%"
+            return (
+                f"""
+                SELECT id, platform FROM {quote_identifier(name)}
+                WHERE platform LIKE ? ESCAPE '\\'
+                LIMIT ?
+                """,
+                (pattern, limit),
+            )
+
+        return (
+            f"""
+            SELECT a.id, a.platform
+            FROM {schema}.accounts_fts f
+            JOIN {schema}.accounts a ON a.rowid = f.rowid
+            WHERE f.accounts_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+            """,
+            (self.__match_expression(text), limit),
+        )
+
+    def __match_expression(self, text: str) -> str:
+        """
+        Turn plain text into an FTS5 prefix query, so user input can't be
+        parsed as FTS5 syntax.
+        """
+
+        words = text.split()
+        if len(words) == 0:
+            raise ValueError("search query can't be empty string")
+
+        return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
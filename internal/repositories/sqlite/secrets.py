@@ -0,0 +1,152 @@
+import sqlite3
+
+from internal.repositories.sqlite.helpers import quote_identifier, table_exists
+from internal.repositories.sqlite.snapshots import KIND_DELTA, KIND_TABLE
+from internal.repositories.store import VaultMeta
+
+
+class AccountSecrets:
+    """
+    Encrypted account secrets and the parameters of the key protecting them.
+
+    Secrets live in `account_secrets`, next to `accounts` rather than in it,
+    so the accounts table keeps its shape. Changes to a secret are journaled
+    like changes to its account, so snapshots carry them. This class never
+    sees a key or a plaintext; `vault_meta` only holds what is needed to
+    derive and verify the key from the master password.
+    """
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> None:
+        """
+        Create the secret and vault_meta tables and their triggers if they
+        are missing. Needs the snapshot journal, see `DeltaSnapshots`.
+        """
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS account_secrets (
+                account_id TEXT NOT NULL PRIMARY KEY,
+                secret BLOB NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS account_secrets_journal_insert
+            AFTER INSERT ON account_secrets BEGIN
+                INSERT OR IGNORE INTO snapshot_journal VALUES (NEW.account_id);
+            END;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS account_secrets_journal_update
+            AFTER UPDATE ON account_secrets BEGIN
+                INSERT OR IGNORE INTO snapshot_journal VALUES (OLD.account_id);
+                INSERT OR IGNORE INTO snapshot_journal VALUES (NEW.account_id);
+            END;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS account_secrets_journal_delete
+            AFTER DELETE ON account_secrets BEGIN
+                INSERT OR IGNORE INTO snapshot_journal VALUES (OLD.account_id);
+            END;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS accounts_secret_delete
+            AFTER DELETE ON accounts BEGIN
+                DELETE FROM account_secrets WHERE account_id = OLD.id;
+            END;
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS vault_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                salt BLOB NOT NULL,
+                n INTEGER NOT NULL,
+                r INTEGER NOT NULL,
+                p INTEGER NOT NULL,
+                check_value BLOB NOT NULL
+            );
+        """)
+
+    def add(self, conn: sqlite3.Connection, account_id: str, secret: bytes) -> None:
+        conn.execute(
+            "INSERT INTO account_secrets (account_id, secret) VALUES (?, ?);",
+            (account_id, secret),
+        )
+
+    def get_meta(self, conn: sqlite3.Connection) -> VaultMeta | None:
+        if not table_exists(conn, "vault_meta"):
+            return None
+
+        row = conn.execute(
+            "SELECT salt, n, r, p, check_value FROM vault_meta WHERE id = 1;"
+        ).fetchone()
+        return None if row is None else VaultMeta(*row)
+
+    def init(self, conn: sqlite3.Connection, meta: VaultMeta) -> None:
+        """
+        Raises:
+            ValueError: If the vault is already initialized
+        """
+
+        if self.get_meta(conn) is not None:
+            raise ValueError("Vault is already initialized")
+
+        conn.execute(
+            """
+            INSERT INTO vault_meta (id, salt, n, r, p, check_value)
+            VALUES (1, ?, ?, ?, ?, ?);
+            """,
+            (meta.salt, meta.n, meta.r, meta.p, meta.check),
+        )
+
+    def secret_query(
+        self,
+        conn: sqlite3.Connection,
+        source: tuple[int | None, str],
+        name: str,
+        account_id: str,
+        schema: str = "main",
+    ) -> tuple[str, tuple]:
+        """
+        Get a query, and its parameters, selecting the `(secret)` of an
+        account, no row if it doesn't exist in the table.
+
+        Args:
+            source: Snapshot id and kind of the table, see `DeltaSnapshots.resolve`
+            name: Name of the table or snapshot
+            account_id: Id of the account
+            schema: Schema of the accounts table, for the live table or a
+                snapshot file
+        """
+
+        snapshot_id, kind = source
+
+        if kind == KIND_DELTA:
+            return (
+                """
+                SELECT secret FROM (
+                    SELECT secret, deleted FROM snapshot_deltas
+                    WHERE account_id = ? AND snapshot_id <= ?
+                    ORDER BY snapshot_id DESC LIMIT 1
+                ) WHERE deleted = 0
+                """,
+                (account_id, snapshot_id),
+            )
+
+        if kind == KIND_TABLE:
+            # Legacy full copies predate secrets
+            return (
+                f"SELECT NULL FROM {quote_identifier(name)} WHERE id = ?",
+                (account_id,),
+            )
+
+        if not table_exists(conn, "account_secrets", schema):
+            # Snapshot file written before secrets existed
+            return f"SELECT NULL FROM {schema}.accounts WHERE id = ?", (account_id,)
+
+        return (
+            f"""
+            SELECT s.secret FROM {schema}.accounts a
+            LEFT JOIN {schema}.account_secrets s ON s.account_id = a.id
+            WHERE a.id = ?
+            """,
+            (account_id,),
+        )
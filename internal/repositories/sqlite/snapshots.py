@@ -0,0 +1,592 @@
+import sqlite3
+
+from internal.repositories.sqlite.files import FileSnapshots
+from internal.repositories.sqlite.helpers import quote_identifier, table_exists
+from internal.repositories.store import SnapshotInfo
+
+LIVE_TABLE = "accounts"
+
+KIND_LIVE = "live"
+KIND_DELTA = "delta"
+KIND_TABLE = "table"
+KIND_FILE = "file"
+
+_CATALOG_COLUMNS = {
+    "kind": f"TEXT NOT NULL DEFAULT '{KIND_DELTA}'",
+    "created_at": "TEXT",
+    "row_count": "INTEGER",
+    "size_bytes": "INTEGER",
+    "path": "TEXT",
+}
+
+
+class DeltaSnapshots:
+    """
+    Copy-on-write snapshot engine.
+
+    Taking a snapshot never copies the accounts table. Triggers on `accounts`
+    journal the id of every changed row, and a snapshot only stores those
+    journaled rows as its delta against the parent snapshot. The rows of a
+    snapshot are rebuilt on read from the latest delta of each account at or
+    before that snapshot.
+
+    Every snapshot is recorded in the `snapshots` catalog with its creation
+    time, parent, row count and size. Full-copy `<name>_accounts` tables from
+    stores created before this engine are registered in the catalog too, so
+    they can still be listed, switched to and read. So are snapshots written
+    to their own file by `FileSnapshots`.
+    """
+
+    def __init__(self, files: FileSnapshots | None = None) -> None:
+        self.__files = files
+
+    def ensure_schema(self, conn: sqlite3.Connection) -> None:
+        """
+        Create the snapshot tables and triggers if they are missing.
+
+        The first time the schema is created every existing account is
+        journaled, so the first delta snapshot holds the full table, and
+        legacy full-copy tables are registered in the catalog.
+        """
+
+        register_legacy = self.ensure_catalog(conn)
+
+        if self.create_journal(conn):
+            self.seed_journal(conn)
+
+        if register_legacy:
+            while self.register_legacy_table(conn) is not None:
+                pass
+
+    def create_journal(self, conn: sqlite3.Connection) -> bool:
+        """
+        Create the delta and journal tables and the triggers journaling
+        account changes, if they are missing.
+
+        Returns:
+            bool: True if the journal was created, and has to be seeded
+                with the existing accounts, see `seed_journal`
+        """
+
+        created = not table_exists(conn, "snapshot_journal")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot_deltas (
+                snapshot_id INTEGER NOT NULL,
+                account_id TEXT NOT NULL,
+                platform TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                secret BLOB,
+                UNIQUE (account_id, snapshot_id)
+            );
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(snapshot_deltas);")}
+        if "secret" not in columns:
+            conn.execute("ALTER TABLE snapshot_deltas ADD COLUMN secret BLOB;")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS snapshot_deltas_snapshot
+            ON snapshot_deltas (snapshot_id, account_id);
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot_journal (
+                account_id TEXT NOT NULL PRIMARY KEY
+            ) WITHOUT ROWID;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS accounts_journal_insert
+            AFTER INSERT ON accounts BEGIN
+                INSERT OR IGNORE INTO snapshot_journal VALUES (NEW.id);
+            END;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS accounts_journal_update
+            AFTER UPDATE ON accounts BEGIN
+                INSERT OR IGNORE INTO snapshot_journal VALUES (OLD.id);
+                INSERT OR IGNORE INTO snapshot_journal VALUES (NEW.id);
+            END;
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS accounts_journal_delete
+            AFTER DELETE ON accounts BEGIN
+                INSERT OR IGNORE INTO snapshot_journal VALUES (OLD.id);
+            END;
+        """)
+
+        return created
+
+    def seed_journal(
+        self, conn: sqlite3.Connection, after: int = 0, limit: int | None = None
+    ) -> tuple[int, int]:
+        """
+        Journal the accounts with a rowid above `after`, at most `limit` of
+        them, in rowid order.
+
+        Returns:
+            tuple[int, int]: Last rowid journaled, or `after` if none was,
+                and the number of accounts journaled
+        """
+
+        params = (after, -1 if limit is None else limit)
+        last, count = conn.execute(
+            """
+            SELECT COALESCE(MAX(rowid), ?), COUNT(*) FROM (
+                SELECT rowid FROM accounts WHERE rowid > ? ORDER BY rowid LIMIT ?
+            );
+            """,
+            (after, *params),
+        ).fetchone()
+
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO snapshot_journal
+            SELECT id FROM accounts WHERE rowid > ? AND rowid <= ?;
+            """,
+            (after, last),
+        )
+        return last, count
+
+    def take(self, conn: sqlite3.Connection, name: str) -> int:
+        """
+        Record a snapshot of the accounts table under the given name.
+
+        Only the rows journaled since the parent snapshot are written, so the
+        cost is proportional to the number of changes, not the table size.
+
+        Raises:
+            ValueError: If a snapshot with the given name already exists
+        """
+
+        if self.exists(conn, name):
+            raise ValueError(f"Snapshot '{name}' already exists")
+
+        parent = conn.execute(
+            "SELECT id, row_count FROM snapshots WHERE kind = ? ORDER BY id DESC LIMIT 1;",
+            (KIND_DELTA,),
+        ).fetchone()
+
+        parent_id = None
+        parent_count = 0
+        if parent is not None:
+            parent_id, parent_count = parent
+            if parent_count is None:
+                parent_count = self.__count_delta_view(conn, parent_id)
+
+        # Must run before the new deltas are written: the latest delta of an
+        # account is still its state in the parent snapshot.
+        added, size_bytes = conn.execute("""
+            SELECT
+                COALESCE(SUM(
+                    (a.id IS NOT NULL) - COALESCE((
+                        SELECT NOT x.deleted FROM snapshot_deltas x
+                        WHERE x.account_id = j.account_id
+                        ORDER BY x.snapshot_id DESC LIMIT 1
+                    ), 0)
+                ), 0),
+                COALESCE(SUM(
+                    length(j.account_id)
+                    + COALESCE(length(a.platform), 0)
+                    + COALESCE(length(s.secret), 0)
+                ), 0)
+            FROM snapshot_journal j
+            LEFT JOIN accounts a ON a.id = j.account_id
+            LEFT JOIN account_secrets s ON s.account_id = a.id;
+        """).fetchone()
+
+        cur = conn.execute(
+            """
+            INSERT INTO snapshots
+                (name, parent_id, kind, created_at, row_count, size_bytes)
+            VALUES (?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'), ?, ?);
+            """,
+            (name, parent_id, KIND_DELTA, parent_count + added, size_bytes),
+        )
+        snapshot_id = cur.lastrowid
+
+        conn.execute(
+            """
+            INSERT INTO snapshot_deltas (snapshot_id, account_id, platform, deleted, secret)
+            SELECT ?, j.account_id, a.platform, a.id IS NULL, s.secret
+            FROM snapshot_journal j
+            LEFT JOIN accounts a ON a.id = j.account_id
+            LEFT JOIN account_secrets s ON s.account_id = a.id;
+            """,
+            (snapshot_id,),
+        )
+        conn.execute("DELETE FROM snapshot_journal;")
+
+        return snapshot_id  # type: ignore[return-value]
+
+    def take_file(
+        self,
+        conn: sqlite3.Connection,
+        name: str,
+        source: sqlite3.Connection | None = None,
+    ) -> int:
+        """
+        Record a snapshot of the database under the given name as its own
+        file.
+
+        Outside a transaction the copy is read through `conn` in steps and
+        the catalog entry is committed once the file is complete. Inside
+        one, the entry is left to the caller's transaction and the copy must
+        be read through `source`, another connection to the database, since
+        a connection can't back itself up mid-transaction.
+
+        Raises:
+            ValueError: If a snapshot with the given name already exists
+        """
+
+        if self.__files is None:
+            raise ValueError("Snapshot files are not enabled for this store")
+
+        if self.exists(conn, name):
+            raise ValueError(f"Snapshot '{name}' already exists")
+
+        if conn.in_transaction and source is None:
+            raise ValueError("A snapshot file taken in a transaction needs a source connection")
+
+        row_count = conn.execute("SELECT COUNT(*) FROM accounts;").fetchone()[0]
+        file_name, size_bytes = self.__files.write(source or conn, name)
+
+        in_transaction = conn.in_transaction
+        try:
+            cur = conn.execute(
+                """
+                INSERT INTO snapshots
+                    (name, kind, created_at, row_count, size_bytes, path)
+                VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'), ?, ?, ?);
+                """,
+                (name, KIND_FILE, row_count, size_bytes, file_name),
+            )
+            if not in_transaction:
+                conn.commit()
+        except sqlite3.Error:
+            if not in_transaction:
+                conn.rollback()
+            (self.__files.directory / file_name).unlink(missing_ok=True)
+            raise
+
+        return cur.lastrowid  # type: ignore[return-value]
+
+    def drop(self, conn: sqlite3.Connection, name: str) -> None:
+        """
+        Remove a snapshot without changing the rows of any other snapshot.
+
+        The deltas of a dropped delta snapshot are merged into the next one
+        where it doesn't already hold a newer version of the account. If it
+        is the newest, its accounts are journaled again so the next snapshot
+        still records them.
+
+        Raises:
+            ValueError: If the snapshot does not exist
+        """
+
+        snapshot_id, kind = self.resolve(conn, name)
+        if kind == KIND_LIVE:
+            raise ValueError(f"Table '{name}' is not a snapshot")
+
+        if kind == KIND_TABLE:
+            conn.execute(f"DROP TABLE {quote_identifier(name)};")
+            conn.execute("DELETE FROM snapshots WHERE id = ?;", (snapshot_id,))
+            return
+
+        if kind == KIND_FILE:
+            if self.__files is None:
+                raise ValueError("Snapshot files are not enabled for this store")
+
+            self.__files.remove(conn, snapshot_id, self.__path(conn, snapshot_id))  # type: ignore[arg-type]
+            conn.execute("DELETE FROM snapshots WHERE id = ?;", (snapshot_id,))
+            return
+
+        parent_id = conn.execute(
+            "SELECT parent_id FROM snapshots WHERE id = ?;", (snapshot_id,)
+        ).fetchone()[0]
+        child = conn.execute(
+            "SELECT id FROM snapshots WHERE kind = ? AND id > ? ORDER BY id LIMIT 1;",
+            (KIND_DELTA, snapshot_id),
+        ).fetchone()
+
+        if child is None:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO snapshot_journal
+                SELECT account_id FROM snapshot_deltas WHERE snapshot_id = ?;
+                """,
+                (snapshot_id,),
+            )
+        else:
+            child_id = child[0]
+            conn.execute(
+                "UPDATE OR IGNORE snapshot_deltas SET snapshot_id = ? WHERE snapshot_id = ?;",
+                (child_id, snapshot_id),
+            )
+
+            if parent_id is None:
+                # The child is now the oldest snapshot, it needs no tombstones
+                conn.execute(
+                    """
+                    DELETE FROM snapshot_deltas
+                    WHERE snapshot_id = ? AND deleted = 1
+                    AND NOT EXISTS (
+                        SELECT 1 FROM snapshot_deltas x
+                        WHERE x.account_id = snapshot_deltas.account_id
+                        AND x.snapshot_id < ?
+                    );
+                    """,
+                    (child_id, child_id),
+                )
+
+            conn.execute(
+                """
+                UPDATE snapshots SET size_bytes = (
+                    SELECT COALESCE(SUM(
+                        length(account_id)
+                        + COALESCE(length(platform), 0)
+                        + COALESCE(length(secret), 0)
+                    ), 0)
+                    FROM snapshot_deltas WHERE snapshot_id = ?
+                ) WHERE id = ?;
+                """,
+                (child_id, child_id),
+            )
+
+        conn.execute("DELETE FROM snapshot_deltas WHERE snapshot_id = ?;", (snapshot_id,))
+        conn.execute(
+            "UPDATE snapshots SET parent_id = ? WHERE parent_id = ?;",
+            (parent_id, snapshot_id),
+        )
+        conn.execute("DELETE FROM snapshots WHERE id = ?;", (snapshot_id,))
+
+    def exists(self, conn: sqlite3.Connection, name: str) -> bool:
+        """
+        Check whether the live table or a snapshot, delta, file or legacy
+        full-copy, exists.
+        """
+        if name == LIVE_TABLE:
+            return True
+
+        return self.__lookup(conn, name) is not None
+
+    def names(self, conn: sqlite3.Connection) -> list[str]:
+        """
+        Get all snapshot names, oldest first.
+        """
+
+        if not table_exists(conn, "snapshots"):
+            return []
+
+        cur = conn.execute("SELECT name FROM snapshots ORDER BY created_at, id;")
+        return [row[0] for row in cur.fetchall()]
+
+    def page(
+        self,
+        conn: sqlite3.Connection,
+        limit: int | None = None,
+        offset: int = 0,
+        since: str | None = None,
+    ) -> list[SnapshotInfo]:
+        """
+        Get a page of the snapshot catalog, oldest first.
+
+        The catalog is ordered by its `created_at` index, so a page costs the
+        same whatever the number of snapshots before it.
+        """
+
+        if not table_exists(conn, "snapshots"):
+            return []
+
+        where = ""
+        params: list = []
+        if since is not None:
+            where = "WHERE s.created_at >= ?"
+            params.append(since)
+
+        params += [-1 if limit is None else limit, offset]
+
+        cur = conn.execute(
+            f"""
+            SELECT s.name, s.created_at, p.name, s.row_count, s.size_bytes
+            FROM snapshots s
+            LEFT JOIN snapshots p ON p.id = s.parent_id
+            {where}
+            ORDER BY s.created_at, s.id
+            LIMIT ? OFFSET ?;
+            """,
+            params,
+        )
+        return [SnapshotInfo._make(row) for row in cur.fetchall()]
+
+    def resolve(self, conn: sqlite3.Connection, name: str) -> tuple[int | None, str]:
+        """
+        Get the snapshot id and kind of a table or snapshot. The live
+        accounts table has no snapshot id.
+
+        Raises:
+            ValueError: If the table or snapshot does not exist
+        """
+
+        if name == LIVE_TABLE:
+            return None, KIND_LIVE
+
+        found = self.__lookup(conn, name)
+        if found is None:
+            raise ValueError(f"Table '{name}' does not exist")
+
+        return found
+
+    def view(self, conn: sqlite3.Connection, name: str) -> tuple[str, tuple]:
+        """
+        Get a query, and its parameters, selecting `(id, platform)` of every
+        account in the given table or snapshot.
+
+        Raises:
+            ValueError: If the table or snapshot does not exist
+        """
+
+        snapshot_id, kind = self.resolve(conn, name)
+
+        if kind == KIND_LIVE:
+            return "SELECT id, platform FROM accounts", ()
+
+        if kind == KIND_TABLE:
+            return f"SELECT id, platform FROM {quote_identifier(name)}", ()
+
+        if kind == KIND_FILE:
+            schema = self.schema(conn, name)
+            return f"SELECT id, platform FROM {schema}.accounts", ()
+
+        return self.__delta_view(snapshot_id)  # type: ignore[arg-type]
+
+    def schema(self, conn: sqlite3.Connection, name: str) -> str:
+        """
+        Get the schema holding the accounts table of the live table or a file
+        snapshot, attaching the snapshot file if needed.
+
+        Raises:
+            ValueError: If it is neither the live table nor a file snapshot
+        """
+
+        snapshot_id, kind = self.resolve(conn, name)
+
+        if kind == KIND_LIVE:
+            return "main"
+
+        if kind != KIND_FILE:
+            raise ValueError(f"Snapshot '{name}' is not stored in its own file")
+
+        if self.__files is None:
+            raise ValueError("Snapshot files are not enabled for this store")
+
+        return self.__files.attach(conn, snapshot_id, self.__path(conn, snapshot_id))  # type: ignore[arg-type]
+
+    def __path(self, conn: sqlite3.Connection, snapshot_id: int) -> str:
+        return conn.execute(
+            "SELECT path FROM snapshots WHERE id = ?;", (snapshot_id,)
+        ).fetchone()[0]
+
+    def __delta_view(self, snapshot_id: int) -> tuple[str, tuple]:
+        return (
+            """
+            SELECT d.account_id AS id, d.platform AS platform
+            FROM snapshot_deltas d
+            WHERE d.snapshot_id <= ?
+            AND d.snapshot_id = (
+                SELECT MAX(x.snapshot_id) FROM snapshot_deltas x
+                WHERE x.account_id = d.account_id AND x.snapshot_id <= ?
+            )
+            AND d.deleted = 0
+            """,
+            (snapshot_id, snapshot_id),
+        )
+
+    def __count_delta_view(self, conn: sqlite3.Connection, snapshot_id: int) -> int:
+        query, params = self.__delta_view(snapshot_id)
+        return conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+
+    def __lookup(self, conn: sqlite3.Connection, name: str) -> tuple[int, str] | None:
+        if not table_exists(conn, "snapshots"):
+            return None
+
+        return conn.execute(
+            "SELECT id, kind FROM snapshots WHERE name = ?;", (name,)
+        ).fetchone()
+
+    def ensure_catalog(self, conn: sqlite3.Connection) -> bool:
+        """
+        Create or upgrade the snapshot catalog.
+
+        Returns:
+            bool: True if the catalog was created or upgraded
+        """
+
+        if table_exists(conn, "snapshots"):
+            columns = {
+                row[1] for row in conn.execute("PRAGMA table_info(snapshots);")
+            }
+            missing = [name for name in _CATALOG_COLUMNS if name not in columns]
+
+            for column in missing:
+                conn.execute(
+                    f"ALTER TABLE snapshots ADD COLUMN {column} {_CATALOG_COLUMNS[column]};"
+                )
+
+            upgraded = len(missing) > 0
+        else:
+            conn.execute(f"""
+                CREATE TABLE snapshots (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    parent_id INTEGER REFERENCES snapshots(id),
+                    kind {_CATALOG_COLUMNS["kind"]},
+                    created_at {_CATALOG_COLUMNS["created_at"]},
+                    row_count {_CATALOG_COLUMNS["row_count"]},
+                    size_bytes {_CATALOG_COLUMNS["size_bytes"]},
+                    path {_CATALOG_COLUMNS["path"]}
+                );
+            """)
+            upgraded = True
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS snapshots_created_at
+            ON snapshots (created_at, id);
+        """)
+
+        return upgraded
+
+    def register_legacy_table(self, conn: sqlite3.Connection) -> int | None:
+        """
+        Register one full-copy `<name>_accounts` table missing from the
+        catalog.
+
+        Returns:
+            int | None: Row count of the table registered, None if every
+                table is registered already
+        """
+
+        registered = {row[0] for row in conn.execute("SELECT name FROM snapshots;")}
+
+        cur = conn.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='table'
+            AND name LIKE '%\\_accounts' ESCAPE '\\'
+            ORDER BY name;
+        """)
+        for (name,) in cur.fetchall():
+            if name in registered:
+                continue
+
+            table = quote_identifier(name)
+            row_count, size_bytes = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length(id) + length(platform)), 0) FROM {table};"
+            ).fetchone()
+
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO snapshots (name, kind, row_count, size_bytes)
+                VALUES (?, ?, ?, ?);
+                """,
+                (name, KIND_TABLE, row_count, size_bytes),
+            )
+            return row_count
+
+        return None
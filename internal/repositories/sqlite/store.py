@@ -1,13 +1,116 @@
+import random
 import sqlite3
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from itertools import batched
 from pathlib import Path
-
-from internal.constants.constants import DEFAULT_STORAGE_NAME
-from internal.repositories.store import Store
+from typing import TypeVar
+
+from internal.constants.constants import (
+    ACCOUNT_KEY_FORMATS,
+    BACKUP_PAGES_PER_STEP,
+    DEFAULT_ACCOUNT_KEY_FORMAT,
+    DEFAULT_SNAPSHOT_MODE,
+    DEFAULT_STORAGE_NAME,
+    MIGRATION_BATCH_SIZE,
+    SNAPSHOT_MODES,
+    WRITE_LOCK_RETRIES,
+    WRITE_LOCK_RETRY_BASE_SECONDS,
+    WRITE_LOCK_RETRY_MAX_SECONDS,
+)
+from internal.repositories.sqlite.connection import ConnectionManager
+from internal.repositories.sqlite.diff import SnapshotDiff
+from internal.repositories.sqlite.rekey import SecretRekey
+from internal.repositories.sqlite.search import AccountIndex
+from internal.repositories.sqlite.secrets import AccountSecrets
+from internal.repositories.sqlite.files import FileSnapshots
+from internal.repositories.sqlite.keys import KEY_FORMAT_BLOB, AccountKeys
+from internal.repositories.sqlite.migrations import (
+    MigrationProgress,
+    SchemaMigrations,
+    store_migrations,
+)
+from internal.repositories.sqlite.snapshots import KIND_FILE, DeltaSnapshots
+from internal.repositories.store import (
+    AccountRecord,
+    DiffRow,
+    RekeyRange,
+    SnapshotInfo,
+    Store,
+    VaultMeta,
+)
+
+T = TypeVar("T")
 
 
 class SqliteStore(Store):
-    def __init__(self, workdir_path: Path) -> None:
+    def __init__(
+        self,
+        workdir_path: Path,
+        pragmas: dict[str, str | int] | None = None,
+        snapshot_mode: str = DEFAULT_SNAPSHOT_MODE,
+        snapshot_directory: Path | None = None,
+        key_format: str = DEFAULT_ACCOUNT_KEY_FORMAT,
+        on_migration_progress: Callable[[MigrationProgress], None] | None = None,
+        readonly: bool = False,
+    ) -> None:
+        """
+        - snapshot_mode: "delta" records snapshots as deltas inside the
+          database, "file" writes each one to its own file
+        - snapshot_directory: where snapshot files go, defaults to a
+          `snapshots` directory next to the database
+        - key_format: how a new store keeps account ids, "blob" for 16-byte
+          UUIDs or "text" for any id string, existing stores keep theirs
+          until migrated
+        - on_migration_progress: called after each batch of a schema
+          migration, run when the store is first opened
+        - readonly: open the database read-only, for reads next to a
+          writer in another thread or process; the schema has to be up to
+          date already
+        """
+
+        if snapshot_mode not in SNAPSHOT_MODES:
+            raise ValueError(
+                f"snapshot mode must be one of {', '.join(SNAPSHOT_MODES)}"
+            )
+
+        if key_format not in ACCOUNT_KEY_FORMATS:
+            raise ValueError(
+                f"key format must be one of {', '.join(ACCOUNT_KEY_FORMATS)}"
+            )
+
+        if snapshot_directory is None:
+            snapshot_directory = workdir_path / "snapshots"
+
         self.__db_path = workdir_path / DEFAULT_STORAGE_NAME
+        self.__connection = ConnectionManager(self.__db_path, pragmas, readonly)
+        self.__snapshot_mode = snapshot_mode
+        self.__files = FileSnapshots(snapshot_directory, BACKUP_PAGES_PER_STEP)
+        self.__snapshots = DeltaSnapshots(self.__files)
+        self.__index = AccountIndex()
+        self.__secrets = AccountSecrets()
+        self.__diff = SnapshotDiff()
+        self.__rekey = SecretRekey(snapshot_directory)
+        self.__keys = AccountKeys()
+        self.__key_format = key_format
+        self.__migrations = SchemaMigrations(
+            store_migrations(self.__snapshots, self.__secrets, self.__index),
+            MIGRATION_BATCH_SIZE,
+            on_migration_progress,
+        )
+        self.__schema_ready = False
+
+    @property
+    def connection(self) -> ConnectionManager:
+        return self.__connection
+
+    def close(self) -> None:
+        """
+        Close the connection shared by this store.
+        """
+        self.__rekey.close()
+        self.__connection.close()
 
     def create(self) -> bool:
         """
@@ -19,7 +122,7 @@ class SqliteStore(Store):
         """
 
         try:
-            with sqlite3.connect(str(self.__db_path)) as conn:
+            with self.__connection.get() as conn:
                 accounts_exists = self.__table_exists(conn, "accounts")
                 active_exists = self.__table_exists(conn, "active_table")
 
@@ -35,34 +138,215 @@ class SqliteStore(Store):
                     default_table = "accounts"
                     self.__create_and_insert_active_table(default_table, conn)
 
-                return True
+            self.__migrate(conn)
+            return True
 
         except sqlite3.Error:
             raise
 
     def get_current_table(self) -> str:
         try:
-            with sqlite3.connect(str(self.__db_path)) as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT table_name FROM active_table WHERE id = 1;")
-
-                row = cur.fetchone()
-                if row is None:
-                    return ""
-                return row[0]
+            with self.__open() as conn:
+                return self.__current_table(conn)
         except sqlite3.Error:
             raise
 
     def backup_current_table(self, table_name):
+        """
+        Snapshot the accounts table, as a delta against the previous snapshot
+        or as a copy in its own file depending on the snapshot mode.
+        """
+
+        try:
+            if self.__snapshot_mode == "file":
+                self.__snapshots.take_file(self.__open(), table_name)
+                return
+
+            self.__write(lambda conn: self.__snapshots.take(conn, table_name))
+        except sqlite3.Error:
+            raise
+
+    def add_account(
+        self,
+        account_id: str,
+        platform: str,
+        secret: bytes | None = None,
+        snapshot_name: str | None = None,
+    ) -> None:
+        key = self.__keys.encode(account_id)
+
+        def add(conn: sqlite3.Connection) -> None:
+            with self.__snapshot_first(conn, snapshot_name):
+                conn.execute(
+                    "INSERT INTO accounts(id, platform) VALUES(?, ?)",
+                    (key, platform),
+                )
+                if secret is not None:
+                    self.__secrets.add(conn, key, secret)
+
         try:
-            with sqlite3.connect(str(self.__db_path)) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    f"CREATE TABLE {table_name} AS SELECT * FROM accounts WHERE 0"
+            self.__write(add)
+        except sqlite3.Error:
+            raise
+
+    def get_secret(self, table_name: str, account_id: str) -> bytes | None:
+        try:
+            with self.__open() as conn:
+                source = self.__snapshots.resolve(conn, table_name)
+                query, params = self.__secrets.secret_query(
+                    conn,
+                    source,
+                    table_name,
+                    self.__keys.encode(account_id),
+                    self.__schema(conn, source, table_name),
                 )
-                cursor.execute(f"INSERT INTO {table_name} SELECT * FROM accounts")
+                row = conn.execute(query, params).fetchone()
+
+        except sqlite3.Error:
+            raise
+
+        if row is None:
+            raise ValueError(f"Account '{account_id}' does not exist in '{table_name}'")
+
+        return row[0]
+
+    def migrate_account_keys(self) -> int:
+        """
+        Convert the account ids of the store and of its snapshots, files
+        included, to 16-byte keys.
+
+        Rows are copied in batches of their own transactions, so other
+        connections keep writing meanwhile, and snapshot files are converted
+        as copies. Both are swapped in with one short transaction at the
+        end. Running it again resumes an interrupted run.
+        """
+
+        try:
+            conn = self.__open()
+            if self.__keys.key_format == KEY_FORMAT_BLOB:
+                return 0
+
+            def batch(conn: sqlite3.Connection) -> int | None:
+                return self.__keys.migrate_batch(conn, MIGRATION_BATCH_SIZE)
+
+            try:
+                self.__write(self.__keys.start_migration)
+                while self.__write(batch) is not None:
+                    pass
+
+                obsolete = None
+                while obsolete is None:
+                    for snapshot_id, path in self.__keys.pending_files(conn):
+                        converted = path
+                        if (self.__files.directory / path).is_file():
+                            converted = self.__files.rewrite(path, "blob-keys", self.__convert_keys)
+                        self.__write(
+                            lambda conn: self.__keys.add_file(conn, snapshot_id, converted)
+                        )
+                    # None if a snapshot file was taken meanwhile
+                    obsolete = self.__write(self.__finish_key_migration)
+            except ValueError:
+                for path in self.__write(self.__keys.abort_migration):
+                    (self.__files.directory / path).unlink(missing_ok=True)
+                raise
+
+            for snapshot_id, path in obsolete:
+                if snapshot_id is None:
+                    (self.__files.directory / path).unlink(missing_ok=True)
+                else:
+                    self.__files.remove(conn, snapshot_id, path)
+
+            return conn.execute("SELECT COUNT(*) FROM accounts;").fetchone()[0]
+        except sqlite3.Error:
+            raise
+
+    def get_vault_meta(self) -> VaultMeta | None:
+        try:
+            with self.__open() as conn:
+                return self.__secrets.get_meta(conn)
+        except sqlite3.Error:
+            raise
+
+    def init_vault(self, meta: VaultMeta) -> None:
+        try:
+            with self.__open() as conn:
+                self.__secrets.init(conn, meta)
+        except sqlite3.Error:
+            raise
+
+    def begin_rekey(self, meta: VaultMeta, range_size: int) -> None:
+        try:
+            self.__rekey.begin(self.__open(), meta, range_size)
+        except sqlite3.Error:
+            raise
+
+    def get_rekey_meta(self) -> VaultMeta | None:
+        try:
+            return self.__rekey.get_meta(self.__open())
+        except sqlite3.Error:
+            raise
+
+    def get_rekey_ranges(self) -> list[RekeyRange]:
+        try:
+            return self.__rekey.ranges(self.__open())
+        except sqlite3.Error:
+            raise
+
+    def read_secrets(self, key_range: RekeyRange) -> list[tuple[int | str, str, bytes]]:
+        try:
+            rows = self.__rekey.read(self.__open(), key_range)
+            # Secrets are bound to the account id as a string
+            return [
+                (row_key, self.__keys.decode(account_id), secret)
+                for row_key, account_id, secret in rows
+            ]
+        except sqlite3.Error:
+            raise
+
+    def write_secrets(
+        self, results: list[tuple[RekeyRange, list[tuple[int | str, bytes]]]]
+    ) -> None:
+        try:
+            self.__rekey.write(self.__open(), results)
+        except sqlite3.Error:
+            raise
+
+    def finish_rekey(self) -> None:
+        try:
+            self.__rekey.finish(self.__open())
+        except sqlite3.Error:
+            raise
+
+    def add_accounts(
+        self,
+        accounts: Iterable[tuple[str, str]],
+        batch_size: int = 1000,
+        snapshot_name: str | None = None,
+    ) -> int:
+        """
+        Insert accounts in chunks of `batch_size` inside one transaction, so
+        only one chunk is held in memory at a time.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch size must be greater than 0")
+
+        def add(conn: sqlite3.Connection) -> int:
+            total = 0
+            with self.__snapshot_first(conn, snapshot_name):
+                for chunk in batched(accounts, batch_size):
+                    conn.executemany(
+                        "INSERT INTO accounts(id, platform) VALUES(?, ?)",
+                        [
+                            (self.__keys.encode(account_id), platform)
+                            for account_id, platform in chunk
+                        ],
+                    )
+                    total += len(chunk)
+            return total
 
-                conn.commit()
+        try:
+            return self.__write(add)
         except sqlite3.Error:
             raise
 
@@ -72,16 +356,9 @@ class SqliteStore(Store):
         """
 
         try:
-            with sqlite3.connect(str(self.__db_path)) as conn:
-                cur = conn.cursor()
-
+            with self.__open() as conn:
                 # Check table exists
-                cur.execute(
-                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?;",
-                    (table_name,),
-                )
-
-                if cur.fetchone() is None:
+                if not self.__snapshots.exists(conn, table_name):
                     raise ValueError(f"Table '{table_name}' does not exist")
 
                 self.__update_active_table(table_name, conn)
@@ -91,19 +368,363 @@ class SqliteStore(Store):
 
     def get_all_tables(self) -> list[str]:
         try:
-            with sqlite3.connect(self.__db_path) as conn:
-                cur = conn.cursor()
-                cur.execute("""
-                SELECT name FROM sqlite_master
-                WHERE type='table'
-                AND name LIKE '%_accounts'
-            """)
+            with self.__open() as conn:
+                return self.__snapshots.names(conn)
+
+        except sqlite3.Error:
+            raise
 
-                return [row[0] for row in cur.fetchall()]
+    def get_snapshots(
+        self, limit: int | None = None, offset: int = 0, since: str | None = None
+    ) -> list[SnapshotInfo]:
+        try:
+            with self.__open() as conn:
+                return self.__snapshots.page(conn, limit, offset, since)
 
         except sqlite3.Error:
             raise
 
+    def read_table(self, table_name: str) -> list[tuple[str, str]]:
+        """
+        Get every `(id, platform)` account of a table or snapshot, rebuilding
+        delta snapshots from their parents.
+        """
+
+        try:
+            with self.__open() as conn:
+                query, params = self.__snapshots.view(conn, table_name)
+                return self.__keys.decode_rows(conn.execute(query, params).fetchall())
+
+        except sqlite3.Error:
+            raise
+
+    def iter_accounts(
+        self, table_name: str, batch_size: int = 1000
+    ) -> Iterator[AccountRecord]:
+        """
+        Stream the accounts of a table or snapshot on the store connection,
+        fetching `batch_size` rows at a time, so the first ones come out
+        before the rest are read.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch size must be greater than 0")
+
+        try:
+            conn = self.__open()
+            query, params = self.__snapshots.view(conn, table_name)
+            cur = conn.execute(query, params)
+            decode = self.__keys.decode
+
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                for key, platform in rows:
+                    yield AccountRecord(decode(key), platform)
+
+        except sqlite3.Error:
+            raise
+
+    def drop_tables(self, table_names: list[str]) -> None:
+        """
+        Drop snapshots one transaction each, so a large cleanup never holds
+        the write lock for long.
+        """
+
+        try:
+            for table_name in table_names:
+                with self.__open() as conn:
+                    if table_name == self.__current_table(conn):
+                        raise ValueError(f"Can't drop the active table '{table_name}'")
+
+                    self.__snapshots.drop(conn, table_name)
+
+        except sqlite3.Error:
+            raise
+
+    def reclaim_space(self, max_pages: int, step_pages: int = 256) -> int:
+        """
+        Return free pages to the OS with `PRAGMA incremental_vacuum`, at most
+        `step_pages` per transaction and `max_pages` in total.
+
+        Stores created without `auto_vacuum=INCREMENTAL` reclaim nothing: a
+        full VACUUM would block every writer, so free pages are left for
+        future writes to reuse.
+        """
+
+        if max_pages < 0 or step_pages < 1:
+            raise ValueError("max pages can't be negative and step pages must be positive")
+
+        freed = 0
+
+        try:
+            conn = self.__open()
+            if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+                return 0
+
+            while freed < max_pages:
+                before = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+                if before == 0:
+                    break
+
+                step = min(step_pages, max_pages - freed)
+                with conn:
+                    conn.execute(f"PRAGMA incremental_vacuum({step});").fetchall()
+
+                after = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+                if after >= before:
+                    break
+
+                freed += before - after
+
+        except sqlite3.Error:
+            raise
+
+        return freed
+
+    def find_accounts(self, table_name: str, platform: str) -> list[tuple[str, str]]:
+        try:
+            with self.__open() as conn:
+                source = self.__snapshots.resolve(conn, table_name)
+                query, params = self.__index.lookup_query(
+                    source, table_name, platform, self.__schema(conn, source, table_name)
+                )
+                return self.__keys.decode_rows(conn.execute(query, params).fetchall())
+
+        except sqlite3.Error:
+            raise
+
+    def search_accounts(
+        self, table_name: str, text: str, limit: int = 50
+    ) -> list[tuple[str, str]]:
+        try:
+            with self.__open() as conn:
+                source = self.__snapshots.resolve(conn, table_name)
+                query, params = self.__index.search_query(
+                    source,
+                    table_name,
+                    text,
+                    limit,
+                    self.__schema(conn, source, table_name),
+                )
+                return self.__keys.decode_rows(conn.execute(query, params).fetchall())
+
+        except sqlite3.Error:
+            raise
+
+    def export_table(
+        self, table_name: str, batch_size: int = 1000
+    ) -> Iterator[tuple[str, str]]:
+        if batch_size < 1:
+            raise ValueError("batch size must be greater than 0")
+
+        # Upgrade older stores first, the read-only connection can't
+        self.__open()
+
+        conn = self.__connection.open_readonly()
+        try:
+            query, params = self.__snapshots.view(conn, table_name)
+            cur = conn.execute(query, params)
+
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                yield from self.__keys.decode_rows(rows)
+
+        except sqlite3.Error:
+            raise
+        finally:
+            conn.close()
+
+    def diff_tables(
+        self, table_a: str, table_b: str, batch_size: int = 1000
+    ) -> Iterator[DiffRow]:
+        """
+        Stream the differences between two tables or snapshots, fetching
+        `batch_size` rows at a time.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch size must be greater than 0")
+
+        try:
+            conn = self.__open()
+            cur = conn.execute(*self.__diff_query(conn, table_a, table_b))
+
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                for change, key, platform_a, platform_b in rows:
+                    yield DiffRow(change, self.__keys.decode(key), platform_a, platform_b)
+
+        except sqlite3.Error:
+            raise
+
+    def diff_stat(self, table_a: str, table_b: str) -> dict[str, int]:
+        try:
+            conn = self.__open()
+            query = self.__diff.stat_query(self.__diff_query(conn, table_a, table_b))
+
+            stat = {"added": 0, "removed": 0, "changed": 0}
+            stat.update(conn.execute(*query).fetchall())
+            return stat
+
+        except sqlite3.Error:
+            raise
+
+    def __diff_query(
+        self, conn: sqlite3.Connection, table_a: str, table_b: str
+    ) -> tuple[str, tuple]:
+        return self.__diff.query(
+            self.__snapshots.resolve(conn, table_a),
+            self.__snapshots.view(conn, table_a),
+            self.__snapshots.resolve(conn, table_b),
+            self.__snapshots.view(conn, table_b),
+        )
+
+    def __schema(
+        self, conn: sqlite3.Connection, source: tuple[int | None, str], name: str
+    ) -> str:
+        if source[1] == KIND_FILE:
+            return self.__snapshots.schema(conn, name)
+        return "main"
+
+    def __write(self, work: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run `work` in a BEGIN IMMEDIATE transaction on the shared connection.
+
+        Taking the write lock up front means the transaction never has to
+        upgrade a read lock, which SQLite refuses outright, without waiting,
+        when another writer committed in between. Waiting for the lock is
+        left to busy_timeout. When that runs out, the lock is taken again
+        after a jittered backoff, so writers that timed out together don't
+        all retry at once. Only taking the lock is retried, `work` runs once.
+        """
+
+        return self.__transaction(self.__open(), work)
+
+    def __transaction(
+        self, conn: sqlite3.Connection, work: Callable[[sqlite3.Connection], T]
+    ) -> T:
+        for attempt in range(WRITE_LOCK_RETRIES + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                break
+            except sqlite3.OperationalError as err:
+                if attempt == WRITE_LOCK_RETRIES or not _is_busy(err):
+                    raise
+                delay = WRITE_LOCK_RETRY_BASE_SECONDS * 2**attempt
+                time.sleep(random.uniform(0, min(delay, WRITE_LOCK_RETRY_MAX_SECONDS)))
+
+        try:
+            result = work(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        return result
+
+    def __finish_key_migration(
+        self, conn: sqlite3.Connection
+    ) -> list[tuple[int | None, str]] | None:
+        if not self.__keys.migrating(conn):
+            # Finished by another process
+            self.__keys.load(conn)
+            return []
+        if self.__keys.pending_files(conn):
+            return None
+
+        obsolete = self.__keys.finish_migration(conn)
+        self.__restore_account_schema(conn)
+        return obsolete
+
+    def __convert_keys(self, conn: sqlite3.Connection) -> None:
+        """
+        Convert the account ids of a snapshot file copy in one transaction,
+        nobody else has it open.
+        """
+
+        keys = AccountKeys()
+        # A file taken during a batched conversion has its tables too
+        keys.abort_migration(conn)
+        keys.migrate(conn)
+        self.__restore_account_schema(conn)
+
+    def __restore_account_schema(self, conn: sqlite3.Connection) -> None:
+        # Triggers and indexes went with the old account tables
+        self.__snapshots.ensure_schema(conn)
+        self.__secrets.ensure_schema(conn)
+        self.__index.ensure_schema(conn)
+
+    @contextmanager
+    def __snapshot_first(self, conn: sqlite3.Connection, name: str | None) -> Iterator[None]:
+        """
+        Take a snapshot named `name`, if given, in the write transaction of
+        `conn` before the changes made in the block.
+        """
+
+        if name is None:
+            yield
+            return
+
+        if self.__snapshot_mode != "file":
+            self.__snapshots.take(conn, name)
+            yield
+            return
+
+        # The write lock held by conn keeps the copy consistent
+        source = self.__connection.open_readonly()
+        try:
+            snapshot_id = self.__snapshots.take_file(conn, name, source)
+        finally:
+            source.close()
+
+        try:
+            yield
+        except BaseException:
+            # The catalog entry is rolled back, the file has to go as well
+            path = conn.execute(
+                "SELECT path FROM snapshots WHERE id = ?;", (snapshot_id,)
+            ).fetchone()[0]
+            (self.__files.directory / path).unlink(missing_ok=True)
+            raise
+
+    def __open(self) -> sqlite3.Connection:
+        """
+        Get the shared connection, bringing the schema of stores created by
+        older versions up to date on first use.
+        """
+
+        conn = self.__connection.get()
+
+        if not self.__schema_ready and self.__table_exists(conn, "accounts"):
+            self.__migrate(conn)
+
+        return conn
+
+    def __migrate(self, conn: sqlite3.Connection) -> None:
+        # Up to date stores, nearly all of them, don't take the write lock
+        if self.__migrations.pending(conn):
+            self.__migrations.run(lambda work: self.__transaction(conn, work))
+        self.__keys.load(conn)
+        self.__schema_ready = True
+
+    def __current_table(self, conn: sqlite3.Connection) -> str:
+        cur = conn.cursor()
+        cur.execute("SELECT table_name FROM active_table WHERE id = 1;")
+
+        row = cur.fetchone()
+        if row is None:
+            return ""
+        return row[0]
+
     def __create_and_insert_active_table(
         self, def_table: str, conn: sqlite3.Connection
     ):
@@ -127,8 +748,6 @@ class SqliteStore(Store):
                 (def_table,),
             )
 
-            conn.commit()
-
         except sqlite3.Error:
             raise
 
@@ -150,11 +769,7 @@ class SqliteStore(Store):
 
     def __create_account_table(self, conn: sqlite3.Connection):
         try:
-            with sqlite3.connect(str(self.__db_path)) as conn:
-                cur = conn.cursor()
-                cur.execute(
-                    "CREATE TABLE IF NOT EXISTS accounts(id TEXT NOT NULL PRIMARY KEY,platform TEXT NOT NULL);"
-                )
+            self.__keys.create_table(conn, self.__key_format)
 
         except sqlite3.Error:
             raise
@@ -165,3 +780,11 @@ class SqliteStore(Store):
             (table_name,),
         )
         return cursor.fetchone() is not None
+
+
+def _is_busy(err: sqlite3.OperationalError) -> bool:
+    code = getattr(err, "sqlite_errorcode", None)
+    if code is None:
+        return "locked" in str(err)
+    # Extended codes keep the primary code in their low byte
+    return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
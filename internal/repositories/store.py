@@ -1,5 +1,52 @@
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+from typing import NamedTuple
+
+
+class SnapshotInfo(NamedTuple):
+    """Catalog entry of a snapshot."""
+
+    name: str
+    created_at: str | None
+    parent: str | None
+    row_count: int | None
+    size_bytes: int | None
+
+
+class VaultMeta(NamedTuple):
+    """Parameters of the key protecting account secrets."""
+
+    salt: bytes
+    n: int
+    r: int
+    p: int
+    check: bytes  # known value encrypted with the key, to verify it
+
+
+class RekeyRange(NamedTuple):
+    """Range of encrypted secrets re-encrypted together by a key rotation."""
+
+    source: str  # "" for the store itself, else a snapshot file name
+    table: str
+    start: int | str
+    end: int | str | None  # exclusive, None for no upper bound
+
+
+class DiffRow(NamedTuple):
+    """Account that differs between two snapshots."""
+
+    change: str  # 'added', 'removed' or 'changed'
+    id: str
+    platform_a: str | None
+    platform_b: str | None
+
+
+class AccountRecord(NamedTuple):
+    """Account of a table or snapshot, as streamed by `iter_accounts`."""
+
+    id: str
+    platform: str
 
 
 class Store(ABC):
@@ -34,10 +81,138 @@ class Store(ABC):
     @abstractmethod
     def backup_current_table(self, table_name: str) -> None:
         """
-        Backup the current accounts table to a new table with given name.
+        Backup the current accounts table to a new snapshot with given name.
+
+        Args:
+            table_name: Name for the backup snapshot
+
+        Raises:
+            ValueError: If a snapshot with the given name already exists
+        """
+        pass
+
+    @abstractmethod
+    def add_account(
+        self,
+        account_id: str,
+        platform: str,
+        secret: bytes | None = None,
+        snapshot_name: str | None = None,
+    ) -> None:
+        """
+        Insert a new account into the accounts table.
+
+        Args:
+            account_id: Unique id of the account
+            platform: Platform the account belongs to
+            secret: Encrypted secret of the account
+            snapshot_name: Snapshot to take first, atomically with the insert
+        """
+        pass
+
+    @abstractmethod
+    def get_secret(self, table_name: str, account_id: str) -> bytes | None:
+        """
+        Get the encrypted secret of an account in a table or snapshot.
+
+        Returns:
+            bytes | None: Encrypted secret, None if the account has none
+
+        Raises:
+            ValueError: If the table or account does not exist
+        """
+        pass
+
+    @abstractmethod
+    def get_vault_meta(self) -> VaultMeta | None:
+        """
+        Get the key parameters of the vault, None if it isn't initialized.
+        """
+        pass
+
+    @abstractmethod
+    def init_vault(self, meta: VaultMeta) -> None:
+        """
+        Store the key parameters of the vault.
+
+        Raises:
+            ValueError: If the vault is already initialized
+        """
+        pass
+
+    @abstractmethod
+    def begin_rekey(self, meta: VaultMeta, range_size: int) -> None:
+        """
+        Start rotating the vault key to the one described by `meta`: save it
+        as pending and split the secrets of the store and of every snapshot
+        into ranges of about `range_size` rows. Does nothing if this rotation
+        was already started, so it can be resumed.
+
+        Raises:
+            ValueError: If a rotation to another key is in progress
+        """
+        pass
+
+    @abstractmethod
+    def get_rekey_meta(self) -> VaultMeta | None:
+        """
+        Get the key parameters of the rotation in progress, None if there is
+        none.
+        """
+        pass
+
+    @abstractmethod
+    def get_rekey_ranges(self) -> list[RekeyRange]:
+        """
+        Get the ranges of the rotation in progress that aren't done yet.
+        """
+        pass
+
+    @abstractmethod
+    def read_secrets(self, key_range: RekeyRange) -> list[tuple[int | str, str, bytes]]:
+        """
+        Get `(row key, account id, encrypted secret)` of every secret in a
+        range.
+        """
+        pass
+
+    @abstractmethod
+    def write_secrets(
+        self, results: list[tuple[RekeyRange, list[tuple[int | str, bytes]]]]
+    ) -> None:
+        """
+        Replace the secrets of ranges with their re-encrypted `(row key,
+        secret)` and mark the ranges done, atomically for each source.
+        """
+        pass
+
+    @abstractmethod
+    def finish_rekey(self) -> None:
+        """
+        Make the pending key the vault key once every range is done.
+
+        Raises:
+            ValueError: If no rotation is in progress or ranges are left
+        """
+        pass
+
+    @abstractmethod
+    def add_accounts(
+        self,
+        accounts: Iterable[tuple[str, str]],
+        batch_size: int = 1000,
+        snapshot_name: str | None = None,
+    ) -> int:
+        """
+        Insert many accounts into the accounts table in a single transaction.
 
         Args:
-            table_name: Name for the backup table
+            accounts: Iterable of `(id, platform)` rows, consumed lazily
+            batch_size: Number of rows sent to the database at a time
+            snapshot_name: Snapshot to take first, in the same transaction
+
+        Returns:
+            int: Number of inserted accounts
         """
         pass
 
@@ -63,3 +238,185 @@ class Store(ABC):
             list[str]: List of table names
         """
         pass
+
+    @abstractmethod
+    def get_snapshots(
+        self, limit: int | None = None, offset: int = 0, since: str | None = None
+    ) -> list[SnapshotInfo]:
+        """
+        Get a page of the snapshot catalog, oldest first.
+
+        Args:
+            limit: Maximum number of snapshots, all if None
+            offset: Number of snapshots to skip
+            since: Only snapshots created at or after this UTC date/time
+
+        Returns:
+            list[SnapshotInfo]: Catalog entries of the snapshots
+        """
+        pass
+
+    @abstractmethod
+    def drop_tables(self, table_names: list[str]) -> None:
+        """
+        Drop snapshots without changing the rows of the remaining ones.
+
+        Args:
+            table_names: Names of the snapshots to drop
+
+        Raises:
+            ValueError: If a snapshot does not exist or is the active table
+        """
+        pass
+
+    @abstractmethod
+    def migrate_account_keys(self) -> int:
+        """
+        Convert the account ids of the store and its snapshots to the
+        compact key format. Ids read back as the same strings.
+
+        Returns:
+            int: Number of accounts converted in the active store
+
+        Raises:
+            ValueError: If an account id isn't a UUID
+        """
+        pass
+
+    @abstractmethod
+    def reclaim_space(self, max_pages: int, step_pages: int = 256) -> int:
+        """
+        Return unused storage to the OS in bounded steps.
+
+        Args:
+            max_pages: Maximum number of pages to release
+            step_pages: Maximum number of pages released per transaction
+
+        Returns:
+            int: Number of released pages
+        """
+        pass
+
+    @abstractmethod
+    def export_table(
+        self, table_name: str, batch_size: int = 1000
+    ) -> Iterator[tuple[str, str]]:
+        """
+        Stream every `(id, platform)` account of a table or snapshot through
+        a read-only connection, so exporting never holds up writers.
+
+        Args:
+            table_name: Name of the table or snapshot to export
+            batch_size: Number of rows fetched from the database at a time
+        """
+        pass
+
+    @abstractmethod
+    def diff_tables(
+        self, table_a: str, table_b: str, batch_size: int = 1000
+    ) -> Iterator[DiffRow]:
+        """
+        Stream the accounts added, removed or changed going from a to b.
+
+        Args:
+            table_a: Name of the table or snapshot to compare from
+            table_b: Name of the table or snapshot to compare to
+            batch_size: Number of rows fetched from the database at a time
+
+        Returns:
+            Iterator[DiffRow]: Accounts that differ
+
+        Raises:
+            ValueError: If a table does not exist
+        """
+        pass
+
+    @abstractmethod
+    def diff_stat(self, table_a: str, table_b: str) -> dict[str, int]:
+        """
+        Count the accounts added, removed or changed going from a to b.
+
+        Args:
+            table_a: Name of the table or snapshot to compare from
+            table_b: Name of the table or snapshot to compare to
+
+        Returns:
+            dict[str, int]: Counts keyed by 'added', 'removed' and 'changed'
+
+        Raises:
+            ValueError: If a table does not exist
+        """
+        pass
+
+    @abstractmethod
+    def find_accounts(self, table_name: str, platform: str) -> list[tuple[str, str]]:
+        """
+        Get the accounts of a table or snapshot with exactly the given platform.
+
+        Args:
+            table_name: Name of the table or snapshot to read
+            platform: Platform to look up
+
+        Returns:
+            list[tuple[str, str]]: List of `(id, platform)` rows
+
+        Raises:
+            ValueError: If table does not exist
+        """
+        pass
+
+    @abstractmethod
+    def search_accounts(
+        self, table_name: str, text: str, limit: int = 50
+    ) -> list[tuple[str, str]]:
+        """
+        Full-text search the platforms of a table or snapshot.
+
+        Args:
+            table_name: Name of the table or snapshot to read
+            text: Words the platform must contain, matched by prefix
+            limit: Maximum number of accounts
+
+        Returns:
+            list[tuple[str, str]]: List of `(id, platform)` rows, best match first
+
+        Raises:
+            ValueError: If table does not exist or text is empty
+        """
+        pass
+
+    @abstractmethod
+    def read_table(self, table_name: str) -> list[tuple[str, str]]:
+        """
+        Get all accounts of a table or snapshot.
+
+        Args:
+            table_name: Name of the table or snapshot to read
+
+        Returns:
+            list[tuple[str, str]]: List of `(id, platform)` rows
+
+        Raises:
+            ValueError: If table does not exist
+        """
+        pass
+
+    @abstractmethod
+    def iter_accounts(
+        self, table_name: str, batch_size: int = 1000
+    ) -> Iterator[AccountRecord]:
+        """
+        Stream the accounts of a table or snapshot, keeping at most
+        `batch_size` rows in memory where `read_table` holds them all.
+
+        Args:
+            table_name: Name of the table or snapshot to read
+            batch_size: Number of rows fetched from the database at a time
+
+        Returns:
+            Iterator[AccountRecord]: Accounts of the table
+
+        Raises:
+            ValueError: If table does not exist
+        """
+        pass
@@ -1,44 +1,158 @@
+import csv
+import json
 import secrets
-import sqlite3
-import uuid
+from collections.abc import Iterator
+from pathlib import Path
 
-from internal.constants.constants import KEY_STORE_DIRECTORY, TABLE_STORE_DIRECTORY
-from internal.services.config.config import config_app
-from internal.services.storage.storage import sqlite_repository
+from internal.constants.constants import IMPORT_FORMATS
+from internal.repositories.store import AccountRecord
+from internal.repositories.sqlite.keys import new_account_id
+from internal.services.storage.storage import get_sqlite_repository
+from internal.services.vault.vault import Vault
 
 
 class Account:
-    def __init__(self) -> None:
-        self.__storage: str = self.__get_store_path()
+    def add_new_account(self, platform: str, secret: str | None = None):
+        """
+        Add an account, with its secret encrypted by the unlocked vault if
+        one is given.
+        """
+        name = self.__generate_account_name()
+
+        try:
+            sqlite_repository = get_sqlite_repository()
+            account_id = new_account_id()
+
+            payload = None
+            if secret is not None:
+                # Before the snapshot, so a locked vault changes nothing
+                payload = Vault(sqlite_repository).encrypt_secret(account_id, secret)
+
+            sqlite_repository.add_account(
+                account_id, platform, payload, snapshot_name=f"{name}_accounts"
+            )
+        except Exception as err:
+            print(err)
+            raise
+
+    def reveal_secret(self, account_id: str) -> str | None:
+        """
+        Decrypt the secret of an account of the current store, None if it
+        has none.
+        """
+
+        sqlite_repository = get_sqlite_repository()
+        current = sqlite_repository.get_current_table()
+
+        payload = sqlite_repository.get_secret(current, account_id)
+        if payload is None:
+            return None
+
+        return Vault(sqlite_repository).decrypt_secret(account_id, payload)
+
+    def import_accounts(
+        self, path: Path, file_format: str | None = None, batch_size: int = 1000
+    ) -> int:
+        """
+        Import accounts from a CSV or JSONL file.
+
+        The file is streamed, so memory use does not depend on its size.
+        One snapshot is taken before the whole batch, in the single
+        transaction inserting all rows.
+
+        - CSV needs a header with a `platform` column
+        - JSONL needs one object with a `platform` key per line
+        - file_format defaults to the file suffix
+        """
+
+        if file_format is None:
+            file_format = path.suffix.lstrip(".").lower()
+
+        if file_format not in IMPORT_FORMATS:
+            raise ValueError(
+                f"unsupported import format '{file_format}', "
+                f"expected one of: {', '.join(IMPORT_FORMATS)}"
+            )
 
-    def add_new_account(self, platform: str):
         name = self.__generate_account_name()
 
         try:
-            sqlite_repository.backup_current_table(f"{name}_accounts")
-
-            with sqlite3.connect(self.__storage + "/passwords.sqlite") as conn:
-                cur = conn.cursor()
-                account_id = str(uuid.uuid4())
-                cur.execute(
-                    "INSERT INTO accounts(id, platform) VALUES(?, ?)",
-                    (account_id, platform),
-                )
+            with path.open(newline="", encoding="utf-8") as file:
+                if file_format == "csv":
+                    platforms = _read_csv_platforms(file)
+                else:
+                    platforms = _read_jsonl_platforms(file)
+
+                accounts = ((new_account_id(), platform) for platform in platforms)
 
-                conn.commit()
+                return get_sqlite_repository().add_accounts(
+                    accounts, batch_size, snapshot_name=f"{name}_accounts"
+                )
         except Exception as err:
             print(err)
             raise
 
+    def get_accounts(self, platform: str) -> list[tuple[str, str]]:
+        """
+        Get the accounts of the current store with exactly the given platform.
+        """
+        if platform == "":
+            raise ValueError("platform can't be empty string")
+
+        sqlite_repository = get_sqlite_repository()
+        current = sqlite_repository.get_current_table()
+        return sqlite_repository.find_accounts(current, platform)
+
+    def search_accounts(self, text: str, limit: int = 50) -> list[tuple[str, str]]:
+        """
+        Search the accounts of the current store by words of their platform.
+        """
+        if text.strip() == "":
+            raise ValueError("search query can't be empty string")
+
+        sqlite_repository = get_sqlite_repository()
+        current = sqlite_repository.get_current_table()
+        return sqlite_repository.search_accounts(current, text, limit)
+
+    def list_accounts(
+        self, snapshot: str | None = None, batch_size: int = 1000
+    ) -> Iterator[AccountRecord]:
+        """
+        Stream the accounts of a snapshot, the current store by default.
+        """
+
+        sqlite_repository = get_sqlite_repository()
+        if snapshot is None:
+            snapshot = sqlite_repository.get_current_table()
+
+        return sqlite_repository.iter_accounts(snapshot, batch_size)
+
     def __generate_account_name(self) -> str:
         return f"{secrets.token_hex(4)}"
 
-    def __get_store_path(self) -> str:
-        storage_dir: str | None = config_app.get_value(
-            KEY_STORE_DIRECTORY, table_name=TABLE_STORE_DIRECTORY
-        )
 
-        if storage_dir is None:
-            return ""
+def _read_csv_platforms(file) -> Iterator[str]:
+    reader = csv.DictReader(file)
+
+    if reader.fieldnames is None or "platform" not in reader.fieldnames:
+        raise ValueError("CSV file must have a 'platform' column")
+
+    for line, row in enumerate(reader, start=2):
+        platform = (row.get("platform") or "").strip()
+        if platform == "":
+            raise ValueError(f"line {line}: platform can't be empty string")
+
+        yield platform
+
+
+def _read_jsonl_platforms(file) -> Iterator[str]:
+    for line, raw in enumerate(file, start=1):
+        if raw.strip() == "":
+            continue
+
+        row = json.loads(raw)
+        platform = row.get("platform") if isinstance(row, dict) else None
+        if not isinstance(platform, str) or platform.strip() == "":
+            raise ValueError(f"line {line}: platform can't be empty string")
 
-        return storage_dir
+        yield platform.strip()
@@ -0,0 +1,388 @@
+import contextlib
+import fcntl
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+import warnings
+from collections.abc import Iterator
+from pathlib import Path
+
+from platformdirs import user_runtime_dir
+
+# Longest a request or reply can be, keys are a few dozen bytes
+_MAX_MESSAGE = 4096
+
+# Directory holding the `internal` package, the agent runs as a module of it
+_ROOT = Path(__file__).resolve().parents[3]
+
+
+class UnlockAgent:
+    """
+    Background process holding derived vault keys in memory.
+
+    It listens on a Unix socket only the current user can reach, hands keys
+    out to commands, and forgets a key once it hasn't been asked for in
+    `idle_timeout` seconds. It exits when it holds no key anymore.
+
+    Requests and replies are one JSON object per connection:
+    - {"op": "put", "vault": id, "key": hex, "timeout": seconds}
+    - {"op": "get", "vault": id} -> {"ok": true, "key": hex}
+    - {"op": "status"} -> {"ok": true, "vaults": {id: seconds left}}
+    - {"op": "lock"} forgets every key and exits
+    """
+
+    def __init__(self, socket_path: Path) -> None:
+        self.__socket_path = socket_path
+        self.__inode = 0
+        # vault id -> key, idle timeout and expiry
+        self.__keys: dict[str, tuple[bytearray, float, float]] = {}
+
+    def serve(self, ready_fd: int | None = None) -> None:
+        """
+        Serve requests until every key expired or the vault is locked.
+        Returns at once when another agent already listens on the socket.
+
+        - ready_fd: pipe written to once the socket accepts connections
+        """
+
+        server = self.__bind()
+        if ready_fd is not None:
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+        if server is None:
+            # Another agent won the race, the client talks to that one
+            return
+
+        # The first key arrives right after startup
+        started = time.monotonic()
+        running = True
+
+        try:
+            while running:
+                self.__expire()
+                if len(self.__keys) == 0 and time.monotonic() - started > 5:
+                    break
+
+                server.settimeout(self.__next_expiry())
+                try:
+                    conn, _ = server.accept()
+                except TimeoutError:
+                    continue
+
+                with conn:
+                    conn.settimeout(1)
+                    running = self.__handle(conn)
+        finally:
+            server.close()
+            self.__unbind()
+            self.__forget_all()
+
+    def __bind(self) -> socket.socket | None:
+        # Under the lock, so two agents started at once can't both unlink
+        # the path and leave the first one listening on an unreachable socket
+        with socket_lock(self.__socket_path):
+            if is_listening(self.__socket_path):
+                return None
+
+            # Bound and listening before it appears at the path, clients
+            # never see a socket refusing connections
+            temp_path = self.__socket_path.with_name(f".{self.__socket_path.name}.{os.getpid()}")
+            temp_path.unlink(missing_ok=True)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            old_umask = os.umask(0o177)
+            try:
+                server.bind(str(temp_path))
+            finally:
+                os.umask(old_umask)
+
+            server.listen()
+            os.rename(temp_path, self.__socket_path)
+            self.__inode = self.__socket_path.stat().st_ino
+            return server
+
+    def __unbind(self) -> None:
+        # Leave the path alone once another agent replaced the socket
+        with socket_lock(self.__socket_path):
+            try:
+                if self.__socket_path.stat().st_ino == self.__inode:
+                    self.__socket_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __handle(self, conn: socket.socket) -> bool:
+        if not same_user(conn):
+            return True
+
+        try:
+            return self.__dispatch(conn, json.loads(_receive(conn)))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            _send(conn, {"ok": False, "error": "Bad request"})
+            return True
+
+    def __dispatch(self, conn: socket.socket, request: dict) -> bool:
+        op = request["op"]
+
+        if op == "put":
+            timeout = float(request["timeout"])
+            key = bytearray(bytes.fromhex(request["key"]))
+            self.__keys[request["vault"]] = (key, timeout, time.monotonic() + timeout)
+            _send(conn, {"ok": True})
+            return True
+
+        if op == "get":
+            entry = self.__keys.get(request.get("vault"))
+            if entry is None:
+                _send(conn, {"ok": False, "error": "Vault is locked"})
+                return True
+
+            key, timeout, _ = entry
+            self.__keys[request["vault"]] = (key, timeout, time.monotonic() + timeout)
+            _send(conn, {"ok": True, "key": key.hex()})
+            return True
+
+        if op == "status":
+            now = time.monotonic()
+            vaults = {
+                vault: round(expiry - now) for vault, (_, _, expiry) in self.__keys.items()
+            }
+            _send(conn, {"ok": True, "vaults": vaults})
+            return True
+
+        if op == "lock":
+            self.__forget_all()
+            _send(conn, {"ok": True})
+            return False
+
+        _send(conn, {"ok": False, "error": f"Unknown operation '{op}'"})
+        return True
+
+    def __expire(self) -> None:
+        now = time.monotonic()
+        for vault, (key, _, expiry) in list(self.__keys.items()):
+            if expiry <= now:
+                key[:] = bytes(len(key))
+                del self.__keys[vault]
+
+    def __next_expiry(self) -> float:
+        if len(self.__keys) == 0:
+            return 1.0
+        soonest = min(expiry for _, _, expiry in self.__keys.values())
+        return max(soonest - time.monotonic(), 0.01)
+
+    def __forget_all(self) -> None:
+        for key, _, _ in self.__keys.values():
+            key[:] = bytes(len(key))
+        self.__keys.clear()
+
+
+class AgentClient:
+    """
+    Talk to the unlock agent, starting it when a key is put and it isn't
+    running.
+    """
+
+    def __init__(self, socket_path: Path | None = None) -> None:
+        if socket_path is None:
+            socket_path = default_socket_path()
+        self.__socket_path = socket_path
+
+    @property
+    def socket_path(self) -> Path:
+        return self.__socket_path
+
+    def get_key(self, vault_id: str) -> bytes | None:
+        """
+        Get the key of a vault, None if it is locked or the agent isn't
+        running.
+        """
+
+        reply = self.__request({"op": "get", "vault": vault_id})
+        if reply is None or not reply.get("ok"):
+            return None
+        return bytes.fromhex(reply["key"])
+
+    def put_key(self, vault_id: str, key: bytes, idle_timeout: float) -> None:
+        """
+        Hand a key to the agent, starting it if needed.
+        """
+
+        request = {
+            "op": "put",
+            "vault": vault_id,
+            "key": key.hex(),
+            "timeout": idle_timeout,
+        }
+
+        reply = self.__request(request)
+        if reply is None:
+            self.__start()
+            reply = self.__request(request)
+
+        if reply is None or not reply.get("ok"):
+            raise ConnectionError("Unlock agent did not accept the key")
+
+    def status(self) -> dict[str, int]:
+        """
+        Get the seconds left before each unlocked vault locks itself.
+        """
+
+        reply = self.__request({"op": "status"})
+        if reply is None or not reply.get("ok"):
+            return {}
+        return reply["vaults"]
+
+    def lock(self) -> bool:
+        """
+        Make the agent forget every key and exit.
+
+        Returns:
+            bool: False if the agent wasn't running
+        """
+        return self.__request({"op": "lock"}) is not None
+
+    def __request(self, request: dict) -> dict | None:
+        if not self.__socket_path.exists():
+            return None
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(2)
+                conn.connect(str(self.__socket_path))
+                conn.sendall(json.dumps(request).encode("utf-8"))
+                conn.shutdown(socket.SHUT_WR)
+                return json.loads(_receive(conn))
+        except (OSError, ValueError):
+            return None
+
+    def __start(self) -> None:
+        self.__socket_path.parent.mkdir(mode=0o700, exist_ok=True)
+        read_fd, write_fd = os.pipe()
+
+        # A new interpreter rather than a fork: forking a threaded process
+        # can deadlock the child, and it would keep the store's open files
+        try:
+            try:
+                process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "internal.services.agent.agent",
+                        str(self.__socket_path.resolve()),
+                        str(write_fd),
+                    ],
+                    cwd=_ROOT,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    pass_fds=(write_fd,),
+                    close_fds=True,
+                    start_new_session=True,
+                )
+            finally:
+                os.close(write_fd)
+            process.wait()
+
+            # Blocks until the agent listens, or returns b"" if it died
+            os.read(read_fd, 1)
+        finally:
+            os.close(read_fd)
+
+
+def default_socket_path() -> Path:
+    """
+    Get the agent socket in the user runtime directory.
+    """
+    return runtime_socket_path("agent.sock")
+
+
+def runtime_socket_path(name: str) -> Path:
+    """
+    Get the path of a socket in the user runtime directory.
+    """
+
+    with warnings.catch_warnings():
+        # Falls back to a per-user directory in /tmp without XDG_RUNTIME_DIR
+        warnings.simplefilter("ignore")
+        runtime_dir = user_runtime_dir(
+            "plug-password", "Faissal Maulana", ensure_exists=True
+        )
+
+    return Path(runtime_dir) / name
+
+
+def same_user(conn: socket.socket) -> bool:
+    """
+    Check whether the process at the other end of a Unix socket runs as
+    the current user.
+    """
+
+    if not hasattr(socket, "SO_PEERCRED"):
+        # The socket is only accessible to its owner anyway
+        return True
+
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+
+@contextlib.contextmanager
+def socket_lock(socket_path: Path) -> Iterator[None]:
+    """
+    Hold the lock file of a socket path, while a socket is bound to or
+    removed from it.
+    """
+
+    fd = os.open(socket_path.with_name(f"{socket_path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def is_listening(socket_path: Path) -> bool:
+    """
+    Check whether a process accepts connections on a Unix socket. A socket
+    left by a process that was killed refuses them.
+    """
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(2)
+            conn.connect(str(socket_path))
+            return True
+    except OSError:
+        return False
+
+
+def _receive(conn: socket.socket) -> bytes:
+    # Read until the other side is done writing
+    data = b""
+    while len(data) <= _MAX_MESSAGE:
+        chunk = conn.recv(_MAX_MESSAGE)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _send(conn: socket.socket, reply: dict) -> None:
+    try:
+        conn.sendall(json.dumps(reply).encode("utf-8"))
+        conn.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    # Started by AgentClient with the socket path and the readiness pipe.
+    # Forking this fresh interpreter is safe, and lets the client reap its
+    # child right away instead of leaving the agent a zombie
+    if os.fork() != 0:
+        os._exit(0)
+    UnlockAgent(Path(sys.argv[1])).serve(int(sys.argv[2]))
@@ -0,0 +1,85 @@
+import secrets
+
+from internal.repositories.async_store import AsyncStore
+from internal.repositories.sqlite.keys import new_account_id
+from internal.services.vault.vault import Vault
+
+
+class AsyncAccount:
+    """
+    Async counterpart of `Account`, built on an `AsyncStore`.
+
+    The vault talks to the unlock agent and reads its parameters with the
+    synchronous store, so it runs off the event loop through `run_sync`.
+    """
+
+    def __init__(self, store: AsyncStore) -> None:
+        self.__store = store
+
+    async def add_new_account(self, platform: str, secret: str | None = None) -> str:
+        """
+        Add an account, with its secret encrypted by the unlocked vault if
+        one is given.
+
+        Returns:
+            str: Id of the new account
+        """
+
+        if platform == "":
+            raise ValueError("platform can't be empty string")
+
+        name = self.__generate_account_name()
+        account_id = new_account_id()
+
+        payload = None
+        if secret is not None:
+            # Before the snapshot, so a locked vault changes nothing
+            payload = await self.__store.run_sync(
+                lambda store: Vault(store).encrypt_secret(account_id, secret)
+            )
+
+        await self.__store.add_account(
+            account_id, platform, payload, snapshot_name=f"{name}_accounts"
+        )
+        return account_id
+
+    async def reveal_secret(self, account_id: str) -> str | None:
+        """
+        Decrypt the secret of an account of the current store, None if it
+        has none.
+        """
+
+        current = await self.__store.get_current_table()
+
+        payload = await self.__store.get_secret(current, account_id)
+        if payload is None:
+            return None
+
+        return await self.__store.run_sync(
+            lambda store: Vault(store).decrypt_secret(account_id, payload)
+        )
+
+    async def get_accounts(self, platform: str) -> list[tuple[str, str]]:
+        """
+        Get the accounts of the current store with exactly the given platform.
+        """
+        if platform == "":
+            raise ValueError("platform can't be empty string")
+
+        current = await self.__store.get_current_table()
+        return await self.__store.find_accounts(current, platform)
+
+    async def search_accounts(
+        self, text: str, limit: int = 50
+    ) -> list[tuple[str, str]]:
+        """
+        Search the accounts of the current store by words of their platform.
+        """
+        if text.strip() == "":
+            raise ValueError("search query can't be empty string")
+
+        current = await self.__store.get_current_table()
+        return await self.__store.search_accounts(current, text, limit)
+
+    def __generate_account_name(self) -> str:
+        return f"{secrets.token_hex(4)}"
@@ -1,15 +1,36 @@
+import marshal
+import os
+import stat
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from platformdirs import user_config_dir
-from tomlkit import dumps, parse, table
-from tomlkit.toml_document import TOMLDocument
+from platformdirs import user_cache_dir, user_config_dir
+
+if TYPE_CHECKING:
+    from tomlkit.toml_document import TOMLDocument
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where config writes aren't locked against other processes
+    fcntl = None  # type: ignore[assignment]
+
+# Bump when the layout of the cache file changes
+_CACHE_VERSION = 1
 
 
 class _ConfigApplication:
-    def __init__(self, path_dir: Path):
+    def __init__(self, path_dir: Path, cache_dir: Path | None = None):
         self.config_dir = path_dir
         self.config_file: Path | None = None
+        self.cache_file = cache_dir / "config.cache" if cache_dir else None
         self.__doc: TOMLDocument | None = None
+        self.__values: dict | None = None
+        self.__in_batch = False
+        # Descriptor of the config file while this instance holds its lock
+        self.__locked_fd: int | None = None
 
     def setup_config_dir(self):
         """
@@ -22,24 +43,40 @@ class _ConfigApplication:
         self.config_dir.mkdir(parents=True, exist_ok=True)
 
         self.config_file = self.config_dir / "config.toml"
-        self.config_file.touch(exist_ok=True)
+
+        # Don't bump the mtime of an existing file, it keys the values cache
+        if not self.config_file.exists():
+            self.config_file.touch()
 
     def __write_defaults(self):
         """
         Write default TOML config (only for empty file).
+
+        Written in place under the lock, not replaced: a process waiting for
+        the lock of the file must not be left holding one on a file that is
+        no longer the config. Overwriting an empty file loses nothing if it
+        is cut short.
         """
+        from tomlkit import dumps, parse
 
         doc = parse(
             """[sqlite_directory]\nlocation_path = "" # Path where the root directory of db located"""
         )
 
-        if self.config_file is not None:
-            self.config_file.write_text(dumps(doc), encoding="utf-8")
+        if self.config_file is None:
+            return
+
+        with self.__lock() as fd:
+            # Another process may have written it while this one waited
+            if os.fstat(fd).st_size == 0:
+                _write_in_place(fd, dumps(doc))
 
     def _ensure_loaded(self):
         """
         Ensure config exists, has content, and is loaded.
         """
+        from tomlkit import parse
+
         try:
             self.setup_config_dir()
         except FileExistsError:
@@ -56,8 +93,178 @@ class _ConfigApplication:
         """
         Write TOML value To the config file.
         """
+        from tomlkit import dumps
+
         if self.config_file is not None and self.__doc is not None:
-            self.config_file.write_text(dumps(self.__doc), encoding="utf-8")
+            _write_atomic(self.config_file, dumps(self.__doc))
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Group config changes into a single write of the config file.
+
+        The file is locked for the whole block and read again once locked,
+        so changes another process saved meanwhile are kept, not lost.
+        `set_key_value` calls inside the block only change the document,
+        written once on leaving it. Nothing is written if the block raises.
+        A batch inside another one joins it.
+        """
+        if self.__in_batch:
+            yield
+            return
+
+        try:
+            self.setup_config_dir()
+        except FileExistsError:
+            pass
+
+        # Without locks, an open config file would only keep Windows from
+        # replacing it
+        with self.__lock() if fcntl is not None else nullcontext():
+            self.__doc = None
+            self.__values = None
+            self._ensure_loaded()
+
+            self.__in_batch = True
+            try:
+                yield
+                self.__save()
+            except BaseException:
+                # Drop the unsaved changes, the file is read again on next use
+                self.__doc = None
+                raise
+            finally:
+                self.__in_batch = False
+                self.__values = None
+
+    @contextmanager
+    def __lock(self) -> Iterator[int]:
+        """
+        Hold an exclusive advisory lock on the config file, yielding the
+        descriptor it is held on, open for reading and writing. Taking it
+        again while it is held reuses it.
+
+        Saving replaces the file, so a lock won on a file replaced while
+        waiting for it is given up and taken again on the new one.
+        """
+        if self.__locked_fd is not None:
+            yield self.__locked_fd
+            return
+
+        if self.config_file is None:
+            raise RuntimeError("Config file not set up")
+
+        while True:
+            fd = os.open(self.config_file, os.O_RDWR)
+            if fcntl is None:
+                break
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if os.path.samestat(os.fstat(fd), os.stat(self.config_file)):
+                    break
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
+
+        self.__locked_fd = fd
+        try:
+            yield fd
+        finally:
+            self.__locked_fd = None
+            # Closing the file releases the lock
+            os.close(fd)
+
+    def __load_values(self) -> dict:
+        """
+        Get the resolved config values as plain Python objects.
+
+        The values are read from the cache file while the config file keeps
+        the same mtime, size and inode, so reads don't need to import or run
+        tomlkit. Otherwise the TOML file is parsed and the cache rewritten.
+        """
+        if self.__values is not None:
+            return self.__values
+
+        if self.__doc is None:
+            cached = self.__read_cache()
+            if cached is not None:
+                self.__values = cached
+                return cached
+
+        config_file = self.config_dir / "config.toml"
+        key = self.__cache_key(config_file)
+
+        self._ensure_loaded()
+
+        if key is None:
+            # The file was just created with the default config
+            key = self.__cache_key(config_file)
+
+        if self.__doc is None:
+            return {}
+
+        self.__values = self.__doc.unwrap()
+        if key is not None:
+            self.__write_cache(key, self.__values)
+
+        return self.__values
+
+    def __cache_key(self, config_file: Path) -> tuple | None:
+        try:
+            stat = config_file.stat()
+        except OSError:
+            return None
+
+        if stat.st_size == 0:
+            return None
+
+        return (
+            _CACHE_VERSION,
+            str(config_file.resolve()),
+            stat.st_mtime_ns,
+            stat.st_size,
+            stat.st_ino,
+        )
+
+    def __read_cache(self) -> dict | None:
+        if self.cache_file is None:
+            return None
+
+        key = self.__cache_key(self.config_dir / "config.toml")
+        if key is None:
+            return None
+
+        try:
+            cached_key, values = marshal.loads(self.cache_file.read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if cached_key != key or not isinstance(values, dict):
+            return None
+
+        return values
+
+    def __write_cache(self, key: tuple, values: dict):
+        if self.cache_file is None:
+            return
+
+        try:
+            data = marshal.dumps((key, values))
+        except ValueError:
+            # Values marshal can't encode, such as TOML dates, are not cached
+            return
+
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_name(
+                f"{self.cache_file.name}.{os.getpid()}.tmp"
+            )
+            tmp_file.write_bytes(data)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
 
     def get_location(self) -> str:
         """
@@ -74,45 +281,108 @@ class _ConfigApplication:
         """
         Get TOML value in the config else default.
         """
-        self._ensure_loaded()
+        values = self.__load_values()
 
         if table_name:
-            if self.__doc is not None:
-                return self.__doc.get(table_name, {}).get(key, default)
+            table = values.get(table_name, {})
+            if isinstance(table, dict):
+                return table.get(key, default)
+            return default
 
-        if self.__doc is not None:
-            return self.__doc.get(key, default)
+        return values.get(key, default)
 
     def set_key_value(self, key, value, table_name=None):
         """
-        Set a TOML value in the config.
+        Set a TOML value in the config, saved at once or at the end of the
+        current `batch`.
 
         - key: config key
         - value: value to set (replaces existing or creates new)
         - table_name: optional TOML table name
         """
+        from tomlkit import table
 
-        self._ensure_loaded()
+        with self.batch():
+            if key == "" or table_name == "":
+                raise Exception("key and table_name can't empty string")
+
+            if self.__doc is None:
+                raise RuntimeError("Document not loaded")
 
-        if key == "" or table_name == "":
-            raise Exception("key and table_name can't empty string")
+            if table_name:
+                if table_name not in self.__doc:
+                    self.__doc[table_name] = table()
 
-        if self.__doc is None:
-            raise RuntimeError("Document not loaded")
+                self.__doc[table_name][key] = value  # type: ignore[index]
+            else:
+                self.__doc[key] = value
 
-        if table_name:
-            if table_name not in self.__doc:
-                self.__doc[table_name] = table()
+            self.__values = None
 
-            self.__doc[table_name][key] = value  # type: ignore[index]
-        else:
-            self.__doc[key] = value
+    def apply(self, values: Mapping) -> int:
+        """
+        Set every value of a parsed TOML document in one batch: each key of
+        a table in that table, anything else as a top-level key.
 
-        self.__save()
+        Returns:
+            int: Number of values set
+        """
+
+        count = 0
+        with self.batch():
+            for name, value in values.items():
+                if isinstance(value, Mapping):
+                    for key, item in value.items():
+                        self.set_key_value(key, item, name)
+                        count += 1
+                else:
+                    self.set_key_value(name, value)
+                    count += 1
+
+        return count
+
+
+def _write_in_place(fd: int, text: str):
+    data = text.encode("utf-8")
+    os.ftruncate(fd, 0)
+    os.lseek(fd, 0, os.SEEK_SET)
+    while data:
+        data = data[os.write(fd, data) :]
+    os.fsync(fd)
+
+
+def _write_atomic(path: Path, text: str):
+    """
+    Replace a file with a temporary one written and synced first, so a
+    crash leaves either the old or the new content, never a truncated file.
+    """
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_file.open("w", encoding="utf-8") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+
+        # Keep permissions the user may have narrowed
+        if path.exists():
+            os.chmod(tmp_file, stat.S_IMODE(path.stat().st_mode))
+        os.replace(tmp_file, path)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+    if hasattr(os, "O_DIRECTORY"):
+        # Sync the rename itself
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
 
 config_app = _ConfigApplication(
-    Path(user_config_dir("plug-password", "Faissal Maulana"))
+    Path(user_config_dir("plug-password", "Faissal Maulana")),
+    Path(user_cache_dir("plug-password", "Faissal Maulana")),
 )
 
 __all__ = ["config_app"]
@@ -0,0 +1,132 @@
+import itertools
+import os
+import string
+from collections.abc import Callable, Iterable, Iterator
+
+from internal.constants.constants import PASSWORD_POLICIES
+
+# Random bytes drawn at most at once, one getrandom call for thousands of
+# passwords
+_BLOCK_SIZE = 64 * 1024
+
+_SYMBOLS = "!#$%&()*+,-./:;<=>?@[]^_{|}~"
+
+# Policy name -> characters to draw from and classes every password needs
+# one character of
+_POLICIES: dict[str, tuple[str, tuple[str, ...]]] = {
+    "strong": (
+        string.ascii_letters + string.digits + _SYMBOLS,
+        (string.ascii_lowercase, string.ascii_uppercase, string.digits, _SYMBOLS),
+    ),
+    "alnum": (
+        string.ascii_letters + string.digits,
+        (string.ascii_lowercase, string.ascii_uppercase, string.digits),
+    ),
+    # Without the look-alikes 0 O 1 l I, for passwords read aloud or retyped
+    "readable": ("abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789", ()),
+    "printable": (string.ascii_letters + string.digits + string.punctuation, ()),
+    "hex": (string.hexdigits[:16], ()),
+    "digits": (string.digits, ()),
+}
+
+
+class PasswordGenerator:
+    """
+    Generate passwords from the operating system CSPRNG.
+
+    Random bytes are drawn in large blocks and mapped to characters with one
+    `bytes.translate` call per block. Bytes at or above the largest multiple
+    of the charset size are deleted instead of mapped, so every character is
+    drawn with exactly the same probability: without that rejection, `b % n`
+    favours the first `256 % n` characters.
+
+    Policies requiring character classes redraw a whole password missing
+    one, which keeps the passwords uniform among those meeting the policy.
+    """
+
+    def __init__(
+        self,
+        charset: str,
+        required: Iterable[str] = (),
+        random_bytes: Callable[[int], bytes] = os.urandom,
+    ) -> None:
+        """
+        - charset: printable ASCII characters to draw from, duplicates ignored
+        - required: character classes each password needs one character of
+        - random_bytes: source of random bytes, `os.urandom` outside tests
+        """
+
+        chars = "".join(dict.fromkeys(charset))
+        if len(chars) < 2:
+            raise ValueError("charset needs at least 2 distinct characters")
+        if not all(char.isascii() and char.isprintable() and not char.isspace() for char in chars):
+            raise ValueError("charset can only hold printable ASCII characters")
+
+        self.__charset = chars
+        self.__required = [frozenset(chars).intersection(group) for group in required]
+        if not all(self.__required):
+            raise ValueError("every required character class needs a character of the charset")
+
+        # Largest multiple of the charset size, bytes from there are rejected
+        limit = 256 - 256 % len(chars)
+        encoded = chars.encode("ascii")
+        self.__table = bytes(encoded[b % len(chars)] if b < limit else 0 for b in range(256))
+        self.__rejected = bytes(range(limit, 256))
+        self.__random = random_bytes
+
+    @classmethod
+    def from_policy(cls, policy: str, **kwargs) -> "PasswordGenerator":
+        if policy not in _POLICIES:
+            raise ValueError(
+                f"unknown password policy '{policy}', "
+                f"expected one of: {', '.join(PASSWORD_POLICIES)}"
+            )
+
+        charset, required = _POLICIES[policy]
+        return cls(charset, required, **kwargs)
+
+    @property
+    def charset(self) -> str:
+        return self.__charset
+
+    def generate(self, count: int, length: int) -> Iterator[str]:
+        """
+        Stream `count` passwords of `length` characters, drawing more random
+        bytes only once the previous block is used up.
+        """
+
+        if count < 0:
+            raise ValueError("count can't be negative")
+        if length < max(1, len(self.__required)):
+            raise ValueError(
+                f"length must be at least {max(1, len(self.__required))} "
+                "to fit a character of every required class"
+            )
+
+        return self.__stream(count, length)
+
+    def __stream(self, count: int, length: int) -> Iterator[str]:
+        remaining = count
+        pending = ""
+        while remaining > 0:
+            pending += self.__draw(remaining * length)
+
+            usable = len(pending) - len(pending) % length
+            passwords = [pending[i : i + length] for i in range(0, usable, length)]
+            pending = pending[usable:]
+
+            # One pass per class, twice as fast as checking every class of
+            # each password in turn
+            for group in self.__required:
+                passwords = list(itertools.filterfalse(group.isdisjoint, passwords))
+
+            batch = passwords[:remaining]
+            remaining -= len(batch)
+            yield from batch
+
+    def __draw(self, wanted: int) -> str:
+        # Twice the characters still wanted covers the rejected bytes and
+        # most redrawn passwords, without reading 64 KiB for a single one
+        size = min(_BLOCK_SIZE, max(256, 2 * wanted))
+        block = self.__random(size).translate(self.__table, self.__rejected)
+        return block.decode("ascii")
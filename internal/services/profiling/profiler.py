@@ -0,0 +1,210 @@
+import json
+import re
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+# Bound values show up in traced statements as literals, blobs as x'...'
+_LITERALS = re.compile(r"(?:\b[xX])?'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class Profiler:
+    """
+    Collect the timings of a command: its phases and the SQL statements it
+    runs, with the number of rows each one changed.
+
+    Statements are captured with `sqlite3.Connection.set_trace_callback`,
+    which only reports when a statement starts, so a statement is timed until
+    the next one starts or its phase ends. Literals are replaced with `?`, so
+    values never end up in a report, and statements are aggregated by phase
+    and text, since a bulk insert runs the same one many times. Triggers are
+    traced with the text of the statement that fired them, so `events`
+    counts executions and the trigger programs they run.
+
+    Nothing is collected unless a profiler is enabled with `enable`.
+    """
+
+    def __init__(self, started: float | None = None) -> None:
+        self.__started = time.perf_counter() if started is None else started
+        self.__phases: list[dict] = []
+        self.__stack: list[str] = []
+        self.__statements: dict[tuple[str, str], dict] = {}
+        self.__conn: sqlite3.Connection | None = None
+        # Statement currently running: its entry, start time and total changes
+        self.__running: tuple[dict, float, int] | None = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[dict]:
+        """
+        Time the block as a phase, nested in the phase that is running.
+
+        Yields the phase entry, so extra fields such as a row count can be
+        added to it. A phase ended by an exception records its type as
+        `error`.
+        """
+
+        start = time.perf_counter()
+        entry = {
+            "name": name,
+            "depth": len(self.__stack),
+            "start_ms": self.__ms(start - self.__started),
+            "duration_ms": None,
+        }
+        self.__phases.append(entry)
+        self.__stack.append(name)
+
+        try:
+            yield entry
+        except BaseException as err:
+            entry["error"] = type(err).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            self.__finish_statement(end)
+            self.__stack.pop()
+            entry["duration_ms"] = self.__ms(end - start)
+
+    def mark(self, name: str, start: float, end: float | None = None) -> None:
+        """
+        Record a phase that already happened, like the imports before the
+        profiler was enabled.
+        """
+
+        if end is None:
+            end = time.perf_counter()
+
+        self.__phases.append(
+            {
+                "name": name,
+                "depth": len(self.__stack),
+                "start_ms": self.__ms(start - self.__started),
+                "duration_ms": self.__ms(end - start),
+            }
+        )
+
+    def trace(self, conn: sqlite3.Connection) -> None:
+        """
+        Capture the statements run on a connection.
+        """
+
+        if conn is self.__conn:
+            return
+
+        conn.set_trace_callback(self.__on_statement)
+        self.__conn = conn
+
+    def report(self) -> dict:
+        """
+        Get the phases in the order they started, and the statements slowest
+        first.
+        """
+
+        self.__finish_statement(time.perf_counter())
+
+        statements = sorted(
+            self.__statements.values(), key=lambda row: row["total_ms"], reverse=True
+        )
+        return {
+            "total_ms": self.__ms(time.perf_counter() - self.__started),
+            "phases": sorted(self.__phases, key=lambda row: row["start_ms"]),
+            "statements": statements,
+        }
+
+    def write(self, output: Path | None = None) -> None:
+        """
+        Write the report as JSON to `output`, or as text to stderr.
+        """
+
+        report = self.report()
+
+        if output is not None:
+            output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+            return
+
+        err = sys.stderr
+        print(f"\nprofile: {report['total_ms']:.2f} ms total", file=err)
+        print(f"{'phase':<48} {'start ms':>10} {'ms':>10} {'rows':>8}", file=err)
+        for row in report["phases"]:
+            name = "  " * row["depth"] + row["name"]
+            if row.get("error") is not None:
+                name += f" ({row['error']})"
+            duration = row["duration_ms"] or 0.0
+            rows = "" if row.get("rows") is None else row["rows"]
+            print(
+                f"{name:<48} {row['start_ms']:>10.2f} {duration:>10.2f} {rows:>8}",
+                file=err,
+            )
+
+        print(f"\n{'statement':<60} {'events':>7} {'ms':>10} {'changed':>8}", file=err)
+        for row in report["statements"]:
+            sql = row["sql"] if len(row["sql"]) <= 60 else row["sql"][:57] + "..."
+            print(
+                f"{sql:<60} {row['events']:>7} {row['total_ms']:>10.2f} "
+                f"{row['rows_changed']:>8}",
+                file=err,
+            )
+
+    def __on_statement(self, sql: str) -> None:
+        now = time.perf_counter()
+        self.__finish_statement(now)
+
+        phase = self.__stack[-1] if self.__stack else ""
+        sql = " ".join(_LITERALS.sub("?", sql).split())
+
+        entry = self.__statements.get((phase, sql))
+        if entry is None:
+            entry = {
+                "phase": phase,
+                "sql": sql,
+                "events": 0,
+                "total_ms": 0.0,
+                "rows_changed": 0,
+            }
+            self.__statements[(phase, sql)] = entry
+
+        entry["events"] += 1
+        self.__running = (entry, now, self.__total_changes())
+
+    def __finish_statement(self, now: float) -> None:
+        if self.__running is None:
+            return
+
+        entry, start, changes = self.__running
+        entry["total_ms"] += self.__ms(now - start)
+        entry["rows_changed"] += max(self.__total_changes() - changes, 0)
+        self.__running = None
+
+    def __total_changes(self) -> int:
+        try:
+            return self.__conn.total_changes if self.__conn is not None else 0
+        except sqlite3.ProgrammingError:
+            # Closed before the statement was finished
+            return 0
+
+    def __ms(self, seconds: float) -> float:
+        return round(seconds * 1000, 3)
+
+
+_active: Profiler | None = None
+
+
+def enable(started: float | None = None) -> Profiler:
+    """
+    Enable profiling for the rest of the process.
+
+    - started: `time.perf_counter()` of the process start, defaults to now
+    """
+
+    global _active
+    _active = Profiler(started)
+    return _active
+
+
+def active() -> Profiler | None:
+    """
+    Get the enabled profiler, None if profiling is disabled.
+    """
+    return _active
@@ -0,0 +1,99 @@
+from collections.abc import Callable, Iterator
+from functools import partial
+from typing import Any
+
+from internal.repositories.sqlite.connection import ConnectionManager
+from internal.repositories.store import AccountRecord, DiffRow, Store
+from internal.services.profiling.profiler import Profiler
+
+
+@Store.register
+class TracingStore:
+    """
+    Store that times every call of the store it wraps as a profiler phase,
+    with the number of rows it returned.
+
+    When the wrapped store has a SQLite `connection`, opening it is timed as
+    its own phase and every statement run on it is captured.
+
+    Calls are timed as they go through `__getattr__`, only those returning
+    an iterator consumed later are defined here.
+    """
+
+    def __init__(self, store: Store, profiler: Profiler) -> None:
+        self.__store = store
+        self.__profiler = profiler
+        self.__opened = False
+
+    def __getattr__(self, name: str) -> Any:
+        # Private names aren't forwarded, so an instance missing its store
+        # can't recurse looking it up
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        attr = getattr(self.__store, name)
+        if not callable(attr):
+            return attr
+        return partial(self.__call, name, attr)
+
+    def close(self) -> None:
+        close = getattr(self.__store, "close", None)
+        if close is not None:
+            close()
+
+    def export_table(
+        self, table_name: str, batch_size: int = 1000
+    ) -> Iterator[tuple[str, str]]:
+        with self.__profiler.phase("store.export_table") as entry:
+            self.__connect()
+            entry["rows"] = 0
+            for row in self.__store.export_table(table_name, batch_size):
+                entry["rows"] += 1
+                yield row
+
+    def diff_tables(
+        self, table_a: str, table_b: str, batch_size: int = 1000
+    ) -> Iterator[DiffRow]:
+        # Rows are fetched while the caller iterates, so that is what's timed
+        with self.__profiler.phase("store.diff_tables") as entry:
+            self.__connect()
+            entry["rows"] = 0
+            for row in self.__store.diff_tables(table_a, table_b, batch_size):
+                entry["rows"] += 1
+                yield row
+
+    def iter_accounts(
+        self, table_name: str, batch_size: int = 1000
+    ) -> Iterator[AccountRecord]:
+        with self.__profiler.phase("store.iter_accounts") as entry:
+            self.__connect()
+            entry["rows"] = 0
+            for record in self.__store.iter_accounts(table_name, batch_size):
+                entry["rows"] += 1
+                yield record
+
+    def __call(self, name: str, method: Callable, *args, **kwargs):
+        with self.__profiler.phase(f"store.{name}") as entry:
+            self.__connect()
+            result = method(*args, **kwargs)
+
+            if isinstance(result, (list, dict)):
+                entry["rows"] = len(result)
+            elif isinstance(result, int) and not isinstance(result, bool):
+                entry["rows"] = result
+
+            return result
+
+    def __connect(self) -> None:
+        manager = getattr(self.__store, "connection", None)
+        if not isinstance(manager, ConnectionManager):
+            return
+
+        if not self.__opened:
+            with self.__profiler.phase("connection open"):
+                conn = manager.get()
+            self.__opened = True
+        else:
+            conn = manager.get()
+
+        self.__profiler.trace(conn)
@@ -0,0 +1,506 @@
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import signal
+import socket
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from internal.constants.constants import DEFAULT_SERVER_READERS
+from internal.repositories.async_store import AsyncStore
+from internal.repositories.store import Store
+from internal.repositories.sqlite.async_store import AsyncSqliteStore
+from internal.repositories.sqlite.cache import CachingStore
+from internal.services.agent.agent import (
+    is_listening,
+    runtime_socket_path,
+    same_user,
+    socket_lock,
+)
+from internal.services.async_accounts import AsyncAccount
+from internal.services.storage.async_storage import AsyncStorage
+
+# Longest request line, a batch of a few thousand calls fits
+_MAX_MESSAGE = 16 * 1024 * 1024
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RpcError(Exception):
+    """
+    Error returned by the store server for a call.
+
+    - code: JSON-RPC error code, `SERVER_ERROR` when the operation failed
+    - error_type: name of the exception raised by the operation, if any
+    """
+
+    def __init__(self, code: int, message: str, error_type: str | None = None) -> None:
+        super().__init__(message)
+        self.code = code
+        self.error_type = error_type
+
+
+class StoreServer:
+    """
+    Daemon serving `Storage` and `Account` operations as JSON-RPC 2.0 over a
+    Unix socket only the current user can reach.
+
+    Clients keep a connection open and send one request per line, a JSON
+    object or a batch array, getting one reply line back for each in order.
+    Writes all go to one store on one thread, so they never wait on each
+    other for the SQLite write lock. Reads are spread over read-only stores,
+    each with its own connection and thread, and in WAL mode see every
+    write committed before they started.
+
+    Methods, with their params:
+    - store.current, store.snapshots, store.list(limit, offset, since)
+    - store.read(snapshot), store.diff(snapshot_a, snapshot_b),
+      store.diff_stat(snapshot_a, snapshot_b)
+    - store.switch(snapshot), store.gc(dry_run)
+    - account.get(platform), account.search(text, limit),
+      account.reveal(account_id), account.add(platform, secret)
+    - server.shutdown
+    """
+
+    def __init__(
+        self,
+        socket_path: Path | None = None,
+        readers: int = DEFAULT_SERVER_READERS,
+        open_store: Callable[[bool], Store] | None = None,
+    ) -> None:
+        """
+        - open_store: opens the store, read-only when given True, the
+          configured store by default
+        """
+        if readers < 1:
+            raise ValueError("readers must be positive")
+
+        self.__socket_path = default_server_socket_path() if socket_path is None else socket_path
+        self.__readers = readers
+        self.__open_store = open_store
+        self.__stopped: asyncio.Event | None = None
+
+    @property
+    def socket_path(self) -> Path:
+        return self.__socket_path
+
+    def serve(self, on_ready: Callable[[], None] | None = None) -> None:
+        """
+        Serve requests until SIGINT, SIGTERM or a `server.shutdown` call.
+
+        - on_ready: called once the socket accepts connections
+        """
+        asyncio.run(self.__serve(on_ready))
+
+    async def __serve(self, on_ready: Callable[[], None] | None) -> None:
+        open_store = self.__open_store
+        if open_store is None:
+            # Imported here, the config is read when the daemon starts
+            from internal.services.storage.storage import open_sqlite_repository
+
+            open_store = open_sqlite_repository
+
+        writer = AsyncSqliteStore(CachingStore(open_store(False)))
+        readers: list[AsyncStore] = []
+        try:
+            await writer.open()
+            # Brings the schema up to date before read-only stores open it
+            await writer.get_current_table()
+
+            for _ in range(self.__readers):
+                reader = AsyncSqliteStore(CachingStore(open_store(True)))
+                readers.append(reader)
+                await reader.open()
+
+            self.__methods = self.__build_methods(writer, readers)
+            await self.__listen(on_ready)
+        finally:
+            for store in (writer, *readers):
+                await store.close()
+
+    async def __listen(self, on_ready: Callable[[], None] | None) -> None:
+        self.__stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Signals only reach the main thread
+        signals = (
+            (signal.SIGINT, signal.SIGTERM)
+            if threading.current_thread() is threading.main_thread()
+            else ()
+        )
+        for signum in signals:
+            loop.add_signal_handler(signum, self.__stopped.set)
+
+        self.__socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        server, inode = await self.__bind()
+
+        try:
+            if on_ready is not None:
+                on_ready()
+            await self.__stopped.wait()
+        finally:
+            server.close()
+            self.__unbind(inode)
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+
+    async def __bind(self) -> tuple[asyncio.Server, int]:
+        # Under the lock, so a second daemon can't take the socket of a
+        # running one and leave it unreachable
+        with socket_lock(self.__socket_path):
+            if is_listening(self.__socket_path):
+                raise FileExistsError(f"A server is already listening on {self.__socket_path}")
+
+            # Listening before it appears at the path, like the unlock agent
+            temp_path = self.__socket_path.with_name(f".{self.__socket_path.name}.{os.getpid()}")
+            temp_path.unlink(missing_ok=True)
+
+            old_umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(
+                    self.__handle, path=str(temp_path), limit=_MAX_MESSAGE, cleanup_socket=False
+                )
+            finally:
+                os.umask(old_umask)
+
+            os.rename(temp_path, self.__socket_path)
+            return server, self.__socket_path.stat().st_ino
+
+    def __unbind(self, inode: int) -> None:
+        # Leave the path alone once another server replaced the socket
+        with socket_lock(self.__socket_path):
+            try:
+                if self.__socket_path.stat().st_ino == inode:
+                    self.__socket_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            if not same_user(writer.get_extra_info("socket")):
+                return
+
+            while line := await reader.readline():
+                reply = await self.__reply(line)
+                if reply is not None:
+                    writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                    await writer.drain()
+        except (ConnectionError, ValueError):
+            # Client went away, or sent a line past the limit
+            pass
+        finally:
+            writer.close()
+
+    async def __reply(self, line: bytes) -> dict | list | None:
+        """
+        Run a request line, in order for a batch, and build its reply. None
+        when every call was a notification, without an id.
+        """
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "Parse error")
+
+        if isinstance(request, list):
+            if len(request) == 0:
+                return _error(None, INVALID_REQUEST, "Invalid request")
+
+            replies = [await self.__call(call) for call in request]
+            replies = [reply for reply in replies if reply is not None]
+            return replies or None
+
+        return await self.__call(request)
+
+    async def __call(self, request: Any) -> dict | None:
+        if (
+            not isinstance(request, dict)
+            or request.get("jsonrpc") != "2.0"
+            or not isinstance(request.get("method"), str)
+        ):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+
+        call_id = request.get("id")
+        notification = "id" not in request
+
+        method = self.__methods.get(request["method"])
+        if method is None:
+            reply = _error(call_id, METHOD_NOT_FOUND, f"Method '{request['method']}' not found")
+            return None if notification else reply
+
+        params = request.get("params", {})
+        try:
+            if isinstance(params, list):
+                bound = inspect.signature(method).bind(*params)
+            elif isinstance(params, dict):
+                bound = inspect.signature(method).bind(**params)
+            else:
+                raise TypeError("params must be an array or an object")
+        except TypeError as err:
+            reply = _error(call_id, INVALID_PARAMS, str(err))
+            return None if notification else reply
+
+        try:
+            result = await method(*bound.args, **bound.kwargs)
+        except Exception as err:
+            reply = _error(call_id, SERVER_ERROR, str(err), type(err).__name__)
+            return None if notification else reply
+
+        if notification:
+            return None
+        return {"jsonrpc": "2.0", "id": call_id, "result": result}
+
+    def __build_methods(self, writer: AsyncStore, readers: list[AsyncStore]) -> dict:
+        from internal.services.storage.storage import get_retention_policy
+
+        write_storage = AsyncStorage(writer)
+        write_account = AsyncAccount(writer)
+        read_pool = itertools.cycle(
+            [(AsyncStorage(reader), AsyncAccount(reader)) for reader in readers]
+        )
+
+        def storage() -> AsyncStorage:
+            return next(read_pool)[0]
+
+        def account() -> AsyncAccount:
+            return next(read_pool)[1]
+
+        async def current() -> str:
+            return await storage().get_current_store()
+
+        async def snapshots() -> list[str]:
+            return await storage().get_all_snapshots()
+
+        async def list_snapshots(
+            limit: int | None = None, offset: int = 0, since: str | None = None
+        ) -> list[dict]:
+            infos = await storage().list_snapshots(limit, offset, since)
+            return [info._asdict() for info in infos]
+
+        async def read(snapshot: str) -> list:
+            return await storage().read_snapshot(snapshot)
+
+        async def diff(snapshot_a: str, snapshot_b: str) -> list[dict]:
+            return [
+                row._asdict()
+                async for row in storage().diff_snapshots(snapshot_a, snapshot_b)
+            ]
+
+        async def diff_stat(snapshot_a: str, snapshot_b: str) -> dict[str, int]:
+            return await storage().diff_stat(snapshot_a, snapshot_b)
+
+        async def switch(snapshot: str) -> None:
+            await write_storage.switch_snapshot(snapshot)
+
+        async def gc(dry_run: bool = False) -> list[str]:
+            return await write_storage.collect_garbage(get_retention_policy(), dry_run)
+
+        async def get(platform: str) -> list:
+            return await account().get_accounts(platform)
+
+        async def search(text: str, limit: int = 50) -> list:
+            return await account().search_accounts(text, limit)
+
+        async def reveal(account_id: str) -> str | None:
+            return await account().reveal_secret(account_id)
+
+        async def add(platform: str, secret: str | None = None) -> str:
+            return await write_account.add_new_account(platform, secret)
+
+        async def shutdown() -> None:
+            assert self.__stopped is not None
+            self.__stopped.set()
+
+        return {
+            "store.current": current,
+            "store.snapshots": snapshots,
+            "store.list": list_snapshots,
+            "store.read": read,
+            "store.diff": diff,
+            "store.diff_stat": diff_stat,
+            "store.switch": switch,
+            "store.gc": gc,
+            "account.get": get,
+            "account.search": search,
+            "account.reveal": reveal,
+            "account.add": add,
+            "server.shutdown": shutdown,
+        }
+
+
+class StoreClient:
+    """
+    Client of the store server, keeping one connection open across calls.
+
+    Calls block until their reply arrives. A client isn't thread-safe, use
+    one per thread. Failed calls raise `RpcError`, and `ConnectionError`
+    when the server can't be reached.
+    """
+
+    def __init__(self, socket_path: Path | None = None, timeout: float = 30.0) -> None:
+        self.__socket_path = default_server_socket_path() if socket_path is None else socket_path
+        self.__timeout = timeout
+        self.__conn: socket.socket | None = None
+        self.__file = None
+        self.__ids = itertools.count(1)
+
+    def __enter__(self) -> "StoreClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+        if self.__conn is not None:
+            self.__conn.close()
+        self.__conn = None
+        self.__file = None
+
+    def call(self, method: str, **params) -> Any:
+        """
+        Call a server method and return its result.
+        """
+
+        call_id = next(self.__ids)
+        reply = self.__request(
+            {"jsonrpc": "2.0", "id": call_id, "method": method, "params": params}
+        )
+        return _result(reply)
+
+    def batch(self, calls: list[tuple[str, dict]]) -> list[Any]:
+        """
+        Run several calls in one round trip, in order. The result of a call
+        that failed is its `RpcError`, so one failure doesn't lose the rest.
+        """
+
+        if len(calls) == 0:
+            return []
+
+        first = next(self.__ids)
+        self.__ids = itertools.count(first + len(calls))
+        requests = [
+            {"jsonrpc": "2.0", "id": first + i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+
+        replies = self.__request(requests)
+        if isinstance(replies, dict):
+            # The whole batch was rejected
+            _result(replies)
+
+        by_id = {reply.get("id"): reply for reply in replies}
+        results = []
+        for request in requests:
+            try:
+                results.append(_result(by_id[request["id"]]))
+            except RpcError as err:
+                results.append(err)
+        return results
+
+    def get_current_store(self) -> str:
+        return self.call("store.current")
+
+    def get_all_snapshots(self) -> list[str]:
+        return self.call("store.snapshots")
+
+    def list_snapshots(
+        self, limit: int | None = None, offset: int = 0, since: str | None = None
+    ) -> list[dict]:
+        return self.call("store.list", limit=limit, offset=offset, since=since)
+
+    def read_snapshot(self, snapshot: str) -> list[tuple[str, str]]:
+        return [tuple(row) for row in self.call("store.read", snapshot=snapshot)]
+
+    def diff_snapshots(self, snapshot_a: str, snapshot_b: str) -> list[dict]:
+        return self.call("store.diff", snapshot_a=snapshot_a, snapshot_b=snapshot_b)
+
+    def diff_stat(self, snapshot_a: str, snapshot_b: str) -> dict[str, int]:
+        return self.call("store.diff_stat", snapshot_a=snapshot_a, snapshot_b=snapshot_b)
+
+    def switch_snapshot(self, snapshot: str) -> None:
+        self.call("store.switch", snapshot=snapshot)
+
+    def collect_garbage(self, dry_run: bool = False) -> list[str]:
+        return self.call("store.gc", dry_run=dry_run)
+
+    def get_accounts(self, platform: str) -> list[tuple[str, str]]:
+        return [tuple(row) for row in self.call("account.get", platform=platform)]
+
+    def search_accounts(self, text: str, limit: int = 50) -> list[tuple[str, str]]:
+        return [tuple(row) for row in self.call("account.search", text=text, limit=limit)]
+
+    def reveal_secret(self, account_id: str) -> str | None:
+        return self.call("account.reveal", account_id=account_id)
+
+    def add_new_account(self, platform: str, secret: str | None = None) -> str:
+        return self.call("account.add", platform=platform, secret=secret)
+
+    def shutdown(self) -> None:
+        self.call("server.shutdown")
+        self.close()
+
+    def __request(self, request: dict | list) -> Any:
+        if self.__conn is None:
+            self.__connect()
+        assert self.__conn is not None and self.__file is not None
+
+        try:
+            self.__conn.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            line = self.__file.readline()
+        except OSError as err:
+            self.close()
+            raise ConnectionError(f"Store server connection failed: {err}")
+
+        if not line:
+            self.close()
+            raise ConnectionError("Store server closed the connection")
+        return json.loads(line)
+
+    def __connect(self) -> None:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(self.__timeout)
+        try:
+            conn.connect(str(self.__socket_path))
+        except OSError as err:
+            conn.close()
+            raise ConnectionError(
+                f"Store server isn't running on {self.__socket_path}: {err}"
+            )
+
+        self.__conn = conn
+        self.__file = conn.makefile("rb")
+
+
+def default_server_socket_path() -> Path:
+    """
+    Get the store server socket in the user runtime directory.
+    """
+    return runtime_socket_path("store.sock")
+
+
+def _error(call_id: Any, code: int, message: str, error_type: str | None = None) -> dict:
+    error: dict[str, Any] = {"code": code, "message": message}
+    if error_type is not None:
+        error["data"] = {"type": error_type}
+    return {"jsonrpc": "2.0", "id": call_id, "error": error}
+
+
+def _result(reply: dict) -> Any:
+    if "error" in reply:
+        error = reply["error"]
+        raise RpcError(
+            error.get("code", SERVER_ERROR),
+            error.get("message", ""),
+            (error.get("data") or {}).get("type"),
+        )
+    return reply.get("result")
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from internal.repositories.store import SnapshotInfo
+
+
+class RetentionPolicy:
+    def __init__(self, keep_last: int, keep_daily: int, keep_weekly: int) -> None:
+        for name, value in (
+            ("keep_last", keep_last),
+            ("keep_daily", keep_daily),
+            ("keep_weekly", keep_weekly),
+        ):
+            if value < 0:
+                raise ValueError(f"{name} can't be negative")
+
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+
+    def expired(
+        self, snapshots: list[SnapshotInfo], now: datetime | None = None
+    ) -> list[str]:
+        """
+        Get the names of the snapshots the policy doesn't keep, oldest first.
+
+        A snapshot is kept if it is one of the `keep_last` newest, or the
+        newest of one of the last `keep_daily` days or `keep_weekly` ISO weeks.
+        Snapshots without a creation date are only kept by `keep_last`.
+
+        - snapshots: catalog entries, oldest first
+        - now: current UTC time, defaults to now
+        """
+
+        if now is None:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        newest_first = snapshots[::-1]
+        keep = {snapshot.name for snapshot in newest_first[: self.keep_last]}
+
+        days = {(now - timedelta(days=i)).date() for i in range(self.keep_daily)}
+        weeks = {
+            (now - timedelta(weeks=i)).isocalendar()[:2]
+            for i in range(self.keep_weekly)
+        }
+
+        for snapshot in newest_first:
+            if snapshot.created_at is None:
+                continue
+
+            created = datetime.fromisoformat(snapshot.created_at)
+
+            day = created.date()
+            if day in days:
+                keep.add(snapshot.name)
+                days.discard(day)
+
+            week = created.isocalendar()[:2]
+            if week in weeks:
+                keep.add(snapshot.name)
+                weeks.discard(week)
+
+        return [snapshot.name for snapshot in snapshots if snapshot.name not in keep]
@@ -0,0 +1,116 @@
+from collections.abc import AsyncIterator
+
+from internal.repositories.async_store import AsyncStore
+from internal.repositories.store import DiffRow, SnapshotInfo
+from internal.services.snapshot.retention import RetentionPolicy
+
+
+class AsyncStorage:
+    """
+    Async counterpart of `Storage`, built on an `AsyncStore`.
+    """
+
+    def __init__(self, store: AsyncStore) -> None:
+        self.__store = store
+
+    async def create(self):
+        try:
+            await self.__store.create()
+        except Exception as err:
+            raise err
+
+    async def get_current_store(self) -> str:
+        try:
+            return await self.__store.get_current_table()
+        except Exception as err:
+            raise err
+
+    async def get_all_snapshots(self) -> list[str]:
+        try:
+            return await self.__store.get_all_tables()
+        except Exception as err:
+            raise err
+
+    async def list_snapshots(
+        self, limit: int | None = None, offset: int = 0, since: str | None = None
+    ) -> list[SnapshotInfo]:
+        if limit is not None and limit < 0:
+            raise ValueError("limit can't be negative")
+
+        if offset < 0:
+            raise ValueError("offset can't be negative")
+
+        try:
+            return await self.__store.get_snapshots(limit, offset, since)
+        except Exception as err:
+            raise err
+
+    async def collect_garbage(
+        self, policy: RetentionPolicy, dry_run: bool = False
+    ) -> list[str]:
+        """
+        Drop the snapshots the retention policy doesn't keep, never the
+        active one. Returns the names of the expired snapshots.
+        """
+
+        try:
+            current = await self.__store.get_current_table()
+            expired = [
+                name
+                for name in policy.expired(await self.__store.get_snapshots())
+                if name != current
+            ]
+
+            if not dry_run:
+                await self.__store.drop_tables(expired)
+
+            return expired
+        except Exception as err:
+            raise err
+
+    async def reclaim_space(self, max_pages: int) -> int:
+        if max_pages < 0:
+            raise ValueError("max pages can't be negative")
+
+        try:
+            return await self.__store.reclaim_space(max_pages)
+        except Exception as err:
+            raise err
+
+    async def switch_snapshot(self, snapshot_name: str):
+        if snapshot_name == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            await self.__store.switch_table(snapshot_name)
+        except Exception as err:
+            raise err
+
+    def diff_snapshots(
+        self, snapshot_a: str, snapshot_b: str, batch_size: int = 1000
+    ) -> AsyncIterator[DiffRow]:
+        if snapshot_a == "" or snapshot_b == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            return self.__store.diff_tables(snapshot_a, snapshot_b, batch_size)
+        except Exception as err:
+            raise err
+
+    async def diff_stat(self, snapshot_a: str, snapshot_b: str) -> dict[str, int]:
+        if snapshot_a == "" or snapshot_b == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            return await self.__store.diff_stat(snapshot_a, snapshot_b)
+        except Exception as err:
+            raise err
+
+    async def read_snapshot(self, snapshot_name: str) -> list[tuple[str, str]]:
+        if snapshot_name == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            return await self.__store.read_table(snapshot_name)
+        except Exception as err:
+            raise err
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator
+from typing import TextIO
+
+EXPORT_FORMATS = ("jsonl", "csv")
+_FIELDS = ("id", "platform")
+
+
+def jsonl_lines(rows: Iterable[tuple[str, str]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(_FIELDS, row)), ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows: Iterable[tuple[str, str]]) -> Iterator[str]:
+    # csv only writes to files, so each line goes through a reused buffer
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    writer.writerow(_FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # The header, when there are no rows
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
+
+
+def write_export(
+    rows: Iterable[tuple[str, str]], export_format: str, out: TextIO
+) -> int:
+    """
+    Write accounts to `out` as they come, one line each.
+
+    Returns:
+        int: Number of accounts written
+    """
+
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    count = 0
+
+    def counted() -> Iterator[tuple[str, str]]:
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    lines = jsonl_lines(counted()) if export_format == "jsonl" else csv_lines(counted())
+    for line in lines:
+        out.write(line)
+
+    return count
@@ -1,9 +1,32 @@
+import sys
+from collections.abc import Iterator
+from functools import cache
 from pathlib import Path
+from typing import TextIO
 
-from internal.constants.constants import KEY_STORE_DIRECTORY, TABLE_STORE_DIRECTORY
+from internal.constants.constants import (
+    DEFAULT_ACCOUNT_KEY_FORMAT,
+    DEFAULT_SNAPSHOT_MODE,
+    DEFAULT_SNAPSHOT_RETENTION,
+    DEFAULT_SQLITE_PRAGMAS,
+    KEY_ACCOUNT_KEY_FORMAT,
+    KEY_SNAPSHOT_DIRECTORY,
+    KEY_SNAPSHOT_MODE,
+    KEY_STORE_DIRECTORY,
+    TABLE_ACCOUNTS,
+    TABLE_SNAPSHOT_RETENTION,
+    TABLE_SNAPSHOTS,
+    TABLE_SQLITE_PRAGMAS,
+    TABLE_STORE_DIRECTORY,
+)
+from internal.repositories.sqlite.cache import CachingStore
+from internal.repositories.sqlite.migrations import MigrationProgress
 from internal.repositories.sqlite.store import SqliteStore
-from internal.repositories.store import Store
+from internal.repositories.store import DiffRow, SnapshotInfo, Store
 from internal.services.config.config import config_app
+from internal.services.profiling import profiler
+from internal.services.snapshot.retention import RetentionPolicy
+from internal.services.storage.export import write_export
 
 
 class Storage:
@@ -28,6 +51,58 @@ class Storage:
         except Exception as err:
             raise err
 
+    def list_snapshots(
+        self, limit: int | None = None, offset: int = 0, since: str | None = None
+    ) -> list[SnapshotInfo]:
+        if limit is not None and limit < 0:
+            raise ValueError("limit can't be negative")
+
+        if offset < 0:
+            raise ValueError("offset can't be negative")
+
+        try:
+            return self.__store.get_snapshots(limit, offset, since)
+        except Exception as err:
+            raise err
+
+    def collect_garbage(
+        self, policy: RetentionPolicy, dry_run: bool = False
+    ) -> list[str]:
+        """
+        Drop the snapshots the retention policy doesn't keep, never the
+        active one. Returns the names of the expired snapshots.
+        """
+
+        try:
+            current = self.__store.get_current_table()
+            expired = [
+                name
+                for name in policy.expired(self.__store.get_snapshots())
+                if name != current
+            ]
+
+            if not dry_run:
+                self.__store.drop_tables(expired)
+
+            return expired
+        except Exception as err:
+            raise err
+
+    def reclaim_space(self, max_pages: int) -> int:
+        if max_pages < 0:
+            raise ValueError("max pages can't be negative")
+
+        try:
+            return self.__store.reclaim_space(max_pages)
+        except Exception as err:
+            raise err
+
+    def migrate_keys(self) -> int:
+        try:
+            return self.__store.migrate_account_keys()
+        except Exception as err:
+            raise err
+
     def switch_snapshot(self, snapshot_name: str):
         if snapshot_name == "":
             raise ValueError("snapshot name is required")
@@ -37,15 +112,193 @@ class Storage:
         except Exception as err:
             raise err
 
+    def diff_snapshots(
+        self, snapshot_a: str, snapshot_b: str, batch_size: int = 1000
+    ) -> Iterator[DiffRow]:
+        if snapshot_a == "" or snapshot_b == "":
+            raise ValueError("snapshot name is required")
 
-storage_dir: str | None = config_app.get_value(
-    KEY_STORE_DIRECTORY, table_name=TABLE_STORE_DIRECTORY
-)
+        try:
+            return self.__store.diff_tables(snapshot_a, snapshot_b, batch_size)
+        except Exception as err:
+            raise err
+
+    def diff_stat(self, snapshot_a: str, snapshot_b: str) -> dict[str, int]:
+        if snapshot_a == "" or snapshot_b == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            return self.__store.diff_stat(snapshot_a, snapshot_b)
+        except Exception as err:
+            raise err
+
+    def export_snapshot(
+        self,
+        snapshot_name: str | None,
+        export_format: str,
+        out: TextIO,
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Write every account of a snapshot, the current one by default, to
+        `out` as JSON lines or CSV. Rows are streamed, so memory use doesn't
+        grow with the size of the snapshot.
+
+        Returns:
+            int: Number of accounts exported
+        """
+
+        if snapshot_name == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            if snapshot_name is None:
+                snapshot_name = self.__store.get_current_table()
+
+            rows = self.__store.export_table(snapshot_name, batch_size)
+            return write_export(rows, export_format, out)
+        except Exception as err:
+            raise err
+
+    def read_snapshot(self, snapshot_name: str) -> list[tuple[str, str]]:
+        if snapshot_name == "":
+            raise ValueError("snapshot name is required")
+
+        try:
+            return self.__store.read_table(snapshot_name)
+        except Exception as err:
+            raise err
+
+
+def _pragmas_from_config() -> dict[str, str | int]:
+    """
+    Get the SQLite PRAGMAs set in the `sqlite_pragmas` config table.
+    """
+
+    pragmas: dict[str, str | int] = {}
+    for key in DEFAULT_SQLITE_PRAGMAS:
+        value = config_app.get_value(key, table_name=TABLE_SQLITE_PRAGMAS)
+        if value is not None:
+            pragmas[key] = value if isinstance(value, int) else str(value)
+
+    return pragmas
+
+
+def get_retention_policy() -> RetentionPolicy:
+    """
+    Get the snapshot retention policy set in the `snapshot_retention` config
+    table, falling back to the defaults for missing keys.
+    """
+
+    values: dict[str, int] = {}
+    for key, default in DEFAULT_SNAPSHOT_RETENTION.items():
+        value = config_app.get_value(key, table_name=TABLE_SNAPSHOT_RETENTION)
+
+        try:
+            values[key] = default if value is None else int(value)
+        except ValueError:
+            raise ValueError(f"{TABLE_SNAPSHOT_RETENTION}.{key} must be an integer")
+
+    return RetentionPolicy(**values)
+
+
+@cache
+def get_sqlite_repository() -> Store:
+    """
+    Get the SQLite repository of the configured store directory.
+
+    Config is read the first time this is called, not at import time, so
+    commands that never touch the store don't pay for it. The repository is
+    wrapped in a `CachingStore`, and in a `TracingStore` when profiling is
+    enabled.
+    """
+
+    active = profiler.active()
+    if active is not None:
+        from internal.services.profiling.tracing import TracingStore
+
+        with active.phase("config load"):
+            repository = _sqlite_repository_from_config()
+
+        return TracingStore(CachingStore(repository), active)
+
+    return CachingStore(_sqlite_repository_from_config())
+
+
+def open_sqlite_repository(readonly: bool = False) -> SqliteStore:
+    """
+    Open a new SQLite repository of the configured store directory, owned
+    by the caller, unlike the one shared by `get_sqlite_repository`.
+
+    - readonly: open the database read-only, see `SqliteStore`
+    """
+    return _sqlite_repository_from_config(readonly)
+
+
+def _sqlite_repository_from_config(readonly: bool = False) -> SqliteStore:
+    storage_dir: str | None = config_app.get_value(
+        KEY_STORE_DIRECTORY, table_name=TABLE_STORE_DIRECTORY
+    )
+
+    if storage_dir is None:
+        storage_dir = ""
+
+    snapshot_mode = config_app.get_value(KEY_SNAPSHOT_MODE, table_name=TABLE_SNAPSHOTS)
+    snapshot_dir = config_app.get_value(
+        KEY_SNAPSHOT_DIRECTORY, table_name=TABLE_SNAPSHOTS
+    )
+    key_format = config_app.get_value(KEY_ACCOUNT_KEY_FORMAT, table_name=TABLE_ACCOUNTS)
+
+    return SqliteStore(
+        Path(storage_dir),
+        _pragmas_from_config(),
+        snapshot_mode=DEFAULT_SNAPSHOT_MODE if snapshot_mode is None else str(snapshot_mode),
+        snapshot_directory=None if snapshot_dir is None else Path(snapshot_dir),
+        key_format=DEFAULT_ACCOUNT_KEY_FORMAT if key_format is None else str(key_format),
+        on_migration_progress=_print_migration_progress,
+        readonly=readonly,
+    )
+
+
+def _print_migration_progress(progress: MigrationProgress) -> None:
+    # On stderr, so migrating doesn't corrupt exports written to stdout
+    if progress.rows == 0:
+        return
+
+    end = "\n" if progress.done else ""
+    print(
+        f"\rMigrating store: {progress.name}, {progress.rows} rows",
+        end=end,
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+@cache
+def get_store() -> Storage:
+    """
+    Get the storage service backed by the SQLite repository.
+    """
+    return Storage(get_sqlite_repository())
+
+
+def close_store() -> None:
+    """
+    Close the cached repository, if one is open, so the next call to
+    `get_store` or `get_sqlite_repository` reads the config again.
+    """
+
+    if get_sqlite_repository.cache_info().currsize > 0:
+        get_sqlite_repository().close()
 
-if storage_dir is None:
-    storage_dir = ""
+    get_sqlite_repository.cache_clear()
+    get_store.cache_clear()
 
-sqlite_repository = SqliteStore(Path(storage_dir))
-store = Storage(sqlite_repository)
 
-__all__ = ["store", "sqlite_repository"]
+__all__ = [
+    "get_store",
+    "get_sqlite_repository",
+    "open_sqlite_repository",
+    "get_retention_policy",
+    "close_store",
+]
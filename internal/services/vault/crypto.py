@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+KEY_SIZE = 32
+SALT_SIZE = 16
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+# First byte of every encrypted payload, bumped if the format ever changes
+_VERSION = b"\x01"
+
+
+def derive_key(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """
+    Derive the vault key from the master password with scrypt.
+
+    This is deliberately slow and memory hard, which is why the unlock agent
+    caches its result.
+    """
+
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        # scrypt needs 128 * r * n bytes, leave room for the rest
+        maxmem=256 * r * n,
+        dklen=KEY_SIZE,
+    )
+
+
+def encrypt(key: bytes, plaintext: bytes, associated_data: bytes = b"") -> bytes:
+    """
+    Encrypt and authenticate a payload with the vault key, using AES-256-GCM
+    under a random 96-bit nonce.
+
+    `associated_data`, like the account id, is authenticated but not stored,
+    so a payload can't be moved to another account. The version byte is
+    authenticated with it.
+    """
+
+    nonce = os.urandom(NONCE_SIZE)
+    return _VERSION + nonce + AESGCM(key).encrypt(nonce, plaintext, _VERSION + associated_data)
+
+
+def decrypt(key: bytes, payload: bytes, associated_data: bytes = b"") -> bytes:
+    """
+    Verify and decrypt a payload written by `encrypt`.
+
+    Raises:
+        ValueError: If the key or associated data is wrong, or the payload
+            was tampered with
+    """
+
+    if len(payload) < 1 + NONCE_SIZE + TAG_SIZE or payload[:1] != _VERSION:
+        raise ValueError("Invalid encrypted payload")
+
+    nonce, ciphertext = payload[1 : 1 + NONCE_SIZE], payload[1 + NONCE_SIZE :]
+    try:
+        return AESGCM(key).decrypt(nonce, ciphertext, _VERSION + associated_data)
+    except InvalidTag:
+        raise ValueError("Wrong key or tampered payload")
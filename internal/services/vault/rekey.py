@@ -0,0 +1,123 @@
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from internal.repositories.store import RekeyRange, Store
+from internal.services.vault import crypto
+
+# Keys of the rotation, set once in every worker by the pool initializer so
+# they aren't pickled with each range
+_old_key: bytes = b""
+_new_key: bytes = b""
+
+
+def _init_worker(old_key: bytes, new_key: bytes) -> None:
+    global _old_key, _new_key
+    _old_key, _new_key = old_key, new_key
+
+
+def reencrypt_range(
+    key_range: RekeyRange, rows: list[tuple[int | str, str, bytes]]
+) -> tuple[RekeyRange, list[tuple[int | str, bytes]]]:
+    """
+    Re-encrypt the `(row key, account id, secret)` of a range with the new
+    key. Runs in a worker process.
+
+    Raises:
+        ValueError: If a secret can't be decrypted with either key
+    """
+
+    result = []
+    for row_key, account_id, payload in rows:
+        associated_data = account_id.encode()
+
+        try:
+            plaintext = crypto.decrypt(_old_key, payload, associated_data)
+        except ValueError:
+            # Copied by a delta snapshot after its row was already rotated
+            crypto.decrypt(_new_key, payload, associated_data)
+            result.append((row_key, payload))
+            continue
+
+        result.append((row_key, crypto.encrypt(_new_key, plaintext, associated_data)))
+
+    return key_range, result
+
+
+class Rekey:
+    """
+    Re-encrypt every secret of a store, its snapshots included, with a new
+    key.
+
+    Decrypting and encrypting is CPU bound, so ranges are handed to a pool of
+    processes. Reading and writing stay in this process, which owns the
+    connection: results are written back a few ranges per transaction, each
+    range marked done with its secrets, so an interrupted rotation resumes
+    where it stopped.
+    """
+
+    def __init__(self, store: Store, workers: int, ranges_per_write: int = 8) -> None:
+        if workers < 1:
+            raise ValueError("workers must be greater than 0")
+
+        self.__store = store
+        self.__workers = workers
+        self.__ranges_per_write = ranges_per_write
+
+    def run(
+        self,
+        old_key: bytes,
+        new_key: bytes,
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> int:
+        """
+        Re-encrypt the ranges left by `begin_rekey`.
+
+        - on_progress: called with the ranges done and the total after every
+          write
+
+        Returns:
+            int: Number of secrets re-encrypted
+        """
+
+        ranges = self.__store.get_rekey_ranges()
+        if len(ranges) == 0:
+            return 0
+
+        done = 0
+        rotated = 0
+        pending: list[tuple[RekeyRange, list[tuple[int | str, bytes]]]] = []
+        in_flight: set[Future] = set()
+        # A pool forked from a process running threads may deadlock
+        context = multiprocessing.get_context("forkserver")
+
+        with ProcessPoolExecutor(
+            self.__workers, context, _init_worker, (old_key, new_key)
+        ) as pool:
+            queue = iter(ranges)
+
+            while True:
+                # Keep every worker busy without reading all ranges up front
+                for key_range in queue:
+                    rows = self.__store.read_secrets(key_range)
+                    in_flight.add(pool.submit(reencrypt_range, key_range, rows))
+                    if len(in_flight) >= self.__workers * 2:
+                        break
+
+                if len(in_flight) == 0:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.append(future.result())
+
+                if len(pending) >= self.__ranges_per_write or len(in_flight) == 0:
+                    self.__store.write_secrets(pending)
+                    done += len(pending)
+                    rotated += sum(len(rows) for _, rows in pending)
+                    pending = []
+
+                    if on_progress is not None:
+                        on_progress(done, len(ranges))
+
+        return rotated
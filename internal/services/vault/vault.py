@@ -0,0 +1,218 @@
+import hashlib
+import os
+from collections.abc import Callable
+
+from internal.constants.constants import (
+    DEFAULT_SCRYPT_N,
+    DEFAULT_SCRYPT_P,
+    DEFAULT_SCRYPT_R,
+    DEFAULT_VAULT_IDLE_TIMEOUT,
+    KEY_VAULT_IDLE_TIMEOUT,
+    TABLE_VAULT,
+)
+from internal.repositories.store import Store, VaultMeta
+from internal.services.agent.agent import AgentClient
+from internal.services.config.config import config_app
+from internal.services.vault import crypto
+from internal.services.vault.rekey import Rekey
+
+# Encrypted with the key when the vault is created, to verify it on unlock
+_CHECK_PLAINTEXT = b"plug-password vault"
+
+
+class Vault:
+    """
+    Encrypt and decrypt account secrets with the key derived from the master
+    password.
+
+    Deriving the key is slow on purpose, so `unlock` derives it once and
+    hands it to the unlock agent. Every other command gets it back from the
+    agent, which forgets it after the configured idle timeout.
+    """
+
+    def __init__(self, store: Store, agent: AgentClient | None = None) -> None:
+        self.__store = store
+        self.__agent = AgentClient() if agent is None else agent
+
+    def init(
+        self,
+        password: str,
+        n: int = DEFAULT_SCRYPT_N,
+        r: int = DEFAULT_SCRYPT_R,
+        p: int = DEFAULT_SCRYPT_P,
+    ) -> None:
+        """
+        Set the master password of the vault.
+
+        Raises:
+            ValueError: If the password is empty or the vault is already
+                initialized
+        """
+
+        if password == "":
+            raise ValueError("master password can't be empty string")
+
+        if self.__store.get_vault_meta() is not None:
+            raise ValueError("Vault is already initialized")
+
+        salt = os.urandom(crypto.SALT_SIZE)
+        key = crypto.derive_key(password, salt, n, r, p)
+        check = crypto.encrypt(key, _CHECK_PLAINTEXT, b"check")
+
+        self.__store.init_vault(VaultMeta(salt, n, r, p, check))
+
+    def unlock(self, password: str, idle_timeout: float | None = None) -> None:
+        """
+        Derive the key from the master password and hand it to the agent.
+
+        - idle_timeout: seconds the agent keeps the key without it being
+          used, defaults to `vault.idle_timeout` in the config
+
+        Raises:
+            ValueError: If the vault isn't initialized or the password is wrong
+        """
+
+        meta = self.__meta()
+        key = self.__derive(password, meta)
+
+        if idle_timeout is None:
+            idle_timeout = get_idle_timeout()
+
+        self.__agent.put_key(self.__vault_id(meta), key, idle_timeout)
+
+    def lock(self) -> bool:
+        """
+        Make the agent forget the key.
+
+        Returns:
+            bool: False if nothing was unlocked
+        """
+        return self.__agent.lock()
+
+    def seconds_left(self) -> int | None:
+        """
+        Get the seconds left before the vault locks itself, None if locked.
+        """
+
+        meta = self.__store.get_vault_meta()
+        if meta is None:
+            return None
+        return self.__agent.status().get(self.__vault_id(meta))
+
+    def rekey(
+        self,
+        new_password: str,
+        password: str | None = None,
+        workers: int = 1,
+        range_size: int = 5000,
+        on_progress: Callable[[int, int], None] | None = None,
+        n: int = DEFAULT_SCRYPT_N,
+        r: int = DEFAULT_SCRYPT_R,
+        p: int = DEFAULT_SCRYPT_P,
+    ) -> int:
+        """
+        Re-encrypt every secret, snapshots included, with a key derived from
+        a new master password. Running it again after an interruption resumes
+        the rotation, as long as the same new password is given.
+
+        - password: current master password, the key held by the agent is
+          used when not given
+        - workers: processes re-encrypting ranges in parallel
+
+        Returns:
+            int: Number of secrets re-encrypted
+
+        Raises:
+            ValueError: If a password is wrong or empty
+            PermissionError: If no password is given and the vault is locked
+        """
+
+        meta = self.__meta()
+        old_key = self.__key() if password is None else self.__derive(password, meta)
+
+        pending = self.__store.get_rekey_meta()
+        if pending is None:
+            if new_password == "":
+                raise ValueError("master password can't be empty string")
+
+            salt = os.urandom(crypto.SALT_SIZE)
+            new_key = crypto.derive_key(new_password, salt, n, r, p)
+            pending = VaultMeta(salt, n, r, p, crypto.encrypt(new_key, _CHECK_PLAINTEXT, b"check"))
+        else:
+            try:
+                new_key = self.__derive(new_password, pending)
+            except ValueError:
+                raise ValueError(
+                    "New master password doesn't match the interrupted key rotation"
+                )
+
+        self.__store.begin_rekey(pending, range_size)
+        rotated = Rekey(self.__store, workers).run(old_key, new_key, on_progress)
+        self.__store.finish_rekey()
+
+        self.__agent.put_key(self.__vault_id(pending), new_key, get_idle_timeout())
+        return rotated
+
+    def encrypt_secret(self, account_id: str, secret: str) -> bytes:
+        if self.__store.get_rekey_meta() is not None:
+            raise PermissionError("A key rotation is in progress, run `store rekey` to finish it")
+        return crypto.encrypt(self.__key(), secret.encode("utf-8"), account_id.encode())
+
+    def decrypt_secret(self, account_id: str, payload: bytes) -> str:
+        return crypto.decrypt(self.__key(), payload, account_id.encode()).decode("utf-8")
+
+    def __key(self) -> bytes:
+        """
+        Raises:
+            PermissionError: If the vault is locked
+        """
+
+        meta = self.__meta()
+        key = self.__agent.get_key(self.__vault_id(meta))
+        if key is None:
+            raise PermissionError("Vault is locked, run `vault unlock` first")
+        return key
+
+    def __derive(self, password: str, meta: VaultMeta) -> bytes:
+        """
+        Raises:
+            ValueError: If the password is wrong
+        """
+
+        key = crypto.derive_key(password, meta.salt, meta.n, meta.r, meta.p)
+
+        try:
+            crypto.decrypt(key, meta.check, b"check")
+        except ValueError:
+            raise ValueError("Wrong master password")
+        return key
+
+    def __meta(self) -> VaultMeta:
+        meta = self.__store.get_vault_meta()
+        if meta is None:
+            raise ValueError("Vault is not initialized, run `vault init` first")
+        return meta
+
+    def __vault_id(self, meta: VaultMeta) -> str:
+        # Identifies the vault to the agent without revealing anything
+        return hashlib.sha256(meta.salt).hexdigest()[:16]
+
+
+def get_idle_timeout() -> float:
+    """
+    Get the idle timeout of the unlock agent set in the `vault` config table.
+    """
+
+    value = config_app.get_value(KEY_VAULT_IDLE_TIMEOUT, table_name=TABLE_VAULT)
+    if value is None:
+        return DEFAULT_VAULT_IDLE_TIMEOUT
+
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise ValueError(f"{TABLE_VAULT}.{KEY_VAULT_IDLE_TIMEOUT} must be a number")
+
+    if timeout <= 0:
+        raise ValueError(f"{TABLE_VAULT}.{KEY_VAULT_IDLE_TIMEOUT} must be greater than 0")
+
+    return timeout
@@ -1,8 +1,18 @@
-import typer
+import time
 
-from internal.commands import accounts
-from internal.commands.config import config
-from internal.commands.store import store
+# Taken before any other import, so --profile can report import time
+_STARTED = time.perf_counter()
+
+from pathlib import Path  # noqa: E402
+from typing import Annotated  # noqa: E402
+
+import typer  # noqa: E402
+
+from internal.commands import accounts  # noqa: E402
+from internal.commands.config import config  # noqa: E402
+from internal.commands.store import store  # noqa: E402
+from internal.commands.vault import vault  # noqa: E402
+from internal.constants.constants import DEFAULT_SERVER_READERS  # noqa: E402
 
 app = typer.Typer(
     no_args_is_help=True,
@@ -12,6 +22,78 @@ app = typer.Typer(
 app.add_typer(config.app, name="config")
 app.add_typer(store.app, name="store")
 app.add_typer(accounts.app, name="account")
+app.add_typer(vault.app, name="vault")
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            "--profile",
+            help="Report where the command spends its time on stderr",
+        ),
+    ] = False,
+    profile_output: Annotated[
+        Path | None,
+        typer.Option(
+            "--profile-output",
+            help="Write the profile report as JSON to this file, implies --profile",
+            dir_okay=False,
+        ),
+    ] = None,
+):
+    if not profile and profile_output is None:
+        return
+
+    from internal.services.profiling import profiler
+
+    active = profiler.enable(_STARTED)
+    active.mark("imports", _STARTED)
+
+    # Resources close last registered first: the command phase ends, with
+    # the exception the command raised if any, before the report is written
+    ctx.call_on_close(lambda: active.write(profile_output))
+    ctx.with_resource(active.phase(f"command {ctx.invoked_subcommand}"))
+
+
+@app.command()
+def shell():
+    """
+    Start an interactive shell running commands without restarting, with
+    completion of commands and snapshot names.
+    """
+    from internal.commands.shell import Shell
+
+    Shell(app).cmdloop()
+
+
+@app.command()
+def serve(
+    socket_path: Annotated[
+        Path | None,
+        typer.Option(
+            "--socket", help="Unix socket to listen on, defaults to the runtime directory"
+        ),
+    ] = None,
+    readers: Annotated[
+        int, typer.Option(min=1, help="Read-only connections serving reads in parallel")
+    ] = DEFAULT_SERVER_READERS,
+):
+    """
+    Serve store and account operations as JSON-RPC over a Unix socket, for
+    scripts that would otherwise start the CLI for every call. Stop it with
+    Ctrl-C or SIGTERM.
+    """
+    from internal.services.server.server import StoreServer
+
+    try:
+        server = StoreServer(socket_path, readers)
+        server.serve(lambda: print(f"Serving on {server.socket_path}", flush=True))
+    except Exception as err:
+        print(err)
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
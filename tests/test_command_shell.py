@@ -0,0 +1,75 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from internal.commands.shell import Shell
+from main import app
+
+
+class TestShell(unittest.TestCase):
+    def setUp(self) -> None:
+        self.shell = Shell(app)
+
+    def complete(self, line: str) -> list[str]:
+        text = line.split(" ")[-1]
+        return self.shell.completedefault(text, line, len(line) - len(text), len(line))
+
+    def run_quietly(self, args: list[str]) -> int:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            return self.shell.run(args)
+
+    def test_success_complete_commands(self):
+        """
+        Success complete command groups, their commands and options.
+        """
+        self.assertEqual(["store "], self.shell.completenames("st"))
+        self.assertEqual(["switch "], self.complete("store sw"))
+        self.assertEqual(["switch "], self.shell.complete_help("sw", "help store sw", 11, 13))
+        self.assertEqual(["--snapshot "], self.complete("store export --sn"))
+        self.assertEqual([], self.complete("account get "))
+
+    def test_success_snapshots_read_again_only_after_changes(self):
+        """
+        Success complete snapshot names from memory across read-only
+        commands, reading them again after a command that can change them.
+        """
+        with mock.patch.object(
+            Shell, "_Shell__read_snapshots", return_value=["accounts", "aa_accounts"]
+        ) as read:
+            self.assertEqual(["aa_accounts "], self.complete("store switch aa"))
+            self.run_quietly(["store", "--help"])
+            self.run_quietly(["store", "gc", "--help"])
+            self.run_quietly(["account", "get"])
+            self.assertEqual(["aa_accounts "], self.complete("store diff aa"))
+            self.assertEqual(1, read.call_count)
+
+            self.run_quietly(["account", "add"])
+            self.complete("store switch aa")
+            self.assertEqual(2, read.call_count)
+
+    def test_success_run_keeps_shell(self):
+        """
+        Success run commands in process, returning their exit code.
+        """
+        self.assertEqual(0, self.run_quietly(["store", "--help"]))
+        self.assertEqual(0, self.run_quietly(["store", "--help"]))
+        self.assertFalse(self.shell.onecmd("shell"))
+        self.assertTrue(self.shell.onecmd("exit"))
+
+    def test_fail_run_bad_command(self):
+        """
+        Fail to run unknown commands and missing arguments, without leaving
+        the shell.
+        """
+        self.assertEqual(2, self.run_quietly(["bogus"]))
+        self.assertEqual(2, self.run_quietly(["store", "switch"]))
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(self.shell.onecmd('store switch "unclosed'))
+        self.assertIn("quotation", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import shutil
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from internal.repositories.sqlite.async_store import AsyncSqliteStore
+from internal.repositories.sqlite.keys import new_account_id
+from internal.repositories.sqlite.store import SqliteStore
+from internal.services.async_accounts import AsyncAccount
+from internal.services.storage.async_storage import AsyncStorage
+
+
+class TestAsyncSqliteStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        tmpPath = Path("tests/.tmp_async_store")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.store = AsyncSqliteStore(SqliteStore(tmpPath))
+        await self.store.create()
+        await self.store.open()
+
+    async def asyncTearDown(self) -> None:
+        await self.store.close()
+        shutil.rmtree(self.workdir)
+
+    async def test_success_concurrent_calls(self):
+        """
+        Success serve many concurrent calls on one thread and connection.
+        """
+        await asyncio.gather(
+            *(self.store.add_account(new_account_id(), f"platform{i}") for i in range(50))
+        )
+
+        threads = await asyncio.gather(
+            *(self.store.run_sync(lambda _: threading.get_ident()) for _ in range(10))
+        )
+        connections = await asyncio.gather(
+            *(self.store.run_sync(lambda store: id(store.connection.get())) for _ in range(10))
+        )
+
+        self.assertEqual(50, len(await self.store.read_table("accounts")))
+        self.assertEqual(1, len(set(threads)))
+        self.assertNotEqual(threading.get_ident(), threads[0])
+        self.assertEqual(1, len(set(connections)))
+
+    async def test_success_event_loop_not_blocked(self):
+        """
+        Success keep running other tasks while a store call blocks.
+        """
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await self.store.run_sync(lambda _: time.sleep(0.3))
+        task.cancel()
+
+        self.assertGreater(ticks, 10)
+
+    async def test_success_close_without_blocking(self):
+        """
+        Success keep running other tasks while close drains a call another
+        task queued in the meantime.
+        """
+        store = AsyncSqliteStore(SqliteStore(self.workdir))
+        await store.open()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        closing = asyncio.create_task(store.close())
+        # Lets close queue its call before the slow one
+        await asyncio.sleep(0)
+        slow = asyncio.create_task(store.run_sync(lambda _: time.sleep(0.3) or "done"))
+
+        await closing
+        self.assertEqual("done", await slow)
+        task.cancel()
+
+        self.assertGreater(ticks, 10)
+
+    async def test_success_stream_rows_in_batches(self):
+        """
+        Success iterate an export and a diff asynchronously.
+        """
+        await self.store.add_accounts([(new_account_id(), "github") for _ in range(10)])
+        await self.store.backup_current_table("aa_accounts")
+        added = new_account_id()
+        await self.store.add_account(added, "gitlab")
+
+        exported = [row async for row in self.store.export_table("accounts", batch_size=3)]
+        diff = [row async for row in self.store.diff_tables("aa_accounts", "accounts", 3)]
+
+        self.assertEqual(11, len(exported))
+        self.assertEqual([(added, "added")], [(row.id, row.change) for row in diff])
+
+    async def test_success_async_services(self):
+        """
+        Success add, find and list accounts through the async services.
+        """
+        account = AsyncAccount(self.store)
+        storage = AsyncStorage(self.store)
+
+        ids = await asyncio.gather(
+            *(account.add_new_account(f"platform {i}") for i in range(5))
+        )
+
+        self.assertEqual([(ids[2], "platform 2")], await account.get_accounts("platform 2"))
+        self.assertEqual(5, len(await account.search_accounts("platform")))
+        self.assertIsNone(await account.reveal_secret(ids[0]))
+        self.assertEqual(5, len(await storage.list_snapshots()))
+        self.assertEqual("accounts", await storage.get_current_store())
+
+    async def test_fail_errors_reach_the_caller(self):
+        """
+        Fail with the error raised by the store on its thread.
+        """
+        with self.assertRaises(ValueError):
+            await self.store.switch_table("missing")
+
+        with self.assertRaises(ValueError):
+            [row async for row in self.store.diff_tables("missing", "accounts")]
@@ -0,0 +1,113 @@
+import os
+import shutil
+import sqlite3
+import unittest
+from pathlib import Path
+
+from internal.repositories.sqlite.cache import CachingStore
+from internal.repositories.sqlite.keys import new_account_id
+from internal.repositories.sqlite.store import SqliteStore
+from internal.repositories.store import Store
+
+
+class TestCachingStore(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_cache")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.db_path = tmpPath / "passwords.sqlite"
+        self.store = CachingStore(SqliteStore(tmpPath))
+        self.store.create()
+        self.store.backup_current_table("aa_accounts")
+
+    def tearDown(self) -> None:
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def age_files(self):
+        # Past the racy window, so unchanged files are trusted
+        for path in (self.db_path, Path(f"{self.db_path}-wal")):
+            if path.exists():
+                os.utime(path, (1, 1))
+
+    def test_success_repeated_reads_run_no_queries(self):
+        """
+        Success answer repeated reads from the cache, without any statement.
+        """
+        self.assertEqual("accounts", self.store.get_current_table())
+        self.assertEqual(["aa_accounts"], self.store.get_all_tables())
+        self.age_files()
+        self.store.get_current_table()
+
+        statements = []
+        self.store.connection.get().set_trace_callback(statements.append)
+        for _ in range(3):
+            self.assertEqual("accounts", self.store.get_current_table())
+            self.assertEqual(["aa_accounts"], self.store.get_all_tables())
+
+        self.assertEqual([], statements)
+        self.assertEqual((7, 2), tuple(self.store.cache_info()))
+
+    def test_success_invalidate_on_own_writes(self):
+        """
+        Success drop the cache when switching or taking a snapshot.
+        """
+        self.store.get_all_tables()
+
+        self.store.switch_table("aa_accounts")
+        self.assertEqual("aa_accounts", self.store.get_current_table())
+
+        self.store.switch_table("accounts")
+        self.store.backup_current_table("bb_accounts")
+        self.assertEqual(["aa_accounts", "bb_accounts"], self.store.get_all_tables())
+
+    def test_success_invalidate_on_other_process_writes(self):
+        """
+        Success see a change committed by another connection.
+        """
+        self.assertEqual("accounts", self.store.get_current_table())
+        self.age_files()
+        self.store.get_current_table()
+
+        other = sqlite3.connect(self.db_path)
+        with other:
+            other.execute("UPDATE active_table SET table_name = 'aa_accounts';")
+        other.close()
+
+        self.assertEqual("aa_accounts", self.store.get_current_table())
+        self.assertEqual(2, self.store.cache_info().misses)
+
+    def test_success_recheck_racy_files_with_data_version(self):
+        """
+        Success see a change that kept the mtime and size of the files.
+        """
+        self.assertEqual("accounts", self.store.get_current_table())
+        stamps = {
+            path: os.stat(path)
+            for path in (self.db_path, Path(f"{self.db_path}-wal"))
+            if path.exists()
+        }
+
+        other = sqlite3.connect(self.db_path)
+        with other:
+            other.execute("UPDATE active_table SET table_name = 'aa_accounts';")
+        other.close()
+        for path, stat in stamps.items():
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertEqual("aa_accounts", self.store.get_current_table())
+
+    def test_success_forward_other_calls(self):
+        """
+        Success forward the calls it doesn't cache to the wrapped store, as
+        a `Store`.
+        """
+        account_id = new_account_id()
+        self.store.add_account(account_id, "github")
+
+        self.assertIsInstance(self.store, Store)
+        self.assertEqual([(account_id, "github")], self.store.find_accounts("accounts", "github"))
+        self.assertEqual(["aa_accounts"], [s.name for s in self.store.get_snapshots(limit=1)])
+        with self.assertRaises(AttributeError):
+            self.store.bogus
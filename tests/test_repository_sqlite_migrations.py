@@ -0,0 +1,240 @@
+import shutil
+import sqlite3
+import unittest
+from pathlib import Path
+
+from internal.repositories.sqlite.migrations import (
+    Migration,
+    MigrationProgress,
+    SchemaMigrations,
+    store_migrations,
+)
+from internal.repositories.sqlite.search import AccountIndex
+from internal.repositories.sqlite.secrets import AccountSecrets
+from internal.repositories.sqlite.snapshots import DeltaSnapshots
+from internal.repositories.sqlite.store import SqliteStore
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_migrations")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.db_path = tmpPath / "passwords.sqlite"
+
+        # A store as the first version created it: no catalog, no journal,
+        # no index, and a full-copy snapshot table
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self.conn.executescript("""
+            CREATE TABLE accounts(id TEXT NOT NULL PRIMARY KEY,platform TEXT NOT NULL);
+            CREATE TABLE active_table (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                table_name TEXT NOT NULL
+            );
+            INSERT INTO active_table VALUES (1, 'accounts');
+        """)
+        self.conn.executemany(
+            "INSERT INTO accounts VALUES (?, ?);",
+            [(f"{i:04}", f"platform {i}") for i in range(25)],
+        )
+        self.conn.execute("CREATE TABLE aa_accounts AS SELECT * FROM accounts;")
+
+        self.progress: list[MigrationProgress] = []
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        shutil.rmtree(self.workdir)
+
+    def write(self, work):
+        self.conn.execute("BEGIN IMMEDIATE;")
+        try:
+            result = work(self.conn)
+            self.conn.execute("COMMIT;")
+        except BaseException:
+            self.conn.execute("ROLLBACK;")
+            raise
+        return result
+
+    def migrations(self, batch_size: int = 10, on_progress=None) -> SchemaMigrations:
+        return SchemaMigrations(
+            store_migrations(DeltaSnapshots(), AccountSecrets(), AccountIndex()),
+            batch_size,
+            on_progress or self.progress.append,
+        )
+
+    def test_success_migrate_in_batches(self):
+        """
+        Success bring an old store up to date in bounded batches.
+        """
+        migrations = self.migrations()
+
+        self.assertEqual(5, migrations.run(self.write))
+
+        self.assertEqual(5, migrations.version(self.conn))
+        self.assertEqual([], migrations.pending(self.conn))
+        self.assertEqual(
+            (25,), self.conn.execute("SELECT COUNT(*) FROM snapshot_journal").fetchone()
+        )
+        self.assertEqual(
+            [("aa_accounts", "table", 25)],
+            self.conn.execute("SELECT name, kind, row_count FROM snapshots").fetchall(),
+        )
+        self.assertEqual(
+            [("0007",)],
+            self.conn.execute(
+                "SELECT a.id FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid "
+                "WHERE accounts_fts MATCH '7'"
+            ).fetchall(),
+        )
+
+        journal = [p for p in self.progress if p.name == "snapshot journal"]
+        self.assertEqual([10, 20, 25, 25], [p.rows for p in journal])
+        self.assertEqual([False, False, False, True], [p.done for p in journal])
+
+    def test_success_triggers_follow_migration(self):
+        """
+        Success keep the journal and search index in sync once migrated.
+        """
+        self.migrations().run(self.write)
+
+        self.conn.execute("UPDATE accounts SET platform = 'renamed' WHERE id = '0003'")
+
+        self.assertEqual(
+            [("0003",)],
+            self.conn.execute(
+                "SELECT a.id FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid "
+                "WHERE accounts_fts MATCH 'renamed'"
+            ).fetchall(),
+        )
+
+    def test_success_resume_interrupted_migration(self):
+        """
+        Success resume a migration interrupted between batches.
+        """
+
+        def interrupt(progress: MigrationProgress):
+            if progress.name == "account search" and progress.rows == 20:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.migrations(on_progress=interrupt).run(self.write)
+
+        self.assertEqual(3, self.migrations().version(self.conn))
+        self.assertEqual(
+            (20, None),
+            self.conn.execute(
+                "SELECT rows, finished_at FROM schema_migrations WHERE version = 4"
+            ).fetchone(),
+        )
+
+        self.assertEqual(2, self.migrations().run(self.write))
+
+        self.assertEqual(
+            [(25,)],
+            self.conn.execute(
+                "SELECT COUNT(*) FROM accounts_fts WHERE accounts_fts MATCH 'platform'"
+            ).fetchall(),
+        )
+
+    def test_success_index_writes_between_batches(self):
+        """
+        Success index the rows other connections write between the batches
+        of the search migration, once each and as they end up.
+        """
+
+        def interrupt(progress: MigrationProgress):
+            if progress.name == "account search" and progress.rows == 10:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.migrations(on_progress=interrupt).run(self.write)
+
+        other = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            other.execute("UPDATE accounts SET platform = 'renamed' WHERE id = '0020'")
+            other.execute("DELETE FROM accounts WHERE id = '0021'")
+            other.execute("UPDATE accounts SET platform = 'changed' WHERE id = '0003'")
+            other.execute("DELETE FROM accounts WHERE id = '0004'")
+            other.execute("INSERT INTO accounts VALUES ('0100', 'fresh platform')")
+        finally:
+            other.close()
+
+        self.migrations().run(self.write)
+
+        def search(text: str) -> list[tuple[str]]:
+            return self.conn.execute(
+                "SELECT a.id FROM accounts_fts f JOIN accounts a ON a.rowid = f.rowid "
+                "WHERE accounts_fts MATCH ? ORDER BY a.id",
+                (text,),
+            ).fetchall()
+
+        self.assertEqual([("0020",)], search("renamed"))
+        self.assertEqual([("0003",)], search("changed"))
+        self.assertEqual([("0100",)], search("fresh"))
+        self.assertEqual(22, len(search("platform")))
+        self.assertNotIn(("0021",), search("platform"))
+
+        # Compares the index with the content table, raises if they differ
+        self.conn.execute(
+            "INSERT INTO accounts_fts (accounts_fts, rank) VALUES ('integrity-check', 1)"
+        )
+        self.assertFalse(
+            self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'search_fill'"
+            ).fetchone()
+        )
+
+    def test_success_store_migrates_on_open(self):
+        """
+        Success migrate an old store the first time it is used.
+        """
+        store = SqliteStore(self.workdir)
+        try:
+            self.assertEqual(
+                [("0007", "platform 7")], store.search_accounts("accounts", "7")
+            )
+            self.assertEqual(25, len(store.read_table("aa_accounts")))
+        finally:
+            store.close()
+
+        self.assertEqual(
+            (5,), self.conn.execute("PRAGMA user_version").fetchone()
+        )
+
+    def test_success_new_store_at_latest_version(self):
+        """
+        Success create new stores with every migration applied.
+        """
+        (self.workdir / "fresh").mkdir()
+        store = SqliteStore(self.workdir / "fresh")
+        try:
+            store.create()
+            version = store.connection.get().execute("PRAGMA user_version").fetchone()
+        finally:
+            store.close()
+
+        self.assertEqual((5,), version)
+
+    def test_fail_newer_schema(self):
+        """
+        Fail to open a store migrated by a newer version.
+        """
+        self.conn.execute("PRAGMA user_version = 99")
+
+        with self.assertRaises(RuntimeError):
+            self.migrations().run(self.write)
+
+    def test_fail_versions_with_gap(self):
+        """
+        Fail to build migrations whose versions skip one.
+        """
+        with self.assertRaises(ValueError):
+            SchemaMigrations([Migration(2, "second", lambda conn: None)], 10)
+
+        with self.assertRaises(ValueError):
+            self.migrations(batch_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
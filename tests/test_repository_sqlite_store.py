@@ -0,0 +1,988 @@
+import multiprocessing
+import shutil
+import sqlite3
+import time
+import tracemalloc
+import unittest
+import uuid
+from pathlib import Path
+
+from internal.repositories.sqlite.diff import SnapshotDiff
+from internal.repositories.sqlite.keys import (
+    KEY_FORMAT_BLOB,
+    KEY_FORMAT_TEXT,
+    AccountKeys,
+    new_account_id,
+)
+from internal.repositories.sqlite.search import AccountIndex
+from internal.repositories.sqlite.snapshots import DeltaSnapshots
+from internal.repositories.sqlite.store import SqliteStore
+from internal.repositories.store import AccountRecord
+
+
+def _write_accounts(workdir: str, snapshot_mode: str, writer: int, count: int) -> None:
+    # Runs in its own process, like concurrent `account add` calls
+    store = SqliteStore(Path(workdir), snapshot_mode=snapshot_mode, key_format=KEY_FORMAT_TEXT)
+    for i in range(count):
+        store.add_account(
+            f"{writer}-{i}", f"writer{writer}", snapshot_name=f"w{writer}_{i}_accounts"
+        )
+    store.close()
+
+
+class SqliteStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_store")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.db_path = tmpPath / "passwords.sqlite"
+        # Text keys, for the readable ids and the raw INSERTs of these tests,
+        # blob keys are covered by TestAccountKeys
+        self.store = SqliteStore(tmpPath, key_format=KEY_FORMAT_TEXT)
+        self.store.create()
+
+    def insert(self, account_id: str, platform: str):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO accounts(id, platform) VALUES(?, ?)",
+                (account_id, platform),
+            )
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def tearDown(self) -> None:
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+
+class TestDeltaSnapshots(SqliteStoreTestCase):
+    def test_success_snapshot_rebuilds_full_view(self):
+        """
+        Success read every snapshot as the accounts table was when it was taken.
+        """
+        self.insert("1", "github")
+        self.store.backup_current_table("aa_accounts")
+        self.insert("2", "gitlab")
+        self.store.backup_current_table("bb_accounts")
+        self.insert("3", "codeberg")
+
+        self.assertEqual([("1", "github")], sorted(self.store.read_table("aa_accounts")))
+        self.assertEqual(
+            [("1", "github"), ("2", "gitlab")],
+            sorted(self.store.read_table("bb_accounts")),
+        )
+        self.assertEqual(3, len(self.store.read_table("accounts")))
+
+    def test_success_snapshot_stores_only_changes(self):
+        """
+        Success snapshot writes only the rows changed since its parent.
+        """
+        for i in range(10):
+            self.insert(str(i), "platform")
+        self.store.backup_current_table("aa_accounts")
+        self.insert("10", "platform")
+        self.store.backup_current_table("bb_accounts")
+
+        rows = self.query(
+            "SELECT s.name, COUNT(*) FROM snapshot_deltas d "
+            "JOIN snapshots s ON s.id = d.snapshot_id GROUP BY s.name ORDER BY s.name"
+        )
+        self.assertEqual([("aa_accounts", 10), ("bb_accounts", 1)], rows)
+
+    def test_success_snapshot_records_deleted_and_updated_rows(self):
+        """
+        Success snapshot reflects updates and deletes made after its parent.
+        """
+        self.insert("1", "github")
+        self.insert("2", "gitlab")
+        self.store.backup_current_table("aa_accounts")
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM accounts WHERE id = '1'")
+            conn.execute("UPDATE accounts SET platform = 'gitea' WHERE id = '2'")
+        self.store.backup_current_table("bb_accounts")
+
+        self.assertEqual([("2", "gitea")], self.store.read_table("bb_accounts"))
+        self.assertEqual(
+            [("1", "github"), ("2", "gitlab")],
+            sorted(self.store.read_table("aa_accounts")),
+        )
+
+    def test_success_list_and_switch_snapshots(self):
+        """
+        Success list snapshots in creation order and switch to one of them.
+        """
+        self.store.backup_current_table("bb_accounts")
+        self.store.backup_current_table("aa_accounts")
+
+        self.assertEqual(["bb_accounts", "aa_accounts"], self.store.get_all_tables())
+
+        self.store.switch_table("aa_accounts")
+        self.assertEqual("aa_accounts", self.store.get_current_table())
+
+        self.store.switch_table("accounts")
+        self.assertEqual("accounts", self.store.get_current_table())
+
+    def test_success_legacy_full_copy_table(self):
+        """
+        Success list, switch and read a full-copy snapshot from older stores.
+        """
+        self.store.close()
+        self.db_path.unlink()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE accounts(id TEXT NOT NULL PRIMARY KEY,platform TEXT NOT NULL)")
+            conn.execute("CREATE TABLE active_table(id INTEGER PRIMARY KEY, table_name TEXT NOT NULL)")
+            conn.execute("INSERT INTO active_table VALUES (1, 'accounts')")
+            conn.execute("INSERT INTO accounts VALUES ('1', 'github')")
+            conn.execute("CREATE TABLE old_accounts AS SELECT * FROM accounts")
+        conn.close()
+
+        self.store = SqliteStore(self.workdir, key_format=KEY_FORMAT_TEXT)
+
+        self.assertEqual(["old_accounts"], self.store.get_all_tables())
+        self.store.switch_table("old_accounts")
+        self.assertEqual([("1", "github")], self.store.read_table("old_accounts"))
+
+        self.store.backup_current_table("aa_accounts")
+        self.assertEqual(["old_accounts", "aa_accounts"], self.store.get_all_tables())
+        self.assertEqual([("1", "github")], self.store.read_table("aa_accounts"))
+
+    def test_fail_snapshot_name_already_exists(self):
+        """
+        Fail snapshot because the given name is already used.
+        """
+        self.store.backup_current_table("aa_accounts")
+
+        with self.assertRaises(ValueError):
+            self.store.backup_current_table("aa_accounts")
+
+    def test_fail_switch_table_not_exists(self):
+        """
+        Fail switch because the given snapshot does not exist.
+        """
+        with self.assertRaises(ValueError):
+            self.store.switch_table("missing_accounts")
+
+
+class TestSnapshotCatalog(SqliteStoreTestCase):
+    def test_success_catalog_records_metadata(self):
+        """
+        Success record parent, row count and size of each snapshot.
+        """
+        self.insert("1", "github")
+        self.insert("2", "gitlab")
+        self.store.backup_current_table("aa_accounts")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM accounts WHERE id = '1'")
+            conn.execute("INSERT INTO accounts VALUES ('3', 'codeberg')")
+            conn.execute("INSERT INTO accounts VALUES ('4', 'gitea')")
+        self.store.backup_current_table("bb_accounts")
+
+        first, second = self.store.get_snapshots()
+
+        self.assertEqual(("aa_accounts", None, 2), (first.name, first.parent, first.row_count))
+        self.assertEqual(("bb_accounts", "aa_accounts", 3), (second.name, second.parent, second.row_count))
+        self.assertEqual(len(self.store.read_table("bb_accounts")), second.row_count)
+        self.assertIsNotNone(second.created_at)
+        self.assertGreater(second.size_bytes, 0)
+
+    def test_success_page_snapshots(self):
+        """
+        Success page through snapshots with limit and offset, oldest first.
+        """
+        for name in ["cc_accounts", "aa_accounts", "bb_accounts", "dd_accounts"]:
+            self.store.backup_current_table(name)
+
+        page = self.store.get_snapshots(limit=2, offset=1)
+
+        self.assertEqual(["aa_accounts", "bb_accounts"], [s.name for s in page])
+
+    def test_success_filter_snapshots_since(self):
+        """
+        Success list only snapshots created since the given date.
+        """
+        self.store.backup_current_table("aa_accounts")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE snapshots SET created_at = '2020-01-01 00:00:00.000'")
+        self.store.backup_current_table("bb_accounts")
+
+        page = self.store.get_snapshots(since="2021-01-01 00:00:00")
+
+        self.assertEqual(["bb_accounts"], [s.name for s in page])
+
+    def test_success_list_uses_catalog_index(self):
+        """
+        Success order the catalog by its created_at index without sorting.
+        """
+        rows = self.query(
+            "EXPLAIN QUERY PLAN SELECT name FROM snapshots ORDER BY created_at, id LIMIT 10"
+        )
+        plan = " ".join(row[-1] for row in rows)
+
+        self.assertIn("snapshots_created_at", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class TestDropSnapshots(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.insert("1", "github")
+        self.store.backup_current_table("aa_accounts")
+        self.insert("2", "gitlab")
+        self.store.backup_current_table("bb_accounts")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM accounts WHERE id = '1'")
+        self.store.backup_current_table("cc_accounts")
+
+    def test_success_drop_keeps_other_snapshots(self):
+        """
+        Success drop snapshots without changing the rows of the remaining ones.
+        """
+        expected = sorted(self.store.read_table("cc_accounts"))
+
+        self.store.drop_tables(["aa_accounts", "bb_accounts"])
+
+        self.assertEqual(["cc_accounts"], self.store.get_all_tables())
+        self.assertEqual(expected, sorted(self.store.read_table("cc_accounts")))
+        self.assertEqual(
+            [(None,)], self.query("SELECT parent_id FROM snapshots WHERE name = 'cc_accounts'")
+        )
+
+    def test_success_drop_newest_keeps_next_snapshot_complete(self):
+        """
+        Success drop the newest snapshot and still record its changes in the next one.
+        """
+        self.store.drop_tables(["cc_accounts"])
+        self.store.backup_current_table("dd_accounts")
+
+        self.assertEqual([("2", "gitlab")], self.store.read_table("dd_accounts"))
+        self.assertEqual(
+            [("1", "github"), ("2", "gitlab")], sorted(self.store.read_table("bb_accounts"))
+        )
+
+    def test_success_drop_legacy_table(self):
+        """
+        Success drop a legacy full-copy snapshot table.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE old_accounts AS SELECT * FROM accounts")
+            conn.execute("INSERT INTO snapshots (name, kind) VALUES ('old_accounts', 'table')")
+
+        self.store.drop_tables(["old_accounts"])
+
+        self.assertNotIn("old_accounts", self.store.get_all_tables())
+        self.assertEqual([], self.query("SELECT name FROM sqlite_master WHERE name = 'old_accounts'"))
+
+    def test_success_reclaim_space_incrementally(self):
+        """
+        Success return free pages of dropped snapshots in bounded steps.
+        """
+        self.store.add_accounts((str(i), "x" * 200) for i in range(10, 3000))
+        self.store.backup_current_table("dd_accounts")
+        self.store.drop_tables(["aa_accounts", "bb_accounts", "cc_accounts", "dd_accounts"])
+        conn = self.store.connection.get()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        freed = self.store.reclaim_space(max_pages=5, step_pages=2)
+
+        self.assertEqual(2, conn.execute("PRAGMA auto_vacuum").fetchone()[0])
+        self.assertEqual(5, freed)
+        self.assertGreater(self.store.reclaim_space(max_pages=100000), 0)
+        self.assertEqual(0, conn.execute("PRAGMA freelist_count").fetchone()[0])
+
+    def test_fail_drop_active_table(self):
+        """
+        Fail drop because the snapshot is the active table.
+        """
+        self.store.switch_table("bb_accounts")
+
+        with self.assertRaises(ValueError):
+            self.store.drop_tables(["bb_accounts"])
+
+        self.assertIn("bb_accounts", self.store.get_all_tables())
+
+
+class TestSnapshotDiff(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store.add_accounts([("1", "github"), ("2", "gitlab"), ("3", "gitea")])
+        self.store.backup_current_table("aa_accounts")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM accounts WHERE id = '1'")
+            conn.execute("UPDATE accounts SET platform = 'codeberg' WHERE id = '2'")
+            conn.execute("INSERT INTO accounts VALUES ('4', 'sourcehut')")
+        self.store.backup_current_table("bb_accounts")
+        self.store.add_account("5", "bitbucket")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE old_accounts AS SELECT * FROM accounts WHERE id != '3'")
+            conn.execute("INSERT INTO snapshots (name, kind) VALUES ('old_accounts', 'table')")
+
+    def expected(self, table_a: str, table_b: str) -> list[tuple]:
+        a = dict(self.store.read_table(table_a))
+        b = dict(self.store.read_table(table_b))
+
+        rows = []
+        for account_id in a.keys() | b.keys():
+            if account_id not in b:
+                rows.append(("removed", account_id, a[account_id], None))
+            elif account_id not in a:
+                rows.append(("added", account_id, None, b[account_id]))
+            elif a[account_id] != b[account_id]:
+                rows.append(("changed", account_id, a[account_id], b[account_id]))
+        return sorted(rows)
+
+    def test_success_diff_every_pair(self):
+        """
+        Success diff every pair of delta snapshots, legacy tables and the live table.
+        """
+        tables = ["aa_accounts", "bb_accounts", "accounts", "old_accounts"]
+
+        for table_a in tables:
+            for table_b in tables:
+                with self.subTest(a=table_a, b=table_b):
+                    rows = sorted(tuple(row) for row in self.store.diff_tables(table_a, table_b, 2))
+                    self.assertEqual(self.expected(table_a, table_b), rows)
+
+    def test_success_diff_stat(self):
+        """
+        Success count the changes between two snapshots.
+        """
+        self.assertEqual(
+            {"added": 1, "removed": 1, "changed": 1},
+            self.store.diff_stat("aa_accounts", "bb_accounts"),
+        )
+        self.assertEqual(
+            {"added": 0, "removed": 0, "changed": 0},
+            self.store.diff_stat("bb_accounts", "bb_accounts"),
+        )
+
+    def test_success_diff_reads_only_changed_deltas(self):
+        """
+        Success drive a delta diff from the snapshot index, without a full scan.
+        """
+        conn = self.store.connection.get()
+        sql, params = SnapshotDiff().query((1, "delta"), ("", ()), (2, "delta"), ("", ()))
+
+        plan = " | ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+        self.assertIn("snapshot_deltas_snapshot", plan)
+        self.assertNotRegex(plan, r"SCAN snapshot_deltas\b")
+
+    def test_fail_diff_table_not_exists(self):
+        """
+        Fail diff because a snapshot does not exist.
+        """
+        with self.assertRaises(ValueError):
+            list(self.store.diff_tables("aa_accounts", "missing_accounts"))
+
+
+class TestAccountIndex(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store.add_accounts(
+            [("1", "github"), ("2", "gitlab"), ("3", "github enterprise")]
+        )
+        self.store.backup_current_table("aa_accounts")
+        self.store.add_account("4", "gitea")
+
+    def plan(self, table_name: str, query: str) -> str:
+        conn = self.store.connection.get()
+        source = DeltaSnapshots().resolve(conn, table_name)
+        index = AccountIndex()
+
+        if query == "lookup":
+            sql, params = index.lookup_query(source, table_name, "github")
+        else:
+            sql, params = index.search_query(source, table_name, "git", 10)
+
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return " | ".join(row[-1] for row in rows)
+
+    def test_success_find_accounts(self):
+        """
+        Success find accounts by exact platform in the live table and a snapshot.
+        """
+        self.store.add_account("5", "github")
+
+        self.assertEqual(
+            [("1", "github"), ("5", "github")],
+            sorted(self.store.find_accounts("accounts", "github")),
+        )
+        self.assertEqual([("1", "github")], self.store.find_accounts("aa_accounts", "github"))
+
+    def test_success_search_accounts(self):
+        """
+        Success search accounts by platform word prefix.
+        """
+        live = self.store.search_accounts("accounts", "git")
+        snapshot = self.store.search_accounts("aa_accounts", "ent")
+
+        self.assertEqual(["1", "2", "3", "4"], sorted(row[0] for row in live))
+        self.assertEqual([("3", "github enterprise")], snapshot)
+
+    def test_success_search_reflects_updates_and_deletes(self):
+        """
+        Success keep search in sync when accounts change, without changing snapshots.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE accounts SET platform = 'codeberg' WHERE id = '2'")
+            conn.execute("DELETE FROM accounts WHERE id = '1'")
+        self.store.backup_current_table("bb_accounts")
+
+        self.assertEqual([("2", "codeberg")], self.store.search_accounts("accounts", "code"))
+        self.assertEqual([], self.store.search_accounts("bb_accounts", "gitlab"))
+        self.assertEqual([("2", "gitlab")], self.store.search_accounts("aa_accounts", "gitlab"))
+
+    def test_success_search_escapes_fts_syntax(self):
+        """
+        Success search with text that would otherwise be FTS5 syntax.
+        """
+        self.assertEqual([], self.store.search_accounts("accounts", 'git" OR "x'))
+
+    def test_success_lookup_uses_platform_index(self):
+        """
+        Success look up platforms through the B-tree index, without a full scan.
+        """
+        live = self.plan("accounts", "lookup")
+        snapshot = self.plan("aa_accounts", "lookup")
+
+        self.assertIn("USING INDEX accounts_platform", live)
+        self.assertIn("USING INDEX snapshot_deltas_platform", snapshot)
+        self.assertNotRegex(live + snapshot, r"SCAN (accounts|snapshot_deltas|d)\b")
+
+    def test_success_search_uses_fts_index(self):
+        """
+        Success search through the FTS5 index, without a full scan.
+        """
+        for table_name in ["accounts", "aa_accounts"]:
+            plan = self.plan(table_name, "search")
+
+            self.assertIn("VIRTUAL TABLE INDEX", plan)
+            self.assertNotRegex(plan, r"SCAN (a|d)\b")
+
+    def test_fail_search_empty_text(self):
+        """
+        Fail search because the given text is empty.
+        """
+        with self.assertRaises(ValueError):
+            self.store.search_accounts("accounts", "  ")
+
+
+class TestConnectionManager(SqliteStoreTestCase):
+    def test_success_reuse_connection(self):
+        """
+        Success reuse one connection across store calls.
+        """
+        conn = self.store.connection.get()
+
+        self.store.get_all_tables()
+        self.store.get_current_table()
+
+        self.assertIs(conn, self.store.connection.get())
+
+    def test_success_apply_pragmas(self):
+        """
+        Success apply default and configured PRAGMAs on open.
+        """
+        self.store.close()
+        self.store = SqliteStore(self.workdir, {"cache_size": -2000}, key_format=KEY_FORMAT_TEXT)
+        conn = self.store.connection.get()
+
+        self.assertEqual("wal", conn.execute("PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(1, conn.execute("PRAGMA synchronous").fetchone()[0])
+        self.assertEqual(-2000, conn.execute("PRAGMA cache_size").fetchone()[0])
+
+    def test_success_add_account(self):
+        """
+        Success insert account through the shared connection.
+        """
+        self.store.add_account("1", "github")
+
+        self.assertEqual([("1", "github")], self.query("SELECT * FROM accounts"))
+
+    def test_success_add_accounts_in_batches(self):
+        """
+        Success insert accounts from a generator in chunks.
+        """
+        rows = ((str(i), f"platform-{i}") for i in range(25))
+
+        total = self.store.add_accounts(rows, batch_size=10)
+
+        self.assertEqual(25, total)
+        self.assertEqual([(25,)], self.query("SELECT COUNT(*) FROM accounts"))
+
+    def test_fail_add_accounts_rolls_back_batch(self):
+        """
+        Fail insert accounts and keep none of the batch because one row is invalid.
+        """
+        rows = [("1", "github"), ("2", "gitlab"), ("1", "duplicate")]
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.store.add_accounts(rows, batch_size=2)
+
+        self.assertEqual([(0,)], self.query("SELECT COUNT(*) FROM accounts"))
+
+    def test_fail_unsupported_pragma(self):
+        """
+        Fail create store because the PRAGMA is not supported.
+        """
+        with self.assertRaises(ValueError):
+            SqliteStore(self.workdir, {"foreign_keys": "ON"})
+
+    def test_fail_invalid_pragma_value(self):
+        """
+        Fail create store because the PRAGMA value is not a plain value.
+        """
+        with self.assertRaises(ValueError):
+            SqliteStore(self.workdir, {"cache_size": "1; DROP TABLE accounts"})
+
+
+
+class TestFileSnapshots(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store.close()
+        self.store = SqliteStore(self.workdir, snapshot_mode="file", key_format=KEY_FORMAT_TEXT)
+
+    def test_success_snapshot_written_to_own_file(self):
+        """
+        Success snapshot is written to a file named like `Snapshot`.
+        """
+        self.insert("1", "github")
+        self.store.backup_current_table("aa_accounts")
+
+        files = list((self.workdir / "snapshots").iterdir())
+        self.assertEqual(1, len(files))
+        self.assertRegex(
+            files[0].name, r"^aa_accounts_\d{2}-\d{2}-\d{4}_\d{2}-\d{2}\.sqlite$"
+        )
+        self.assertEqual(
+            [("aa_accounts", "file", 1, files[0].stat().st_size)],
+            self.query("SELECT name, kind, row_count, size_bytes FROM snapshots"),
+        )
+        self.assertEqual([], self.query("SELECT * FROM snapshot_deltas"))
+
+    def test_success_read_switch_and_search_file_snapshot(self):
+        """
+        Success read, switch to, look up and search a snapshot file.
+        """
+        self.insert("1", "github")
+        self.store.backup_current_table("aa_accounts")
+        self.insert("2", "gitlab")
+
+        self.assertEqual([("1", "github")], self.store.read_table("aa_accounts"))
+        self.assertEqual(["aa_accounts"], self.store.get_all_tables())
+
+        self.store.switch_table("aa_accounts")
+        self.assertEqual("aa_accounts", self.store.get_current_table())
+        self.assertEqual(
+            [("1", "github")], self.store.find_accounts("aa_accounts", "github")
+        )
+        self.assertEqual([], self.store.find_accounts("aa_accounts", "gitlab"))
+        self.assertEqual(
+            [("1", "github")], self.store.search_accounts("aa_accounts", "git")
+        )
+
+    def test_success_snapshot_file_is_read_only(self):
+        """
+        Success snapshot file is attached read-only.
+        """
+        self.insert("1", "github")
+        self.store.backup_current_table("aa_accounts")
+        self.store.read_table("aa_accounts")
+
+        conn = self.store.connection.get()
+        schema = [row[1] for row in conn.execute("PRAGMA database_list;")][-1]
+        with self.assertRaises(sqlite3.OperationalError):
+            conn.execute(f"DELETE FROM {schema}.accounts;")
+
+    def test_success_diff_file_snapshot(self):
+        """
+        Success diff a snapshot file against the live table.
+        """
+        self.insert("1", "github")
+        self.insert("2", "gitlab")
+        self.store.backup_current_table("aa_accounts")
+        self.insert("3", "codeberg")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM accounts WHERE id = '2';")
+
+        self.assertEqual(
+            [("added", "3", None, "codeberg"), ("removed", "2", "gitlab", None)],
+            sorted(self.store.diff_tables("aa_accounts", "accounts")),
+        )
+
+    def test_success_drop_removes_file(self):
+        """
+        Success drop a snapshot file and its catalog entry.
+        """
+        self.insert("1", "github")
+        self.store.backup_current_table("aa_accounts")
+        self.store.read_table("aa_accounts")
+
+        self.store.drop_tables(["aa_accounts"])
+
+        self.assertEqual([], list((self.workdir / "snapshots").iterdir()))
+        self.assertEqual([], self.store.get_all_tables())
+
+    def test_fail_unknown_snapshot_mode(self):
+        """
+        Fail create a store with an unknown snapshot mode.
+        """
+        with self.assertRaises(ValueError):
+            SqliteStore(self.workdir, snapshot_mode="copy")
+
+
+class TestExportTable(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for i in range(5):
+            self.insert(str(i), f"platform{i}")
+        self.store.backup_current_table("aa_accounts")
+
+    def test_success_export_snapshot_in_batches(self):
+        """
+        Success stream every account of a snapshot, a few rows at a time.
+        """
+        self.store.add_account("5", "platform5")
+
+        rows = sorted(self.store.export_table("aa_accounts", batch_size=2))
+
+        self.assertEqual([(str(i), f"platform{i}") for i in range(5)], rows)
+        self.assertEqual(6, len(list(self.store.export_table("accounts"))))
+
+    def test_success_export_does_not_block_writers(self):
+        """
+        Success add accounts while an export is being read.
+        """
+        rows = self.store.export_table("accounts", batch_size=1)
+        next(rows)
+
+        self.store.add_account("5", "platform5")
+
+        self.assertEqual(4, len(list(rows)))
+        self.assertEqual(1, len(self.store.find_accounts("accounts", "platform5")))
+
+    def test_success_export_connection_is_read_only(self):
+        """
+        Success open export connections that can't write.
+        """
+        conn = self.store.connection.open_readonly()
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM accounts;")
+        finally:
+            conn.close()
+
+    def test_fail_export_table_not_exists(self):
+        """
+        Fail export a snapshot that does not exist.
+        """
+        with self.assertRaises(ValueError):
+            list(self.store.export_table("missing"))
+
+
+class TestAccountKeys(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.ids = [new_account_id() for _ in range(3)]
+
+    def use_store(self, **kwargs) -> None:
+        self.store.close()
+        shutil.rmtree(self.workdir)
+        self.workdir.mkdir(parents=True)
+        self.store = SqliteStore(self.workdir, **kwargs)
+        self.store.create()
+
+    def fill(self) -> None:
+        self.store.add_accounts([(self.ids[0], "github"), (self.ids[1], "gitlab")])
+        self.store.add_account(
+            self.ids[2], "gitea", b"secret", snapshot_name="aa_accounts"
+        )
+        self.store.add_account(new_account_id(), "codeberg", snapshot_name="bb_accounts")
+
+    def test_success_uuid7_ids_sort_by_creation(self):
+        """
+        Success generate version 7 ids in creation order.
+        """
+        ids = []
+        for _ in range(3):
+            ids.append(new_account_id())
+            time.sleep(0.002)
+
+        self.assertEqual(sorted(ids), ids)
+        for account_id in ids:
+            self.assertEqual(7, uuid.UUID(account_id).version)
+            self.assertEqual(uuid.RFC_4122, uuid.UUID(account_id).variant)
+
+    def test_success_blob_store_reads_strings(self):
+        """
+        Success keep 16-byte ids in a blob store and read them back as strings.
+        """
+        self.use_store(key_format=KEY_FORMAT_BLOB)
+        self.fill()
+
+        self.assertEqual(
+            [(16,)], self.query("SELECT DISTINCT length(id) FROM accounts")
+        )
+        self.assertEqual([("blob",)], self.query("SELECT DISTINCT typeof(id) FROM accounts"))
+        self.assertEqual(
+            [(self.ids[0], "github")], self.store.find_accounts("accounts", "github")
+        )
+        self.assertEqual(
+            [(self.ids[1], "gitlab")], self.store.search_accounts("accounts", "gitlab")
+        )
+        self.assertEqual(b"secret", self.store.get_secret("accounts", self.ids[2]))
+        self.assertIn((self.ids[0], "github"), list(self.store.export_table("aa_accounts")))
+
+        diff = list(self.store.diff_tables("aa_accounts", "bb_accounts"))
+        self.assertEqual(["added"], [row.change for row in diff])
+        self.assertIsInstance(diff[0].id, str)
+
+    def test_success_migrate_keeps_accounts_and_snapshots(self):
+        """
+        Success convert a text store and its snapshots, reading the same
+        accounts, secrets and search results afterwards.
+        """
+        for snapshot_mode in ("delta", "file"):
+            with self.subTest(snapshot_mode=snapshot_mode):
+                self.use_store(snapshot_mode=snapshot_mode, key_format=KEY_FORMAT_TEXT)
+                self.fill()
+                tables = {
+                    name: sorted(self.store.read_table(name))
+                    for name in self.store.get_all_tables()
+                }
+
+                self.assertEqual(4, self.store.migrate_account_keys())
+                self.assertEqual(0, self.store.migrate_account_keys())
+
+                self.assertEqual(
+                    [("blob",)], self.query("SELECT DISTINCT typeof(id) FROM accounts")
+                )
+                for name, rows in tables.items():
+                    self.assertEqual(rows, sorted(self.store.read_table(name)))
+                self.assertEqual(b"secret", self.store.get_secret("accounts", self.ids[2]))
+                self.assertEqual(b"secret", self.store.get_secret("bb_accounts", self.ids[2]))
+                self.assertEqual(
+                    [(self.ids[1], "gitlab")], self.store.search_accounts("accounts", "gitlab")
+                )
+
+                # Triggers are back: later snapshots still record changes
+                self.store.add_account(
+                    new_account_id(), "sourcehut", snapshot_name="cc_accounts"
+                )
+                self.assertEqual(5, len(self.store.read_table("accounts")))
+                self.assertEqual(4, len(self.store.read_table("cc_accounts")))
+                self.assertEqual(3, len(self.store.read_table("bb_accounts")))
+
+    def test_success_migrate_resumes_with_writes_between_batches(self):
+        """
+        Success resume an interrupted conversion, keeping the writes other
+        connections made between its batches and snapshot files taken then.
+        """
+        for snapshot_mode in ("delta", "file"):
+            with self.subTest(snapshot_mode=snapshot_mode):
+                self.use_store(snapshot_mode=snapshot_mode, key_format=KEY_FORMAT_TEXT)
+                self.fill()
+                self.store.add_accounts([(new_account_id(), f"bulk {i}") for i in range(6)])
+
+                # A first run stopped after two batches of three rows
+                conn = sqlite3.connect(self.db_path, isolation_level=None)
+                keys = AccountKeys()
+                try:
+                    for work in (
+                        keys.start_migration,
+                        lambda conn: keys.migrate_batch(conn, 3),
+                        lambda conn: keys.migrate_batch(conn, 3),
+                    ):
+                        conn.execute("BEGIN IMMEDIATE;")
+                        work(conn)
+                        conn.execute("COMMIT;")
+                finally:
+                    conn.close()
+
+                # Rows already copied and rows not copied yet change meanwhile
+                with sqlite3.connect(self.db_path) as other:
+                    other.execute(
+                        "UPDATE accounts SET platform = 'renamed' WHERE id = ?", (self.ids[0],)
+                    )
+                    other.execute("DELETE FROM accounts WHERE id = ?", (self.ids[1],))
+                    other.execute("UPDATE accounts SET platform = 'bulk x' WHERE platform = 'bulk 5'")
+                late_id = new_account_id()
+                self.store.add_account(late_id, "late", b"late secret", snapshot_name="dd_accounts")
+                tables = {
+                    name: sorted(self.store.read_table(name))
+                    for name in self.store.get_all_tables()
+                }
+
+                self.assertEqual(10, self.store.migrate_account_keys())
+
+                self.assertEqual(
+                    [("blob",)], self.query("SELECT DISTINCT typeof(id) FROM accounts")
+                )
+                self.assertEqual(
+                    [], self.query("SELECT name FROM sqlite_master WHERE name LIKE 'account_keys%'")
+                )
+                for name, rows in tables.items():
+                    self.assertEqual(rows, sorted(self.store.read_table(name)))
+                self.assertEqual(
+                    [(self.ids[0], "renamed")], self.store.search_accounts("accounts", "renamed")
+                )
+                self.assertEqual([], self.store.find_accounts("accounts", "gitlab"))
+                self.assertEqual(1, len(self.store.search_accounts("accounts", "x")))
+                self.assertEqual(b"late secret", self.store.get_secret("accounts", late_id))
+                self.assertEqual(b"secret", self.store.get_secret("dd_accounts", self.ids[2]))
+                self.query(
+                    "INSERT INTO accounts_fts (accounts_fts, rank) VALUES ('integrity-check', 1)"
+                )
+
+                if snapshot_mode == "file":
+                    files = [path.name for path in (self.workdir / "snapshots").iterdir()]
+                    self.assertEqual(3, len(files))
+                    self.assertTrue(all(".blob-keys." in name for name in files))
+
+                # The journal kept the changes: the next snapshot has them
+                self.store.add_account(new_account_id(), "after", snapshot_name="ee_accounts")
+                live = [row for row in self.store.read_table("accounts") if row[1] != "after"]
+                self.assertEqual(sorted(live), sorted(self.store.read_table("ee_accounts")))
+
+    def test_fail_migrate_non_uuid_id(self):
+        """
+        Fail to convert a store with an id that isn't a UUID, changing nothing.
+        """
+        self.store.add_account("1", "github")
+
+        with self.assertRaises(ValueError):
+            self.store.migrate_account_keys()
+
+        self.assertEqual([("1", "github")], self.store.read_table("accounts"))
+        self.assertEqual(
+            [("text",)], self.query("SELECT DISTINCT typeof(id) FROM accounts")
+        )
+        self.assertEqual(
+            [], self.query("SELECT name FROM sqlite_master WHERE name LIKE 'account_keys%'")
+        )
+
+    def test_fail_blob_store_non_uuid_id(self):
+        """
+        Fail to add an account whose id isn't a UUID to a blob store.
+        """
+        self.use_store(key_format=KEY_FORMAT_BLOB)
+
+        with self.assertRaises(ValueError):
+            self.store.add_account("1", "github")
+
+    def test_fail_unknown_key_format(self):
+        """
+        Fail to open a store with an unknown key format.
+        """
+        with self.assertRaises(ValueError):
+            SqliteStore(self.workdir, key_format="int")
+
+
+class TestConcurrentWriters(SqliteStoreTestCase):
+    def test_success_concurrent_writers_lose_nothing(self):
+        """
+        Success add accounts from many processes at once, each snapshot
+        holding exactly the accounts added before it.
+        """
+        for snapshot_mode, writers, count in (("delta", 6, 20), ("file", 3, 4)):
+            with self.subTest(snapshot_mode=snapshot_mode):
+                self.store.close()
+                shutil.rmtree(self.workdir)
+                self.workdir.mkdir(parents=True)
+                self.store = SqliteStore(
+                    self.workdir, snapshot_mode=snapshot_mode, key_format=KEY_FORMAT_TEXT
+                )
+                self.store.create()
+
+                context = multiprocessing.get_context("spawn")
+                processes = [
+                    context.Process(
+                        target=_write_accounts,
+                        args=(str(self.workdir), snapshot_mode, writer, count),
+                    )
+                    for writer in range(writers)
+                ]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join(timeout=120)
+                    self.assertEqual(0, process.exitcode)
+
+                self.assertEqual(writers * count, len(self.store.read_table("accounts")))
+
+                # Snapshots in commit order: each one adds a single account
+                snapshots = self.store.get_snapshots()
+                self.assertEqual(writers * count, len(snapshots))
+
+                seen: set[str] = set()
+                for snapshot in snapshots:
+                    writer, i = snapshot.name.removesuffix("_accounts")[1:].split("_")
+                    ids = {row[0] for row in self.store.read_table(snapshot.name)}
+
+                    self.assertEqual(seen, ids)
+                    self.assertEqual(len(seen), snapshot.row_count)
+                    seen.add(f"{writer}-{i}")
+
+
+class TestIterAccounts(SqliteStoreTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store.add_accounts((f"{i:05}", f"platform {i % 7}") for i in range(2500))
+        self.store.backup_current_table("aa_accounts")
+        self.store.add_account("new", "github")
+
+    def test_success_stream_records(self):
+        """
+        Success stream the accounts of the store and of a snapshot as records.
+        """
+        records = list(self.store.iter_accounts("accounts", batch_size=100))
+
+        self.assertEqual(2501, len(records))
+        self.assertIsInstance(records[0], AccountRecord)
+        self.assertEqual(
+            sorted(self.store.read_table("accounts")), sorted(records)
+        )
+        self.assertIn(AccountRecord("00042", "platform 0"), records)
+        self.assertEqual(
+            2500, sum(1 for _ in self.store.iter_accounts("aa_accounts", batch_size=7))
+        )
+
+    def test_success_stream_keeps_memory_flat(self):
+        """
+        Success hold one batch of rows at a time instead of the whole table.
+        """
+        tracemalloc.start()
+        try:
+            for _ in self.store.iter_accounts("accounts", batch_size=50):
+                pass
+            _, streamed = tracemalloc.get_traced_memory()
+
+            tracemalloc.reset_peak()
+            rows = self.store.read_table("accounts")
+            _, fetched = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(2501, len(rows))
+        self.assertLess(streamed * 4, fetched)
+
+    def test_fail_missing_table_or_bad_batch(self):
+        """
+        Fail to stream a table that doesn't exist or in empty batches.
+        """
+        with self.assertRaises(ValueError):
+            next(self.store.iter_accounts("missing_accounts"))
+        with self.assertRaises(ValueError):
+            next(self.store.iter_accounts("accounts", batch_size=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import contextlib
+import io
+import json
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from internal.repositories.sqlite.store import SqliteStore
+from internal.services.accounts import Account
+
+
+class TestImportAccounts(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_accounts")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.store = SqliteStore(tmpPath)
+        self.store.create()
+
+        # The account service reads the store from the user config otherwise
+        patcher = mock.patch(
+            "internal.services.accounts.get_sqlite_repository", return_value=self.store
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.workdir / name
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def import_quietly(self, path: Path, file_format: str | None = None, batch_size: int = 1000) -> int:
+        # The service prints errors before raising them
+        with contextlib.redirect_stdout(io.StringIO()):
+            return Account().import_accounts(path, file_format, batch_size)
+
+    def platforms(self) -> list[str]:
+        return sorted(platform for _, platform in self.store.read_table("accounts"))
+
+    def test_success_import_csv_with_header(self):
+        """
+        Success import the platform column of a CSV file, trimmed, whatever
+        the other columns.
+        """
+        path = self.write("accounts.csv", "id,platform,note\n1, github ,a\n2,gitlab,b\n")
+
+        self.assertEqual(2, self.import_quietly(path))
+        self.assertEqual(["github", "gitlab"], self.platforms())
+
+    def test_success_import_jsonl_skips_blank_lines(self):
+        """
+        Success import one account per JSON line, skipping blank lines.
+        """
+        path = self.write(
+            "accounts.jsonl",
+            "\n".join(
+                [json.dumps({"platform": "github"}), "", "   ", json.dumps({"platform": "gitea "})]
+            ),
+        )
+
+        self.assertEqual(2, self.import_quietly(path))
+        self.assertEqual(["gitea", "github"], self.platforms())
+
+    def test_success_one_snapshot_for_multi_batch_import(self):
+        """
+        Success take one snapshot for an import sent in several batches.
+        """
+        before = self.store.get_all_tables()
+        path = self.write(
+            "accounts.csv", "platform\n" + "".join(f"platform {i}\n" for i in range(25))
+        )
+
+        self.assertEqual(25, self.import_quietly(path, batch_size=10))
+
+        snapshots = [name for name in self.store.get_all_tables() if name not in before]
+        self.assertEqual(1, len(snapshots))
+        self.assertEqual([], self.store.read_table(snapshots[0]))
+        self.assertEqual(25, len(self.platforms()))
+
+    def test_fail_csv_without_header(self):
+        """
+        Fail import a CSV file whose first line isn't a header with a
+        platform column, inserting nothing.
+        """
+        for content in ("github\ngitlab\n", ""):
+            with self.subTest(content=content):
+                path = self.write("accounts.csv", content)
+
+                with self.assertRaises(ValueError):
+                    self.import_quietly(path)
+
+                self.assertEqual([], self.platforms())
+
+    def test_fail_invalid_jsonl_lines(self):
+        """
+        Fail import JSONL with a line that isn't JSON or has no platform,
+        rolling back the lines before it.
+        """
+        cases = {
+            "not json": '{"platform": "github"}\n{"platform": \n',
+            "no platform": '{"platform": "github"}\n{"name": "gitlab"}\n',
+            "empty platform": '{"platform": "github"}\n\n{"platform": "  "}\n',
+            "not an object": '{"platform": "github"}\n["gitlab"]\n',
+        }
+        for case, content in cases.items():
+            with self.subTest(case=case):
+                path = self.write("accounts.jsonl", content)
+
+                with self.assertRaises(ValueError) as ctx:
+                    self.import_quietly(path, batch_size=1)
+
+                if case != "not json":
+                    self.assertIn("line", str(ctx.exception))
+                self.assertEqual([], self.platforms())
+
+    def test_fail_unknown_format(self):
+        """
+        Fail import a file of a format that isn't supported, by suffix or
+        given explicitly.
+        """
+        path = self.write("accounts.txt", "platform\ngithub\n")
+
+        with self.assertRaises(ValueError):
+            self.import_quietly(path)
+        with self.assertRaises(ValueError):
+            self.import_quietly(path, "xml")
+
+        self.assertEqual(1, self.import_quietly(path, "csv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
+import marshal
+import multiprocessing
 import os
+import shutil
 import unittest
 from pathlib import Path
 
@@ -179,5 +182,212 @@ class TestSettingTomlValue(unittest.TestCase):
         self.fakeHomeDirPath.rmdir()
 
 
+class TestConfigCache(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.fakeHomeDirPath = tmpPath
+        self.fakeCacheDirPath = Path("tests/.tmp_cache")
+
+    def test_success_get_value_writes_cache(self):
+        """
+        Success get TOML value and write the resolved values to the cache.
+        """
+        configApp = _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath)
+
+        configApp.get_value("location_path", table_name="sqlite_directory")
+
+        self.assertTrue((self.fakeCacheDirPath / "config.cache").is_file())
+
+    def test_success_get_value_from_cache(self):
+        """
+        Success get TOML value from the cache while the config file is unchanged.
+        """
+        _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath).get_value(
+            "location_path", table_name="sqlite_directory"
+        )
+
+        cacheFile = self.fakeCacheDirPath / "config.cache"
+        key, _ = marshal.loads(cacheFile.read_bytes())
+        cacheFile.write_bytes(marshal.dumps((key, {"singer": "Phoebe Bridgers"})))
+
+        configApp = _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath)
+        self.assertEqual("Phoebe Bridgers", configApp.get_value("singer"))
+
+    def test_success_get_value_after_file_edited_by_hand(self):
+        """
+        Success get TOML value edited by hand instead of the stale cached value.
+        """
+        _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath).get_value(
+            "location_path", table_name="sqlite_directory"
+        )
+
+        configFile = self.fakeHomeDirPath / "config.toml"
+        configFile.write_text(
+            '[sqlite_directory]\nlocation_path = "/srv/passwords"\n', encoding="utf-8"
+        )
+
+        configApp = _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath)
+        self.assertEqual(
+            "/srv/passwords",
+            configApp.get_value("location_path", table_name="sqlite_directory"),
+        )
+
+    def test_success_get_value_after_set_key_value(self):
+        """
+        Success get TOML value set in another instance after it was cached.
+        """
+        _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath).get_value(
+            "singer"
+        )
+        _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath).set_key_value(
+            "singer", "Lizzy McAlpine"
+        )
+
+        configApp = _ConfigApplication(self.fakeHomeDirPath, self.fakeCacheDirPath)
+        self.assertEqual("Lizzy McAlpine", configApp.get_value("singer"))
+
+    def tearDown(self) -> None:
+        # The directory must be empty first
+        os.remove("tests/.tmp/config.toml")
+
+        self.fakeHomeDirPath.rmdir()
+        shutil.rmtree(self.fakeCacheDirPath, ignore_errors=True)
+
+
+def set_many_values(path_dir: Path, worker: int):
+    configApp = _ConfigApplication(path_dir)
+    for i in range(20):
+        configApp.set_key_value(f"key_{worker}_{i}", i, "workers")
+
+
+class TestConfigBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.fakeHomeDirPath = tmpPath
+        self.configFile = tmpPath / "config.toml"
+
+    def test_success_batch_writes_once(self):
+        """
+        Success write every value set in a batch once, on leaving it.
+        """
+        configApp = _ConfigApplication(self.fakeHomeDirPath)
+
+        with configApp.batch():
+            configApp.set_key_value("singer", "Lizzy McAlpine")
+            inode = self.configFile.stat().st_ino
+            configApp.set_key_value("name", "plug-password", "project")
+
+            self.assertEqual(inode, self.configFile.stat().st_ino)
+            self.assertNotIn("singer", self.configFile.read_text(encoding="utf-8"))
+
+        otherApp = _ConfigApplication(self.fakeHomeDirPath)
+        self.assertEqual("Lizzy McAlpine", otherApp.get_value("singer"))
+        self.assertEqual("plug-password", otherApp.get_value("name", "project"))
+        self.assertEqual(["config.toml"], os.listdir(self.fakeHomeDirPath))
+
+    def test_success_apply_values(self):
+        """
+        Success set top-level keys and table keys of a parsed document.
+        """
+        configApp = _ConfigApplication(self.fakeHomeDirPath)
+
+        count = configApp.apply({"singer": "Phoebe Bridgers", "vault": {"idle_timeout": 300}})
+
+        self.assertEqual(2, count)
+        self.assertEqual(300, configApp.get_value("idle_timeout", "vault"))
+        self.assertEqual(
+            "", configApp.get_value("location_path", table_name="sqlite_directory")
+        )
+
+    def test_success_concurrent_writers_keep_updates(self):
+        """
+        Success keep the values set by every process writing at once.
+        """
+        _ConfigApplication(self.fakeHomeDirPath).get_value("singer")
+
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=set_many_values, args=(self.fakeHomeDirPath, worker))
+            for worker in range(4)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+
+        configApp = _ConfigApplication(self.fakeHomeDirPath)
+        for worker in range(4):
+            for i in range(20):
+                self.assertEqual(i, configApp.get_value(f"key_{worker}_{i}", "workers"))
+
+    def test_success_defaults_written_in_place(self):
+        """
+        Success write the defaults of an empty config file without replacing
+        it, so a lock held on it stays on the config file.
+        """
+        self.configFile.touch()
+        inode = self.configFile.stat().st_ino
+
+        configApp = _ConfigApplication(self.fakeHomeDirPath)
+        with configApp.batch():
+            self.assertEqual(inode, self.configFile.stat().st_ino)
+            configApp.set_key_value("singer", "Lizzy McAlpine")
+
+        self.assertEqual(
+            "", configApp.get_value("location_path", table_name="sqlite_directory")
+        )
+
+    def test_success_concurrent_writers_from_empty_file(self):
+        """
+        Success keep the values set by every process writing at once to a
+        config file that has no content yet.
+        """
+        self.configFile.touch()
+
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=set_many_values, args=(self.fakeHomeDirPath, worker))
+            for worker in range(4)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+
+        configApp = _ConfigApplication(self.fakeHomeDirPath)
+        self.assertEqual(
+            "", configApp.get_value("location_path", table_name="sqlite_directory")
+        )
+        for worker in range(4):
+            for i in range(20):
+                self.assertEqual(i, configApp.get_value(f"key_{worker}_{i}", "workers"))
+
+    def test_fail_batch_raises_writes_nothing(self):
+        """
+        Fail a batch part way, leaving the config file as it was.
+        """
+        configApp = _ConfigApplication(self.fakeHomeDirPath)
+        configApp.set_key_value("singer", "Lizzy McAlpine")
+        before = self.configFile.read_text(encoding="utf-8")
+
+        with self.assertRaises(Exception):
+            with configApp.batch():
+                configApp.set_key_value("singer", "Phoebe Bridgers")
+                configApp.set_key_value("", "")
+
+        self.assertEqual(before, self.configFile.read_text(encoding="utf-8"))
+        self.assertEqual("Lizzy McAlpine", configApp.get_value("singer"))
+
+    def tearDown(self) -> None:
+        # The directory must be empty first
+        os.remove("tests/.tmp/config.toml")
+
+        self.fakeHomeDirPath.rmdir()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+import unittest
+
+from internal.services.storage.export import write_export
+
+
+class TestWriteExport(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rows = [("1", "github"), ("2", 'gitlab, "self hosted"')]
+
+    def test_success_write_jsonl(self):
+        """
+        Success write one JSON object per account.
+        """
+        out = io.StringIO()
+
+        count = write_export(iter(self.rows), "jsonl", out)
+
+        self.assertEqual(2, count)
+        self.assertEqual(
+            [{"id": "1", "platform": "github"}, {"id": "2", "platform": 'gitlab, "self hosted"'}],
+            [json.loads(line) for line in out.getvalue().splitlines()],
+        )
+
+    def test_success_write_csv(self):
+        """
+        Success write a CSV header and a quoted row per account, even with no
+        accounts.
+        """
+        out = io.StringIO()
+
+        count = write_export(iter(self.rows), "csv", out)
+
+        self.assertEqual(2, count)
+        self.assertEqual(
+            [["id", "platform"], ["1", "github"], ["2", 'gitlab, "self hosted"']],
+            list(csv.reader(io.StringIO(out.getvalue()))),
+        )
+
+        empty = io.StringIO()
+        self.assertEqual(0, write_export(iter([]), "csv", empty))
+        self.assertEqual("id,platform\n", empty.getvalue())
+
+    def test_fail_unknown_format(self):
+        """
+        Fail export to a format that isn't supported.
+        """
+        with self.assertRaises(ValueError):
+            write_export(iter(self.rows), "xml", io.StringIO())
@@ -0,0 +1,97 @@
+import math
+import string
+import unittest
+from collections import Counter
+
+from internal.constants.constants import PASSWORD_POLICIES
+from internal.services.generator.generator import PasswordGenerator
+
+
+def every_byte(size: int) -> bytes:
+    # Each byte value the same number of times, like a perfect source
+    return bytes(range(256)) * (size // 256 + 1)
+
+
+class TestPasswordGenerator(unittest.TestCase):
+    def test_success_generate_count_length_charset(self):
+        """
+        Success generate as many passwords as asked, of the asked length,
+        from the charset only.
+        """
+        for policy in PASSWORD_POLICIES:
+            with self.subTest(policy=policy):
+                generator = PasswordGenerator.from_policy(policy)
+                passwords = list(generator.generate(2500, 12))
+
+                self.assertEqual(2500, len(passwords))
+                self.assertTrue(all(len(password) == 12 for password in passwords))
+                self.assertLessEqual(set("".join(passwords)), set(generator.charset))
+                self.assertGreater(len(set(passwords)), 2490)
+
+    def test_success_required_classes(self):
+        """
+        Success put a character of every required class in each password.
+        """
+        generator = PasswordGenerator.from_policy("strong")
+
+        for password in generator.generate(5000, 4):
+            self.assertTrue(any(char in string.ascii_lowercase for char in password))
+            self.assertTrue(any(char in string.ascii_uppercase for char in password))
+            self.assertTrue(any(char in string.digits for char in password))
+            self.assertTrue(any(char in string.punctuation for char in password))
+
+    def test_success_rejection_removes_bias(self):
+        """
+        Success draw every character equally often from an unbiased source,
+        where `byte % size` alone would favour the first characters.
+        """
+        # 62 characters: 256 % 62 = 8 characters would get an extra byte
+        generator = PasswordGenerator(
+            string.ascii_letters + string.digits, random_bytes=every_byte
+        )
+
+        counts = Counter("".join(generator.generate(1000, 62)))
+
+        self.assertEqual(62, len(counts))
+        self.assertEqual(1, len(set(counts.values())))
+
+    def test_success_uniform_chi_square(self):
+        """
+        Success draw characters uniformly from the operating system source,
+        by a chi-square goodness-of-fit test.
+        """
+        generator = PasswordGenerator.from_policy("printable")
+        size = len(generator.charset)
+        expected = 1000
+
+        counts = Counter("".join(generator.generate(expected, size)))
+        chi_square = sum((counts[char] - expected) ** 2 / expected for char in generator.charset)
+
+        # Wilson-Hilferty approximation of the chi-square quantile for a
+        # false failure once in a million runs
+        df = size - 1
+        z = 4.753
+        critical = df * (1 - 2 / (9 * df) + z * math.sqrt(2 / (9 * df))) ** 3
+
+        self.assertLess(chi_square, critical)
+
+    def test_fail_bad_charset_or_length(self):
+        """
+        Fail to generate from unusable charsets, policies or lengths.
+        """
+        with self.assertRaises(ValueError):
+            PasswordGenerator("aaaa")
+        with self.assertRaises(ValueError):
+            PasswordGenerator("abc é")
+        with self.assertRaises(ValueError):
+            PasswordGenerator("abc", required=["0123"])
+        with self.assertRaises(ValueError):
+            PasswordGenerator.from_policy("bogus")
+        with self.assertRaises(ValueError):
+            PasswordGenerator.from_policy("strong").generate(1, 3)
+        with self.assertRaises(ValueError):
+            PasswordGenerator.from_policy("hex").generate(-1, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import shutil
+import unittest
+from pathlib import Path
+
+from internal.repositories.sqlite.keys import new_account_id
+from internal.repositories.sqlite.store import SqliteStore
+from internal.services.profiling import profiler
+from internal.services.profiling.profiler import Profiler
+from internal.services.profiling.tracing import TracingStore
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_profile")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.profiler = Profiler()
+        self.store = SqliteStore(tmpPath)
+        self.traced = TracingStore(self.store, self.profiler)
+        self.traced.create()
+
+    def tearDown(self) -> None:
+        self.store.close()
+        profiler._active = None
+        shutil.rmtree(self.workdir)
+
+    def test_success_time_store_calls(self):
+        """
+        Success time every store call, its connection and its rows.
+        """
+        self.traced.add_account(new_account_id(), "github")
+        self.traced.add_account(new_account_id(), "github")
+        self.traced.find_accounts("accounts", "github")
+
+        phases = self.profiler.report()["phases"]
+        names = [phase["name"] for phase in phases]
+
+        self.assertEqual(
+            [
+                "store.create",
+                "connection open",
+                "store.add_account",
+                "store.add_account",
+                "store.find_accounts",
+            ],
+            names,
+        )
+        self.assertEqual(1, phases[1]["depth"])
+        self.assertEqual(2, phases[-1]["rows"])
+
+    def test_success_capture_statements(self):
+        """
+        Success capture statements, their executions and changed rows.
+        """
+        self.traced.add_accounts([(new_account_id(), "github") for _ in range(5)])
+
+        statements = self.profiler.report()["statements"]
+        insert = [s for s in statements if s["sql"].startswith("INSERT INTO accounts(")]
+
+        self.assertEqual(1, len(insert))
+        self.assertGreaterEqual(insert[0]["events"], 5)
+        self.assertEqual(5, insert[0]["rows_changed"])
+        self.assertEqual("store.add_accounts", insert[0]["phase"])
+        self.assertEqual(
+            "INSERT INTO accounts(id, platform) VALUES(?, ?)", insert[0]["sql"]
+        )
+        self.assertTrue(any(s["sql"] == "COMMIT" for s in statements))
+
+    def test_success_time_streamed_diff(self):
+        """
+        Success time a diff while it is iterated.
+        """
+        self.traced.backup_current_table("aa_accounts")
+        self.traced.add_account(new_account_id(), "github")
+
+        rows = list(self.traced.diff_tables("aa_accounts", "accounts"))
+
+        phase = self.profiler.report()["phases"][-1]
+        self.assertEqual("store.diff_tables", phase["name"])
+        self.assertEqual(len(rows), phase["rows"])
+
+    def test_success_write_json(self):
+        """
+        Success write the report as JSON.
+        """
+        output = self.workdir / "profile.json"
+        with self.profiler.phase("command"):
+            self.traced.get_all_tables()
+
+        self.profiler.write(output)
+
+        report = json.loads(output.read_text(encoding="utf-8"))
+        self.assertEqual({"total_ms", "phases", "statements"}, set(report))
+        self.assertIn("command", [phase["name"] for phase in report["phases"]])
+
+    def test_success_phase_records_error(self):
+        """
+        Success record the exception a phase ended with, and let it through.
+        """
+        with self.assertRaises(ValueError):
+            with self.profiler.phase("command"):
+                self.traced.switch_table("missing_accounts")
+
+        phases = {phase["name"]: phase for phase in self.profiler.report()["phases"]}
+        self.assertEqual("ValueError", phases["command"]["error"])
+        self.assertEqual("ValueError", phases["store.switch_table"]["error"])
+        self.assertIsNotNone(phases["command"]["duration_ms"])
+
+    def test_success_disabled_by_default(self):
+        """
+        Success profiling is disabled until enabled.
+        """
+        self.assertIsNone(profiler.active())
+
+        enabled = profiler.enable()
+
+        self.assertIs(enabled, profiler.active())
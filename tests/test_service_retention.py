@@ -0,0 +1,80 @@
+import unittest
+from datetime import datetime
+
+from internal.repositories.store import SnapshotInfo
+from internal.services.snapshot.retention import RetentionPolicy
+
+
+def snapshot(name: str, created_at: str | None) -> SnapshotInfo:
+    return SnapshotInfo(name, created_at, None, 0, 0)
+
+
+class TestRetentionPolicy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = datetime(2026, 10, 18, 12, 0, 0)
+        # Oldest first, like the snapshot catalog
+        self.snapshots = [
+            snapshot("legacy_accounts", None),
+            snapshot("w1_accounts", "2026-09-21 09:00:00.000"),
+            snapshot("w2_accounts", "2026-10-06 09:00:00.000"),
+            snapshot("d1_accounts", "2026-10-16 09:00:00.000"),
+            snapshot("d2a_accounts", "2026-10-17 09:00:00.000"),
+            snapshot("d2b_accounts", "2026-10-17 10:00:00.000"),
+            snapshot("d3a_accounts", "2026-10-18 09:00:00.000"),
+            snapshot("d3b_accounts", "2026-10-18 10:00:00.000"),
+        ]
+
+    def test_success_keep_last(self):
+        """
+        Success keep only the newest snapshots.
+        """
+        policy = RetentionPolicy(keep_last=2, keep_daily=0, keep_weekly=0)
+
+        expired = policy.expired(self.snapshots, self.now)
+
+        self.assertEqual([s.name for s in self.snapshots[:-2]], expired)
+
+    def test_success_keep_daily(self):
+        """
+        Success keep the newest snapshot of each of the last days.
+        """
+        policy = RetentionPolicy(keep_last=0, keep_daily=3, keep_weekly=0)
+
+        expired = policy.expired(self.snapshots, self.now)
+
+        self.assertEqual(
+            ["legacy_accounts", "w1_accounts", "w2_accounts", "d2a_accounts", "d3a_accounts"],
+            expired,
+        )
+
+    def test_success_keep_weekly(self):
+        """
+        Success keep the newest snapshot of each of the last ISO weeks.
+        """
+        policy = RetentionPolicy(keep_last=0, keep_daily=0, keep_weekly=3)
+
+        expired = policy.expired(self.snapshots, self.now)
+
+        self.assertNotIn("w2_accounts", expired)
+        self.assertNotIn("d3b_accounts", expired)
+        self.assertIn("w1_accounts", expired)
+        self.assertIn("legacy_accounts", expired)
+
+    def test_success_keep_everything(self):
+        """
+        Success keep every snapshot when the policy covers all of them.
+        """
+        policy = RetentionPolicy(keep_last=len(self.snapshots), keep_daily=0, keep_weekly=0)
+
+        self.assertEqual([], policy.expired(self.snapshots, self.now))
+
+    def test_fail_negative_policy(self):
+        """
+        Fail create policy because a value is negative.
+        """
+        with self.assertRaises(ValueError):
+            RetentionPolicy(keep_last=-1, keep_daily=0, keep_weekly=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
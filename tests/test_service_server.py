@@ -0,0 +1,113 @@
+import shutil
+import threading
+import unittest
+from pathlib import Path
+
+from internal.repositories.sqlite.store import SqliteStore
+from internal.services.server.server import (
+    INVALID_PARAMS,
+    METHOD_NOT_FOUND,
+    SERVER_ERROR,
+    RpcError,
+    StoreClient,
+    StoreServer,
+)
+
+
+class TestStoreServer(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_server")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+        self.workdir = tmpPath
+
+        store = SqliteStore(tmpPath)
+        try:
+            store.create()
+        finally:
+            store.close()
+
+        self.server = StoreServer(
+            tmpPath.resolve() / "store.sock",
+            readers=2,
+            open_store=lambda readonly: SqliteStore(tmpPath, readonly=readonly),
+        )
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve, args=(ready.set,))
+        self.thread.start()
+        if not ready.wait(10):
+            self.fail("server didn't start")
+
+        self.client = StoreClient(self.server.socket_path, timeout=10)
+
+    def tearDown(self) -> None:
+        try:
+            self.client.shutdown()
+        finally:
+            self.client.close()
+            self.thread.join(10)
+            shutil.rmtree(self.workdir)
+
+    def test_success_add_then_read(self):
+        """
+        Success read from the read-only stores an account just added.
+        """
+        account_id = self.client.add_new_account("github")
+
+        self.assertEqual([(account_id, "github")], self.client.get_accounts("github"))
+        self.assertEqual("accounts", self.client.get_current_store())
+        self.assertEqual(1, len(self.client.get_all_snapshots()))
+
+    def test_success_batch(self):
+        """
+        Success answer a batch with one result per call, in order.
+        """
+        results = self.client.batch([
+            ("account.add", {"platform": "gitlab"}),
+            ("store.current", {}),
+            ("account.get", {"platform": "gitlab"}),
+        ])
+
+        self.assertEqual("accounts", results[1])
+        self.assertEqual([[results[0], "gitlab"]], results[2])
+
+    def test_fail_second_server_on_socket(self):
+        """
+        Fail to start a second server on the socket of a running one,
+        leaving the running one reachable.
+        """
+        second = StoreServer(
+            self.server.socket_path,
+            readers=1,
+            open_store=lambda readonly: SqliteStore(self.workdir, readonly=readonly),
+        )
+
+        with self.assertRaises(FileExistsError):
+            second.serve()
+
+        self.assertEqual("accounts", self.client.get_current_store())
+        with StoreClient(self.server.socket_path, timeout=10) as client:
+            self.assertEqual("accounts", client.get_current_store())
+
+    def test_fail_bad_calls(self):
+        """
+        Fail calls to unknown methods, with bad params, or whose operation
+        fails, keeping the connection usable.
+        """
+        with self.assertRaises(RpcError) as ctx:
+            self.client.call("store.bogus")
+        self.assertEqual(METHOD_NOT_FOUND, ctx.exception.code)
+
+        with self.assertRaises(RpcError) as ctx:
+            self.client.call("account.get", name="github")
+        self.assertEqual(INVALID_PARAMS, ctx.exception.code)
+
+        with self.assertRaises(RpcError) as ctx:
+            self.client.get_accounts("")
+        self.assertEqual(SERVER_ERROR, ctx.exception.code)
+        self.assertEqual("ValueError", ctx.exception.error_type)
+
+        self.assertEqual("accounts", self.client.get_current_store())
+
+
+if __name__ == "__main__":
+    unittest.main()
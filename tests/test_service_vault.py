@@ -0,0 +1,347 @@
+import os
+import shutil
+import socket
+import threading
+import time
+import unittest
+import uuid
+from pathlib import Path
+
+from internal.repositories.sqlite.keys import new_account_id
+from internal.repositories.sqlite.store import SqliteStore
+from internal.services.agent.agent import AgentClient, UnlockAgent
+from internal.services.vault import crypto
+from internal.services.vault.vault import Vault
+
+
+class TestCrypto(unittest.TestCase):
+    def setUp(self) -> None:
+        self.key = crypto.derive_key("master", b"s" * crypto.SALT_SIZE, 2**10, 8, 1)
+
+    def test_success_encrypt_decrypt(self):
+        """
+        Success decrypt what was encrypted, of any length.
+        """
+        for plaintext in (b"", b"secret", b"x" * 1000):
+            with self.subTest(size=len(plaintext)):
+                payload = crypto.encrypt(self.key, plaintext, b"account")
+
+                self.assertNotIn(plaintext or b"\x00" * 64, payload)
+                self.assertEqual(plaintext, crypto.decrypt(self.key, payload, b"account"))
+
+    def test_success_random_nonce(self):
+        """
+        Success encrypt the same plaintext differently each time.
+        """
+        self.assertNotEqual(
+            crypto.encrypt(self.key, b"secret"), crypto.encrypt(self.key, b"secret")
+        )
+
+    def test_fail_tampered_payload(self):
+        """
+        Fail decrypt a payload with a flipped bit.
+        """
+        payload = bytearray(crypto.encrypt(self.key, b"secret", b"account"))
+        payload[20] ^= 1
+
+        with self.assertRaises(ValueError):
+            crypto.decrypt(self.key, bytes(payload), b"account")
+
+    def test_fail_wrong_key_or_account(self):
+        """
+        Fail decrypt with another key or for another account.
+        """
+        payload = crypto.encrypt(self.key, b"secret", b"account")
+        other = crypto.derive_key("other", b"s" * crypto.SALT_SIZE, 2**10, 8, 1)
+
+        with self.assertRaises(ValueError):
+            crypto.decrypt(other, payload, b"account")
+        with self.assertRaises(ValueError):
+            crypto.decrypt(self.key, payload, b"another")
+
+
+class TestVault(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_vault")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.store = SqliteStore(tmpPath)
+        self.store.create()
+
+        # Served by a thread, so tests don't start a background agent
+        socket_path = Path(f"/tmp/plug-password-test-{id(self)}.sock")
+        self.agent_thread = threading.Thread(
+            target=UnlockAgent(socket_path).serve, daemon=True
+        )
+        self.agent_thread.start()
+        while not socket_path.exists():
+            time.sleep(0.01)
+
+        self.agent = AgentClient(socket_path)
+        self.vault = Vault(self.store, self.agent)
+        self.vault.init("master", n=2**10)
+        self.account_id = new_account_id()
+
+    def tearDown(self) -> None:
+        self.agent.lock()
+        self.agent_thread.join(timeout=5)
+        Path(f"{self.agent.socket_path}.lock").unlink(missing_ok=True)
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def test_success_unlock_and_encrypt(self):
+        """
+        Success encrypt and decrypt secrets with the key held by the agent.
+        """
+        self.vault.unlock("master", idle_timeout=60)
+
+        payload = self.vault.encrypt_secret(self.account_id, "hunter2")
+        self.store.add_account(self.account_id, "github", payload)
+
+        self.assertNotIn(b"hunter2", payload)
+        self.assertEqual(
+            "hunter2", self.vault.decrypt_secret(self.account_id, self.store.get_secret("accounts", self.account_id))
+        )
+        self.assertGreater(self.vault.seconds_left(), 0)
+
+    def test_success_snapshot_keeps_secret(self):
+        """
+        Success read the secret of an account as of a snapshot.
+        """
+        self.vault.unlock("master", idle_timeout=60)
+        self.store.add_account(self.account_id, "github", self.vault.encrypt_secret(self.account_id, "old"))
+        self.store.backup_current_table("aa_accounts")
+        with self.store.connection.get() as conn:
+            conn.execute(
+                "UPDATE account_secrets SET secret = ? WHERE account_id = ?",
+                (
+                    self.vault.encrypt_secret(self.account_id, "new"),
+                    uuid.UUID(self.account_id).bytes,
+                ),
+            )
+
+        self.assertEqual(
+            "old", self.vault.decrypt_secret(self.account_id, self.store.get_secret("aa_accounts", self.account_id))
+        )
+        self.assertEqual(
+            "new", self.vault.decrypt_secret(self.account_id, self.store.get_secret("accounts", self.account_id))
+        )
+
+    def test_success_key_expires_when_idle(self):
+        """
+        Success forget the key after the idle timeout.
+        """
+        self.vault.unlock("master", idle_timeout=0.2)
+        time.sleep(0.5)
+
+        with self.assertRaises(PermissionError):
+            self.vault.encrypt_secret(self.account_id, "hunter2")
+
+    def test_fail_wrong_master_password(self):
+        """
+        Fail unlock with the wrong master password.
+        """
+        with self.assertRaises(ValueError):
+            self.vault.unlock("wrong", idle_timeout=60)
+
+        self.assertIsNone(self.vault.seconds_left())
+
+    def test_fail_encrypt_when_locked(self):
+        """
+        Fail encrypt a secret before the vault is unlocked.
+        """
+        with self.assertRaises(PermissionError):
+            self.vault.encrypt_secret(self.account_id, "hunter2")
+
+    def test_fail_init_twice(self):
+        """
+        Fail initialize a vault that already has a master password.
+        """
+        with self.assertRaises(ValueError):
+            self.vault.init("again", n=2**10)
+
+    def test_fail_secret_of_missing_account(self):
+        """
+        Fail get the secret of an account that does not exist.
+        """
+        with self.assertRaises(ValueError):
+            self.store.get_secret("accounts", new_account_id())
+
+
+class TestUnlockAgent(unittest.TestCase):
+    def setUp(self) -> None:
+        self.socket_path = Path(f"/tmp/plug-password-test-{id(self)}.sock")
+        self.agent = AgentClient(self.socket_path)
+
+    def tearDown(self) -> None:
+        self.agent.lock()
+        for _ in range(500):
+            if not self.socket_path.exists():
+                break
+            time.sleep(0.01)
+        Path(f"{self.socket_path}.lock").unlink(missing_ok=True)
+
+    def test_success_client_starts_agent(self):
+        """
+        Success start the agent as a separate process when a key is put,
+        and stop it when locked.
+        """
+        self.agent.put_key("vault", b"k" * 32, 60)
+
+        self.assertEqual(b"k" * 32, self.agent.get_key("vault"))
+        self.assertEqual(["vault"], list(self.agent.status()))
+        self.assertTrue(self.agent.lock())
+        self.assertIsNone(self.agent.get_key("vault"))
+
+    def test_success_second_agent_leaves_first(self):
+        """
+        Success keep the socket of a running agent when another one starts
+        on the same path.
+        """
+        thread = threading.Thread(target=UnlockAgent(self.socket_path).serve, daemon=True)
+        thread.start()
+        while not self.socket_path.exists():
+            time.sleep(0.01)
+        self.agent.put_key("vault", b"k" * 32, 60)
+
+        read_fd, write_fd = os.pipe()
+        UnlockAgent(self.socket_path).serve(write_fd)
+        self.assertEqual(b"1", os.read(read_fd, 1))
+        os.close(read_fd)
+
+        self.assertEqual(b"k" * 32, self.agent.get_key("vault"))
+        self.agent.lock()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+    def test_success_replace_stale_socket(self):
+        """
+        Success start an agent over the socket left by one that was killed.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(str(self.socket_path))
+
+        self.agent.put_key("vault", b"k" * 32, 60)
+
+        self.assertEqual(b"k" * 32, self.agent.get_key("vault"))
+
+
+class TestRekey(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpPath = Path("tests/.tmp_rekey")
+        tmpPath.mkdir(parents=True, exist_ok=True)
+
+        self.workdir = tmpPath
+        self.store = SqliteStore(tmpPath)
+        self.store.create()
+
+        socket_path = Path(f"/tmp/plug-password-test-{id(self)}.sock")
+        self.agent_thread = threading.Thread(
+            target=UnlockAgent(socket_path).serve, daemon=True
+        )
+        self.agent_thread.start()
+        while not socket_path.exists():
+            time.sleep(0.01)
+
+        self.agent = AgentClient(socket_path)
+        self.vault = Vault(self.store, self.agent)
+        self.vault.init("master", n=2**10)
+        self.vault.unlock("master", idle_timeout=60)
+
+        self.ids = [new_account_id() for _ in range(20)]
+        for i, account_id in enumerate(self.ids):
+            self.store.add_account(
+                account_id, "github", self.vault.encrypt_secret(account_id, f"secret {i}")
+            )
+            if i == 9:
+                self.store.backup_current_table("aa_accounts")
+
+    def tearDown(self) -> None:
+        self.agent.lock()
+        self.agent_thread.join(timeout=5)
+        Path(f"{self.agent.socket_path}.lock").unlink(missing_ok=True)
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def assertSecrets(self, vault: Vault):
+        for i, account_id in enumerate(self.ids):
+            self.assertEqual(
+                f"secret {i}",
+                vault.decrypt_secret(account_id, self.store.get_secret("accounts", account_id)),
+            )
+        for i, account_id in enumerate(self.ids[:10]):
+            self.assertEqual(
+                f"secret {i}",
+                vault.decrypt_secret(account_id, self.store.get_secret("aa_accounts", account_id)),
+            )
+
+    def test_success_rekey(self):
+        """
+        Success re-encrypt the secrets of the store and of its snapshots.
+        """
+        old = self.store.get_secret("accounts", self.ids[0])
+
+        rotated = self.vault.rekey("new master", workers=2, range_size=3, n=2**10)
+
+        self.assertEqual(30, rotated)
+        self.assertNotEqual(old, self.store.get_secret("accounts", self.ids[0]))
+        self.assertIsNone(self.store.get_rekey_meta())
+        self.assertSecrets(self.vault)
+
+        # The next snapshot has nothing to record
+        self.store.backup_current_table("bb_accounts")
+        self.assertEqual(
+            0, self.store.diff_stat("aa_accounts", "accounts")["changed"]
+        )
+
+        self.vault.lock()
+        with self.assertRaises(ValueError):
+            self.vault.unlock("master", idle_timeout=60)
+        self.vault.unlock("new master", idle_timeout=60)
+        self.assertSecrets(self.vault)
+
+    def test_success_rekey_file_snapshots(self):
+        """
+        Success re-encrypt the secrets kept in snapshot files.
+        """
+        store = SqliteStore(self.workdir, snapshot_mode="file")
+        store.backup_current_table("bb_accounts")
+        vault = Vault(store, self.agent)
+
+        vault.rekey("new master", workers=2, range_size=4, n=2**10)
+
+        for i, account_id in enumerate(self.ids):
+            self.assertEqual(
+                f"secret {i}",
+                vault.decrypt_secret(account_id, store.get_secret("bb_accounts", account_id)),
+            )
+        store.close()
+
+    def test_success_resume_interrupted_rekey(self):
+        """
+        Success finish a rekey interrupted after some ranges were written.
+        """
+
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(done: int, total: int):
+            raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            self.vault.rekey("new master", workers=2, range_size=1, on_progress=interrupt, n=2**10)
+
+        left = len(self.store.get_rekey_ranges())
+        self.assertGreater(left, 0)
+        self.assertLess(left, 30)
+        with self.assertRaises(PermissionError):
+            self.vault.encrypt_secret("20", "hunter2")
+
+        with self.assertRaises(ValueError):
+            self.vault.rekey("other", password="master", workers=2, range_size=1)
+
+        rotated = self.vault.rekey("new master", password="master", workers=2, range_size=1)
+
+        self.assertEqual(left, rotated)
+        self.assertSecrets(self.vault)